@@ -0,0 +1,3 @@
+"""
+Нагрузочные тесты и бенчмарки 1c-zabbix-monitor_Windows_Linux
+"""
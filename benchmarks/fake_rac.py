@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Имитация утилиты rac для бенчмарков.
+
+Печатает вывод в формате rac (блоки "ключ : значение", разделенные пустой строкой).
+Объем и поведение настраиваются переменными окружения:
+
+    FAKE_RAC_CLUSTERS   - количество кластеров (по умолчанию 1)
+    FAKE_RAC_SESSIONS   - количество сессий в каждом кластере (по умолчанию 100)
+    FAKE_RAC_PROCESSES  - количество рабочих процессов в каждом кластере (по умолчанию 4)
+    FAKE_RAC_INFOBASES  - количество информационных баз в каждом кластере (по умолчанию 3)
+    FAKE_RAC_LATENCY    - задержка ответа в секундах (по умолчанию 0)
+    FAKE_RAC_EXIT_CODE  - код возврата, если отличен от 0 - вывод не печатается
+    FAKE_RAC_SEED       - зерно генератора случайных чисел (по умолчанию 1)
+"""
+
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _uuid(rnd: random.Random) -> str:
+    return str(uuid.UUID(int=rnd.getrandbits(128)))
+
+
+def _block(fields: Dict[str, object]) -> str:
+    width = max(len(k) for k in fields) + 1
+    return "\n".join(f"{k.ljust(width)}: {v}" for k, v in fields.items())
+
+
+def _ids(key: str, count: int) -> List[str]:
+    """Стабильный набор идентификаторов: одинаковый для всех команд одного кластера."""
+    rnd = random.Random(key)
+    return [_uuid(rnd) for _ in range(max(count, 1))]
+
+
+def _cluster_blocks(cluster_ids: List[str]) -> List[str]:
+    return [
+        _block(
+            {
+                "cluster": cid,
+                "host": "srv-1c",
+                "port": 1541 + i,
+                "name": f'"Кластер {i + 1}"',
+                "expiration-timeout": 60,
+                "lifetime-limit": 0,
+                "max-memory-size": 0,
+                "security-level": 0,
+                "load-balancing-mode": "performance",
+            }
+        )
+        for i, cid in enumerate(cluster_ids)
+    ]
+
+
+def _process_blocks(rnd: random.Random, process_ids: List[str], count: int) -> List[str]:
+    blocks = []
+    for i in range(count):
+        blocks.append(
+            _block(
+                {
+                    "process": process_ids[i],
+                    "host": "srv-1c",
+                    "port": 1560 + i,
+                    "pid": 10000 + i,
+                    "turned-on": "yes",
+                    "running": "yes",
+                    "started-at": "2024-01-10T08:00:00",
+                    "use": "used",
+                    "available-perfomance": rnd.randint(50, 200),
+                    "capacity": 1000,
+                    "connections": rnd.randint(0, 200),
+                    "memory-size": rnd.randint(500_000, 8_000_000),
+                    "memory-excess-time": 0,
+                    "selection-size": rnd.randint(0, 5000),
+                    "avg-back-call-time": f"{rnd.random():.3f}",
+                    "avg-call-time": f"{rnd.random() * 2:.3f}",
+                    "avg-db-call-time": f"{rnd.random():.3f}",
+                    "avg-lock-call-time": f"{rnd.random() / 10:.3f}",
+                    "avg-server-call-time": f"{rnd.random():.3f}",
+                    "avg-threads": f"{rnd.random() * 4:.3f}",
+                    "reserve": "no",
+                }
+            )
+        )
+    return blocks
+
+
+def _infobase_blocks(infobase_ids: List[str], count: int) -> List[str]:
+    return [
+        _block({"infobase": infobase_ids[i], "name": f"ib_{i + 1}", "descr": f'"База {i + 1}"'})
+        for i in range(count)
+    ]
+
+
+def _session_blocks(
+    rnd: random.Random,
+    count: int,
+    process_ids: List[str],
+    infobase_ids: List[str],
+    licenses: bool,
+) -> List[str]:
+    apps = ["1CV8C", "1CV8C", "1CV8C", "WebClient", "BackgroundJob", "Designer", "COMConnection"]
+    blocks = []
+    for i in range(count):
+        app_id = rnd.choice(apps)
+        fields: Dict[str, object] = {
+            "session": _uuid(rnd),
+            "session-id": i + 1,
+            "infobase": rnd.choice(infobase_ids),
+            "connection": _uuid(rnd),
+            "process": rnd.choice(process_ids),
+            "user-name": f"user{i % 50}",
+            "host": f"ws-{i % 40:03d}",
+            "app-id": app_id,
+            "locale": "ru_RU",
+            "started-at": "2024-01-10T09:00:00",
+            "last-active-at": "2024-01-10T09:10:00",
+            "hibernate": "no",
+            "passive-session-hibernate-time": 1200,
+            "hibernate-session-terminate-time": 86400,
+            "blocked-by-dbms": rnd.choice([0, 0, 0, 0, 1]),
+            "blocked-by-ls": rnd.choice([0, 0, 0, 0, 0, 1]),
+            "bytes-all": rnd.randint(0, 10_000_000),
+            "bytes-last-5min": rnd.randint(0, 100_000),
+            "calls-all": rnd.randint(0, 10_000),
+            "calls-last-5min": rnd.randint(0, 300),
+            "dbms-bytes-all": rnd.randint(0, 10_000_000),
+            "dbms-bytes-last-5min": rnd.randint(0, 100_000),
+            "db-proc-info": "",
+            "db-proc-took": rnd.randint(0, 5000),
+            "db-proc-took-at": "",
+            "duration-all": rnd.randint(0, 1_000_000),
+            "duration-all-dbms": rnd.randint(0, 500_000),
+            "duration-current": rnd.randint(0, 60_000),
+            "duration-last-5min": rnd.randint(0, 300_000),
+            "duration-last-5min-dbms": rnd.randint(0, 100_000),
+            "duration-current-dbms": rnd.randint(0, 30_000),
+            "memory-current": rnd.randint(0, 50_000_000),
+            "memory-last-5min": rnd.randint(0, 100_000_000),
+            "memory-total": rnd.randint(0, 1_000_000_000),
+            "read-current": 0,
+            "read-last-5min": 0,
+            "read-total": 0,
+            "write-current": 0,
+            "write-last-5min": 0,
+            "write-total": 0,
+            "cpu-time-current": rnd.randint(0, 10_000),
+            "cpu-time-last-5min": rnd.randint(0, 60_000),
+            "cpu-time-total": rnd.randint(0, 1_000_000),
+            "data-separation": "''",
+            "client-ip": f"10.0.0.{i % 250 + 1}",
+        }
+        if licenses:
+            fields.update(
+                {
+                    "full-name": f'"user{i % 50}"',
+                    "series": "8100000000",
+                    "issued-by-server": "no",
+                    "license-type": rnd.choice(["soft", "soft", "HASP"]),
+                    "net": "no",
+                    "max-users-all": 100,
+                    "max-users-cur": 100,
+                    "rmngr-address": '"srv-1c"',
+                    "rmngr-port": 1541,
+                    "rmngr-pid": 9000,
+                    "short-presentation": '"Клиент 100"',
+                    "full-presentation": '"Клиент 100 8100000000"',
+                }
+            )
+        blocks.append(_block(fields))
+    return blocks
+
+
+def _connection_blocks(
+    rnd: random.Random, count: int, process_ids: List[str], infobase_ids: List[str]
+) -> List[str]:
+    return [
+        _block(
+            {
+                "connection": _uuid(rnd),
+                "conn-id": i + 1,
+                "host": f"ws-{i % 40:03d}",
+                "process": rnd.choice(process_ids),
+                "infobase": rnd.choice(infobase_ids),
+                "application": '"1CV8C"',
+                "connected-at": "2024-01-10T09:00:00",
+                "session-number": i + 1,
+                "blocked-by-ls": 0,
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def render(argv: List[str]) -> str:
+    """Формирует вывод rac для переданных аргументов командной строки."""
+    positional = [a for a in argv if not a.startswith("-")]
+    # Последний позиционный аргумент - адрес RAS, его отбрасываем
+    command = positional[:-1] if len(positional) > 1 else positional
+    cluster_arg = next((a.split("=", 1)[1] for a in argv if a.startswith("--cluster=")), "")
+
+    seed = _env_int("FAKE_RAC_SEED", 1)
+    clusters = _ids(f"{seed}:clusters", _env_int("FAKE_RAC_CLUSTERS", 1))
+    # Данные кластера зависят от его идентификатора, чтобы повторные вызовы совпадали
+    rnd = random.Random(f"{seed}:{cluster_arg}:{' '.join(command)}")
+
+    processes = _env_int("FAKE_RAC_PROCESSES", 4)
+    infobases = _env_int("FAKE_RAC_INFOBASES", 3)
+    sessions = _env_int("FAKE_RAC_SESSIONS", 100)
+    process_ids = _ids(f"{seed}:{cluster_arg}:processes", processes)
+    infobase_ids = _ids(f"{seed}:{cluster_arg}:infobases", infobases)
+
+    if command[:2] == ["cluster", "list"]:
+        blocks = _cluster_blocks(clusters)
+    elif command[:2] == ["process", "list"]:
+        blocks = _process_blocks(rnd, process_ids, processes)
+    elif command[:2] == ["session", "list"]:
+        blocks = _session_blocks(rnd, sessions, process_ids, infobase_ids, "--licenses" in argv)
+    elif command[:2] == ["connection", "list"]:
+        blocks = _connection_blocks(rnd, sessions, process_ids, infobase_ids)
+    elif command[:3] == ["infobase", "summary", "list"]:
+        blocks = _infobase_blocks(infobase_ids, infobases)
+    else:
+        raise ValueError(f"Неизвестная команда: {' '.join(command)}")
+
+    return "\n\n".join(blocks) + "\n\n" if blocks else ""
+
+
+def main() -> int:
+    latency = float(os.environ.get("FAKE_RAC_LATENCY", "0") or 0)
+    if latency > 0:
+        time.sleep(latency)
+
+    exit_code = _env_int("FAKE_RAC_EXIT_CODE", 0)
+    if exit_code:
+        print("Ошибка соединения с сервером администрирования", file=sys.stderr)
+        return exit_code
+
+    try:
+        sys.stdout.write(render(sys.argv[1:]))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетического технологического журнала 1С для бенчмарков.
+
+Создает дерево каталогов в формате ТЖ:
+
+    <root>/<journal>/rphost_<pid>/YYMMDDHH.log
+
+Каждый файл начинается с BOM (как пишет платформа), записи распределены равномерно
+внутри часа. Содержимое журналов соответствует секциям logcfg.xml:
+locks (TLOCK/TTIMEOUT/TDEADLOCK), calls (CALL), Query1c (SDBL/DBMSSQL), excps (EXCP/EXCPCNTX).
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BOM = b"\xef\xbb\xbf"
+
+# Доли событий в каждом журнале
+JOURNAL_MIX: Dict[str, Dict[str, int]] = {
+    "locks": {"TLOCK": 90, "TTIMEOUT": 8, "TDEADLOCK": 2},
+    "calls": {"CALL": 100},
+    "Query1c": {"SDBL": 40, "DBMSSQL": 60},
+    "excps": {"EXCP": 80, "EXCPCNTX": 20},
+}
+
+_REGIONS = [
+    "AccumRg12345.DIMS",
+    "AccumRg2011.DIMS",
+    "InfoRg3117.DIMS",
+    "Document42.REFLOCK",
+    "Reference77.REFLOCK",
+    "Const15",
+]
+_MODULES = [
+    "ОбщийМодуль.ПроведениеСервер.Модуль",
+    "Документ.РеализацияТоваровУслуг.МодульОбъекта",
+    "Обработка.ЗакрытиеМесяца.МодульОбъекта",
+    "ОбщийМодуль.ОбменДаннымиСервер.Модуль",
+    "РегистрНакопления.ТоварыНаСкладах.МодульНабораЗаписей",
+]
+_METHODS = ["ОбработкаПроведения", "ПередЗаписью", "Выполнить", "ЗаполнитьДанные", "Записать"]
+_SQL = [
+    "SELECT T1._IDRRef FROM dbo._Reference77 T1 WHERE T1._Code = P1",
+    "INSERT INTO #tt1 WITH(TABLOCK) (_Q_000_F_000RRef) SELECT T1._Fld123RRef\nFROM dbo._AccumRg12345 T1\nWHERE T1._Period <= P2",
+    "UPDATE dbo._InfoRg3117 SET _Fld3118 = P1 WHERE _Fld3119RRef = P2",
+]
+_EXCEPTIONS = [
+    "DataBaseException",
+    "ScriptException",
+    "LockException",
+]
+
+
+def _quote(value: str) -> str:
+    """Экранирование значения свойства так, как это делает платформа."""
+    if any(ch in value for ch in ",'\"\n="):
+        return "'" + value.replace("'", "''") + "'"
+    return value
+
+
+def _common(rnd: random.Random) -> str:
+    conn = rnd.randint(1, 400)
+    return (
+        f"process=rphost,p:processName=ib_{rnd.randint(1, 3)},OSThread={rnd.randint(1000, 9999)},"
+        f"t:clientID={conn * 3},t:applicationName=1CV8C,t:computerName=ws-{conn % 40:03d},"
+        f"t:connectID={conn},SessionID={conn + 1000},Usr=user{conn % 50},AppID=1CV8C"
+    )
+
+
+def _context(rnd: random.Random) -> str:
+    module = rnd.choice(_MODULES)
+    return f"{module} : {rnd.randint(10, 3000)} : {rnd.choice(_METHODS)}()"
+
+
+def _event_body(rnd: random.Random, event: str) -> str:
+    common = _common(rnd)
+    if event == "TLOCK":
+        region = rnd.choice(_REGIONS)
+        waits = str(rnd.randint(1, 400)) if rnd.random() < 0.3 else ""
+        return (
+            f"{common},Regions={region},Locks={_quote(region + ' Exclusive Fld123=1')},"
+            f"WaitConnections={waits},Context={_quote(_context(rnd))}"
+        )
+    if event == "TTIMEOUT":
+        return f"{common},WaitConnections={rnd.randint(1, 400)},Context={_quote(_context(rnd))}"
+    if event == "TDEADLOCK":
+        a, b = rnd.randint(1, 400), rnd.randint(1, 400)
+        region = rnd.choice(_REGIONS)
+        chain = f"{a} {b} {region} Exclusive Fld123=1,{b} {a} {region} Shared Fld124=2"
+        return f"{common},DeadlockConnectionIntersections={_quote(chain)},Context={_quote(_context(rnd))}"
+    if event == "CALL":
+        return (
+            f"{common},Context={_quote(_context(rnd))},Interface=bc2a5e7d,IName=IVResourceRemoteConnection,"
+            f"Method=0,CallID={rnd.randint(1, 100000)},MName=call,"
+            f"Memory={rnd.randint(0, 10_000_000)},MemoryPeak={rnd.randint(0, 50_000_000)},"
+            f"InBytes={rnd.randint(0, 200_000)},OutBytes={rnd.randint(0, 200_000)},"
+            f"CpuTime={rnd.randint(0, 2_000_000)}"
+        )
+    if event in ("SDBL", "DBMSSQL"):
+        return (
+            f"{common},Trans={rnd.randint(0, 1)},dbpid={rnd.randint(50, 400)},"
+            f"Sql={_quote(rnd.choice(_SQL))},Rows={rnd.randint(0, 1000)},"
+            f"RowsAffected={rnd.randint(0, 100)},Context={_quote(_context(rnd))}"
+        )
+    # EXCP / EXCPCNTX
+    return (
+        f"{common},Exception={rnd.choice(_EXCEPTIONS)},"
+        f"Descr={_quote('Ошибка при выполнении операции, код ' + str(rnd.randint(1, 99)))},"
+        f"Context={_quote(_context(rnd))}"
+    )
+
+
+def _pick(rnd: random.Random, mix: Dict[str, int]) -> str:
+    return rnd.choices(list(mix), weights=list(mix.values()))[0]
+
+
+def generate(
+    root: Path,
+    size_mb: float = 10,
+    rphosts: int = 4,
+    hours: int = 2,
+    journals: Optional[List[str]] = None,
+    end: Optional[datetime] = None,
+    seed: int = 1,
+) -> Dict[str, int]:
+    """
+    Генерирует дерево ТЖ общим объемом около size_mb мегабайт.
+
+    Returns:
+        Словарь {журнал: количество событий}.
+    """
+    journals = journals or list(JOURNAL_MIX)
+    end = end or datetime.now()
+    start_hour = (end - timedelta(hours=hours - 1)).replace(minute=0, second=0, microsecond=0)
+
+    files_total = len(journals) * rphosts * hours
+    bytes_per_file = max(int(size_mb * 1024 * 1024 / files_total), 1)
+    rnd = random.Random(seed)
+    counts: Dict[str, int] = {}
+
+    for journal in journals:
+        mix = JOURNAL_MIX[journal]
+        counts[journal] = 0
+        for r in range(rphosts):
+            pid = 10000 + r
+            proc_dir = root / journal / f"rphost_{pid}"
+            proc_dir.mkdir(parents=True, exist_ok=True)
+            for h in range(hours):
+                hour = start_hour + timedelta(hours=h)
+                # Текущий час заполняется только до момента end
+                span = (
+                    3600 if hour + timedelta(hours=1) <= end else int((end - hour).total_seconds())
+                )
+                path = proc_dir / f"{hour:%y%m%d%H}.log"
+                written = 0
+                chunks: List[bytes] = []
+                # Примерная длина записи ~ 350 байт, равномерный шаг по времени
+                expected = max(bytes_per_file // 350, 1)
+                step_us = max(span * 1_000_000 // expected, 1)
+                ts_us = 0
+                with path.open("wb") as f:
+                    f.write(BOM)
+                    while written < bytes_per_file and ts_us < span * 1_000_000:
+                        event = _pick(rnd, mix)
+                        duration = int(rnd.expovariate(1 / 50_000))
+                        minute, rest = divmod(ts_us, 60_000_000)
+                        line = (
+                            f"{minute:02d}:{rest // 1_000_000:02d}.{rest % 1_000_000:06d}-{duration},"
+                            f"{event},{rnd.randint(3, 5)},{_event_body(rnd, event)}\n"
+                        ).encode("utf-8")
+                        chunks.append(line)
+                        written += len(line)
+                        counts[journal] += 1
+                        ts_us += step_us
+                        if len(chunks) >= 4096:
+                            f.write(b"".join(chunks))
+                            chunks.clear()
+                    f.write(b"".join(chunks))
+                mtime = (hour + timedelta(seconds=span)).timestamp()
+                os.utime(path, (mtime, mtime))
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Генератор синтетического ТЖ 1С")
+    parser.add_argument("root", help="Каталог, в котором будет создано дерево журналов")
+    parser.add_argument("--size-mb", type=float, default=10, help="Общий объем журналов, МБ")
+    parser.add_argument("--rphosts", type=int, default=4, help="Количество каталогов rphost_*")
+    parser.add_argument("--hours", type=int, default=2, help="Количество часовых файлов")
+    parser.add_argument(
+        "--journals", nargs="+", choices=list(JOURNAL_MIX), help="Генерируемые журналы"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    counts = generate(
+        Path(args.root), args.size_mb, args.rphosts, args.hours, args.journals, seed=args.seed
+    )
+    for journal, count in counts.items():
+        print(f"{journal}: {count} событий")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
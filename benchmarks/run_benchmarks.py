@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк метрик 1c-zabbix-monitor_Windows_Linux.
+
+Поднимает имитацию rac (fake_rac.py), генерирует синтетический ТЖ (journal_generator.py)
+и замеряет для каждой метрики задержку, пропускную способность и пиковое потребление памяти.
+Результат сохраняется в JSON, чтобы сравнивать релизы между собой:
+
+    python benchmarks/run_benchmarks.py --size-mb 200 --sessions 5000 --output new.json
+    python benchmarks/run_benchmarks.py --compare old.json
+
+Режим нагрузочного теста (--concurrency N) запускает N параллельных процессов CLI
+для каждой метрики, как это делает Zabbix-агент при одновременном опросе.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parent
+PACKAGE_DIR = PROJECT_ROOT / "src" / "1c-zabbix-monitor_Windows_Linux"
+
+if str(PACKAGE_DIR) not in sys.path:
+    sys.path.insert(0, str(PACKAGE_DIR))
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from loguru import logger  # noqa: E402
+
+from benchmarks.journal_generator import generate  # noqa: E402
+from metrics.settings import Settings  # noqa: E402
+
+RAC_METRICS = ["ras_health", "sessions", "rphost"]
+# Метрика -> каталог журнала в сгенерированном дереве
+JOURNAL_METRICS = {
+    "locks": "locks",
+    "calls": "calls",
+    "slow_sql": "Query1c",
+    "log_errors": "excps",
+}
+
+
+def make_fake_rac(target_dir: Path) -> str:
+    """Создает исполняемую обертку над fake_rac.py и возвращает путь к ней."""
+    script = BENCH_DIR / "fake_rac.py"
+    if os.name == "nt":
+        launcher = target_dir / "rac.cmd"
+        launcher.write_text(f'@"{sys.executable}" "{script}" %*\n', encoding="utf-8")
+    else:
+        launcher = target_dir / "rac"
+        launcher.write_text(
+            f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n', encoding="utf-8"
+        )
+        launcher.chmod(0o755)
+    return str(launcher)
+
+
+def build_config(rac_path: str, journal_root: Path, state_dir: Path) -> Dict[str, Any]:
+    """Конфигурация, направляющая все метрики на имитацию rac и синтетический ТЖ."""
+    return {
+        "rac": {"path": rac_path, "host": "localhost", "port": 1545},
+        "logs": {
+            "locks": {"path": str(journal_root / "locks")},
+            "calls": {"path": str(journal_root / "calls")},
+            "sql": {"path": str(journal_root / "Query1c")},
+            "errors": {"path": str(journal_root / "excps")},
+        },
+        "cache": {"ttl": 0},
+        # Каждый замер читает журнал целиком с чистым состоянием
+        "state": {"path": str(state_dir)},
+        "journal": {"start_position": "begin"},
+    }
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*.log")) if path.exists() else 0
+
+
+def _measure(
+    func: Callable[[], Any], repeat: int, setup: Callable[[], None] = lambda: None
+) -> Dict[str, Any]:
+    """Замер задержки (без tracemalloc) и отдельный прогон для пиковой памяти."""
+    latencies: List[float] = []
+    result: Any = None
+    for _ in range(repeat):
+        setup()
+        t0 = time.perf_counter()
+        result = func()
+        latencies.append(time.perf_counter() - t0)
+
+    setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    p95_index = min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))
+    return {
+        "latency_median_s": statistics.median(latencies),
+        "latency_min_s": latencies[0],
+        "latency_p95_s": latencies[p95_index],
+        "peak_memory_kb": peak // 1024,
+        "result": result,
+    }
+
+
+def run_inprocess(
+    config: Dict[str, Any],
+    journal_root: Path,
+    metrics: List[str],
+    repeat: int,
+    sessions: int,
+    clusters: int,
+    processes: int,
+) -> Dict[str, Dict[str, Any]]:
+    """Вызывает get_metric каждой метрики в текущем процессе."""
+    report: Dict[str, Dict[str, Any]] = {}
+    # Сколько записей rac разбирает каждая метрика: кластеры, сессии или процессы
+    records = {
+        "ras_health": clusters,
+        "sessions": sessions * clusters,
+        "rphost": processes * clusters,
+    }
+    # Как и main.py, метрики получают проверенную конфигурацию
+    settings = Settings.model_validate(config)
+    state_dir = Path(config["state"]["path"])
+    for name in metrics:
+        module = importlib.import_module(f"metrics.{name}")
+        stats = _measure(
+            lambda: module.get_metric(settings),
+            repeat,
+            setup=lambda: shutil.rmtree(state_dir, ignore_errors=True),
+        )
+        latency = stats["latency_median_s"] or 1e-9
+        if name in JOURNAL_METRICS:
+            input_bytes = _dir_size(journal_root / JOURNAL_METRICS[name])
+            stats["input_bytes"] = input_bytes
+            stats["throughput_mb_s"] = input_bytes / 1024 / 1024 / latency
+        elif name in records:
+            stats["records"] = records[name]
+            stats["throughput_records_s"] = records[name] / latency
+        if not isinstance(stats["result"], (int, float, str)):
+            stats["result"] = json.dumps(stats["result"], ensure_ascii=False)[:200]
+        report[name] = stats
+    return report
+
+
+def run_load_test(
+    config: Dict[str, Any], metrics: List[str], concurrency: int, work_dir: Path
+) -> Dict[str, Dict[str, Any]]:
+    """Одновременно запускает concurrency процессов CLI для каждой метрики."""
+    config_path = work_dir / "bench_config.json"
+    config_path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+    cmd_base = [
+        sys.executable,
+        str(PROJECT_ROOT / "run_monitor.py"),
+        "--config",
+        str(config_path),
+        "--no-cache",
+    ]
+
+    def _one(metric: str) -> float:
+        t0 = time.perf_counter()
+        subprocess.run(
+            cmd_base + ["--metric", metric], capture_output=True, timeout=300, check=False
+        )
+        return time.perf_counter() - t0
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for metric in metrics:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = sorted(pool.map(_one, [metric] * concurrency))
+        wall = time.perf_counter() - t0
+        report[metric] = {
+            "concurrency": concurrency,
+            "wall_s": wall,
+            "latency_median_s": statistics.median(latencies),
+            "latency_max_s": latencies[-1],
+            "invocations_s": concurrency / wall if wall else 0.0,
+        }
+    return report
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    """Строки сравнения медианной задержки и памяти с предыдущим отчетом."""
+    lines = []
+    for metric, stats in current.get("metrics", {}).items():
+        old = previous.get("metrics", {}).get(metric)
+        if not old:
+            continue
+        for key in ("latency_median_s", "peak_memory_kb"):
+            if old.get(key):
+                delta = (stats[key] - old[key]) / old[key] * 100
+                lines.append(
+                    f"{metric:12} {key:18} {old[key]:>12.4f} -> {stats[key]:>12.4f} ({delta:+.1f}%)"
+                )
+    return lines
+
+
+def _print_table(report: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'metric':12} {'median, s':>10} {'p95, s':>10} {'peak, KB':>10} {'throughput':>16}")
+    for name, s in report.items():
+        if "throughput_mb_s" in s:
+            throughput = f"{s['throughput_mb_s']:.1f} MB/s"
+        elif "throughput_records_s" in s:
+            throughput = f"{s['throughput_records_s']:.0f} rec/s"
+        else:
+            throughput = "-"
+        print(
+            f"{name:12} {s['latency_median_s']:>10.4f} {s['latency_p95_s']:>10.4f} "
+            f"{s['peak_memory_kb']:>10} {throughput:>16}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк метрик 1C Zabbix Monitor")
+    parser.add_argument("--metrics", nargs="+", default=RAC_METRICS + list(JOURNAL_METRICS))
+    parser.add_argument("--repeat", type=int, default=5, help="Количество замеров каждой метрики")
+    parser.add_argument("--clusters", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=500, help="Сессий в каждом кластере")
+    parser.add_argument("--processes", type=int, default=8, help="Рабочих процессов в кластере")
+    parser.add_argument("--rac-latency", type=float, default=0.0, help="Задержка ответа rac, с")
+    parser.add_argument("--journal-dir", help="Готовое дерево ТЖ (вместо генерации)")
+    parser.add_argument("--size-mb", type=float, default=20, help="Объем генерируемого ТЖ, МБ")
+    parser.add_argument("--rphosts", type=int, default=4)
+    parser.add_argument("--hours", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=0, help="Параллельных процессов CLI")
+    parser.add_argument("--output", help="Файл для сохранения отчета JSON")
+    parser.add_argument("--compare", help="Предыдущий отчет JSON для сравнения")
+    args = parser.parse_args(argv)
+
+    # Как и в main.py: предупреждения модулей метрик не должны смешиваться с отчетом
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    os.environ.update(
+        {
+            "FAKE_RAC_CLUSTERS": str(args.clusters),
+            "FAKE_RAC_SESSIONS": str(args.sessions),
+            "FAKE_RAC_PROCESSES": str(args.processes),
+            "FAKE_RAC_LATENCY": str(args.rac_latency),
+        }
+    )
+
+    with tempfile.TemporaryDirectory(prefix="1c_bench_") as tmp:
+        work_dir = Path(tmp)
+        journal_root = Path(args.journal_dir) if args.journal_dir else work_dir / "journal"
+        if not args.journal_dir:
+            t0 = time.perf_counter()
+            generate(journal_root, args.size_mb, args.rphosts, args.hours)
+            print(f"ТЖ сгенерирован за {time.perf_counter() - t0:.1f} с: {journal_root}")
+
+        config = build_config(make_fake_rac(work_dir), journal_root, work_dir / "state")
+        report: Dict[str, Any] = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": vars(args),
+            "metrics": run_inprocess(
+                config,
+                journal_root,
+                args.metrics,
+                args.repeat,
+                args.sessions,
+                args.clusters,
+                args.processes,
+            ),
+        }
+        _print_table(report["metrics"])
+
+        if args.concurrency > 0:
+            report["load_test"] = run_load_test(config, args.metrics, args.concurrency, work_dir)
+            for metric, s in report["load_test"].items():
+                print(
+                    f"load {metric:12} x{s['concurrency']}: wall {s['wall_s']:.2f} s, "
+                    f"max {s['latency_max_s']:.2f} s, {s['invocations_s']:.1f} inv/s"
+                )
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print("\n".join(compare(report, previous)))
+
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
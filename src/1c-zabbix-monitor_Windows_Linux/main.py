@@ -1,14 +1,16 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import os
 import sys
 import time
 import re
+import sqlite3
 import tempfile
 from pathlib import Path
-from typing import Any, Dict, Optional, Union, Callable
+from typing import Any, Dict, Optional, Callable
 
 from loguru import logger
 
@@ -29,11 +31,10 @@ try:
 except ImportError:
     HAS_DOTENV = False
 
-try:
-    import yaml
-    HAS_YAML = True
-except ImportError:
-    HAS_YAML = False
+# yaml импортируется только при компиляции снимка конфигурации
+HAS_YAML = importlib.util.find_spec("yaml") is not None
+
+from metrics.settings import SCHEMA_VERSION, Settings, construct_settings
 
 # Теперь импорт из локальной папки metrics будет работать корректно
 try:
@@ -48,89 +49,141 @@ try:
         get_rac_path = utils_1c_module.get_rac_path
     else:
         # Резервный вариант, если спецификация модуля некорректна
-        def get_rac_path(config: Dict[str, Any]) -> str:
-            return config.get("ras", {}).get("path", "rac")
+        def get_rac_path(config: Settings) -> str:
+            return config.rac.path or "rac"
 except (ImportError, AttributeError, FileNotFoundError, TypeError):
     # Резервный вариант, если модуль еще не готов или пути не настроены
-    def get_rac_path(config: Dict[str, Any]) -> str:
-        return config.get("ras", {}).get("path", "rac")
+    def get_rac_path(config: Settings) -> str:
+        return config.rac.path or "rac"
 
 # ============================================================================
 # Кэширование
 # ============================================================================
 
-class FileTTLCache:
-    """Атомарный кэш в файловой системе для сохранения данных между вызовами Zabbix."""
-    def __init__(self, ttl: int = 60):
+def get_cache_dir() -> Path:
+    """Каталог кэша во временной папке системы."""
+    if os.name == "nt":
+        # Ищем системную папку TEMP или используем стандартный путь
+        temp_base = os.environ.get("TEMP") or os.environ.get("TMP") or "C:/Windows/Temp"
+    else:
+        temp_base = "/tmp"
+    return Path(temp_base) / "1c_zabbix_monitor_cache"
+
+
+class SQLiteTTLCache:
+    """
+    Кэш ответов метрик в одном файле SQLite (режим WAL) для всех вызовов Zabbix.
+
+    Хранится готовый текст ответа, поэтому попадание в кэш - один SELECT по ключу
+    без разбора JSON. WAL позволяет читать параллельно с записью, а timeout
+    подключения - дождаться конкурирующей записи. Срок годности (expires_at)
+    вычисляется при записи из ttl, действующего в этот момент (для метрик RAS -
+    адаптивного), и хранится в строке. Записи старше retention секунд удаляются
+    при записи; если записей больше max_entries, удаляются самые старые.
+    Истекшие, но не удаленные записи отдаются при недоступности RAS (get с max_age).
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60,
+        path: Optional[Path] = None,
+        retention: float = 86400,
+        max_entries: int = 1000,
+    ):
         self.ttl = ttl
-        # Исправлено: корректное получение TEMP без синтаксических ошибок
-        if os.name == "nt":
-            # Ищем системную папку TEMP или используем стандартный путь
-            temp_base = os.environ.get("TEMP") or os.environ.get("TMP") or "C:/Windows/Temp"
+        self.retention = retention
+        self.max_entries = max_entries
+        self.path = path or get_cache_dir() / "cache.sqlite"
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            columns = {row[1] for row in db.execute("PRAGMA table_info(cache)")}
+            if columns and "expires_at" not in columns:
+                # Кэш прежнего формата без срока годности просто пересоздается
+                db.execute("DROP TABLE cache")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, output TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[str]:
+        """
+        Текст ответа, срок годности которого не истек, или - если задан max_age -
+        записанный не более max_age секунд назад независимо от срока годности.
+        """
+        now = time.time()
+        if max_age is None:
+            sql, bound = "SELECT output FROM cache WHERE key = ? AND expires_at > ?", now
         else:
-            temp_base = "/tmp"
-            
-        self.cache_dir = Path(temp_base) / "1c_zabbix_monitor_cache"
-        
+            sql, bound = "SELECT output FROM cache WHERE key = ? AND stored_at >= ?", now - max_age
         try:
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
-        except (OSError, PermissionError) as e:
-            logger.error(f"Ошибка создания директории кэша: {e}")
-
-    def _get_cache_file(self, key: str) -> Path:
-        safe_key = re.sub(r"[^\w\-_]", "_", key)
-        return self.cache_dir / f"{safe_key}.json"
-
-    def get(self, key: str) -> Optional[Any]:
-        cache_file = self._get_cache_file(key)
-        if not cache_file.exists():
-            return None
-        
-        if (time.time() - cache_file.stat().st_mtime) > self.ttl:
-            return None
-            
-        try:
-            return json.loads(cache_file.read_text(encoding="utf-8"))
-        except (json.JSONDecodeError, IOError):
+            row = self._connect().execute(sql, (key, bound)).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Ошибка чтения кэша {key}: {e}")
             return None
+        return row[0] if row else None
 
-    def set(self, key: str, value: Any) -> None:
-        """Безопасная запись через временный файл (атомарно)."""
-        cache_file = self._get_cache_file(key)
+    def set(self, key: str, output: str, ttl: Optional[float] = None) -> None:
+        """Сохраняет ответ на ttl секунд (по умолчанию - текущий ttl кэша)."""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
         try:
-            with tempfile.NamedTemporaryFile('w', delete=False, dir=self.cache_dir, encoding='utf-8') as tf:
-                json.dump(value, tf, ensure_ascii=False)
-                temp_name = tf.name
-            Path(temp_name).replace(cache_file)
-        except (IOError, OSError, PermissionError) as e:
+            db = self._connect()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute(
+                    "INSERT OR REPLACE INTO cache (key, output, stored_at, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, output, now, expires_at),
+                )
+                db.execute("DELETE FROM cache WHERE stored_at < ?", (now - self.retention,))
+                db.execute(
+                    "DELETE FROM cache WHERE key NOT IN "
+                    "(SELECT key FROM cache ORDER BY stored_at DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+        except (sqlite3.Error, OSError) as e:
             logger.error(f"Ошибка записи в кэш {key}: {e}")
 
+
+def render_output(result: Any, fmt: str) -> str:
+    """Текст ответа метрики: JSON для форматов json и lld, иначе значение как есть."""
+    return json.dumps(result, ensure_ascii=False) if fmt in ("json", "lld") else str(result)
+
 # ============================================================================
 # Конфигурация
 # ============================================================================
 
-def _replace_env_vars(config: Any) -> Any:
-    """Заменяет ${VAR:default} значениями из окружения."""
+ENV_PATTERN = re.compile(r"\$\{([^}]+)\}")
+
+
+def _replace_env_vars(config: Any, used: Optional[Dict[str, Optional[str]]] = None) -> Any:
+    """Заменяет ${VAR:default} значениями из окружения (used - прочитанные переменные)."""
     if isinstance(config, dict):
-        return {k: _replace_env_vars(v) for k, v in config.items()}
+        return {k: _replace_env_vars(v, used) for k, v in config.items()}
     elif isinstance(config, list):
-        return [_replace_env_vars(i) for i in config]
+        return [_replace_env_vars(i, used) for i in config]
     elif isinstance(config, str):
-        pattern = r"\$\{([^}]+)\}"
         result = config
-        for match in re.findall(pattern, config):
+        for match in ENV_PATTERN.findall(config):
             parts = match.split(":", 1)
             var_name = parts[0].strip()
             default = parts[1].strip() if len(parts) > 1 else ""
+            if used is not None:
+                used[var_name] = os.environ.get(var_name)
             env_val = os.environ.get(var_name, default).strip('"').strip("'")
             result = result.replace(f"${{{match}}}", env_val)
         return result
     return config
 
-def load_full_config(config_path: Optional[str]) -> Dict[str, Any]:
-    if HAS_DOTENV:
-        load_dotenv()
-
+def _find_config(config_path: Optional[str]) -> Optional[Path]:
     candidates = []
     if config_path:
         candidates.append(Path(config_path))
@@ -140,26 +193,115 @@ def load_full_config(config_path: Optional[str]) -> Dict[str, Any]:
         if os.name == "nt":
             prog_data = os.environ.get("PROGRAMDATA", "C:/ProgramData")
             candidates.append(Path(prog_data) / "1c-monitor/config.yaml")
+    return next((p for p in candidates if p.is_file()), None)
 
-    final_config: Dict[str, Any] = {}
-    for p in candidates:
-        if p.is_file():
+def _read_config(p: Path) -> Dict[str, Any]:
+    try:
+        content = p.read_text(encoding="utf-8")
+        if p.suffix in (".yaml", ".yml") and HAS_YAML:
+            import yaml
             try:
-                content = p.read_text(encoding="utf-8")
-                if p.suffix in (".yaml", ".yml") and HAS_YAML:
-                    final_config = yaml.safe_load(content) or {}
-                else:
-                    final_config = json.loads(content)
-                break
-            except (IOError, OSError, yaml.YAMLError, json.JSONDecodeError) as e:
+                return yaml.safe_load(content) or {}
+            except yaml.YAMLError as e:
                 logger.error(f"Ошибка чтения конфигурации {p}: {e}")
+                return {}
+        return json.loads(content)
+    except (IOError, OSError, json.JSONDecodeError) as e:
+        logger.error(f"Ошибка чтения конфигурации {p}: {e}")
+        return {}
+
+def _compile_config(raw: Dict[str, Any]) -> Settings:
+    """Проверка схемой metrics.settings; ошибка в конфигурации завершает запуск."""
+    try:
+        return Settings.model_validate(raw)
+    except ValueError as e:
+        # pydantic.ValidationError - подкласс ValueError
+        logger.error(f"Ошибка в конфигурации: {e}")
+        raise SystemExit(1) from e
+
+def load_full_config(config_path: Optional[str]) -> Settings:
+    """
+    Конфигурация с подставленными переменными окружения, проверенная схемой Settings.
+
+    Результат сохраняется снимком JSON в каталоге кэша. Снимок используется, пока
+    не изменились файл конфигурации (время изменения, размер), версия схемы Settings
+    и значения переменных окружения, на которые он ссылается: тогда yaml не загружается,
+    а Settings собирается из снимка без проверки схемой.
+    """
+    if HAS_DOTENV:
+        load_dotenv()
+
+    source = _find_config(config_path)
+    try:
+        stat = source.stat() if source else None
+    except OSError:
+        stat = None
+    key = [SCHEMA_VERSION, str(source.resolve()) if stat else None,
+           stat.st_mtime_ns if stat else 0, stat.st_size if stat else 0]
+    snapshot_file = get_cache_dir() / f"config_{hashlib.sha1(str(key[1]).encode()).hexdigest()[:16]}.json"
+
+    try:
+        snapshot = json.loads(snapshot_file.read_text(encoding="utf-8"))
+        if snapshot["key"] == key and all(os.environ.get(n) == v for n, v in snapshot["env"].items()):
+            # Снимок той же версии схемы уже проверен: повторная проверка pydantic не нужна
+            return construct_settings(snapshot["config"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
 
-    return _replace_env_vars(final_config)
+    used: Dict[str, Optional[str]] = {}
+    raw = _replace_env_vars(_read_config(source) if stat else {}, used)
+    config = _compile_config(raw)
+
+    try:
+        snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', delete=False, dir=snapshot_file.parent, encoding='utf-8') as tf:
+            json.dump({"key": key, "env": used, "config": config.model_dump(mode="json")}, tf, ensure_ascii=False)
+            temp_name = tf.name
+        Path(temp_name).replace(snapshot_file)
+    except OSError as e:
+        logger.error(f"Ошибка записи снимка конфигурации: {e}")
+    return config
 
 # ============================================================================
 # Основная логика
 # ============================================================================
 
+METRICS = [
+    "sessions", "rphost", "ras_health", "log_errors", "locks", "calls", "slow_sql", "sql_queries",
+    "lock_contention", "call_profile", "background_jobs", "licenses", "infobase_perf", "os_processes",
+    "custom_counters", "lock_correlation", "history",
+]
+
+# Метрики пакетного режима --metric all, если batch.metrics не задан
+BATCH_METRICS = [
+    "ras_health", "sessions", "rphost", "background_jobs", "licenses", "infobase_perf", "os_processes",
+    "history", "locks", "lock_contention", "calls", "call_profile", "slow_sql", "custom_counters",
+    "log_errors",
+]
+
+# Метрики, у которых get_metric принимает формат вывода вторым аргументом
+FORMAT_AWARE_METRICS = {
+    "sessions", "rphost", "log_errors", "locks", "calls", "slow_sql", "lock_contention", "call_profile",
+    "background_jobs", "licenses", "infobase_perf", "os_processes", "custom_counters",
+    "lock_correlation", "history",
+}
+
+
+# Метрики, опрашивающие RAS через metrics.rac_client
+RAC_METRICS = {"ras_health", "sessions", "rphost", "background_jobs", "licenses", "infobase_perf"}
+# Метрики, которые при недоступности RAS отдают последнее значение из кэша
+# (ras_health в этом случае сразу отвечает 0)
+STALE_ON_OUTAGE = {"sessions", "rphost", "background_jobs", "licenses", "infobase_perf"}
+# Метрики журналов ТЖ -> журнал, который они дочитывают (metrics.watcher.INGESTERS)
+JOURNAL_METRICS = {
+    "locks": "locks",
+    "lock_contention": "locks",
+    "calls": "calls",
+    "call_profile": "calls",
+    "slow_sql": "sql",
+}
+
+
 def safe_import_metric(module_name: str) -> Optional[Callable]:
     """Динамический импорт функции get_metric из папки metrics."""
     try:
@@ -171,10 +313,231 @@ def safe_import_metric(module_name: str) -> Optional[Callable]:
         logger.error(f"Модуль метрики '{module_name}' недоступен: {e}")
         return None
 
+
+def ingest_batch_journals(config: Settings, metrics: list) -> set:
+    """
+    Разбирает новые записи каждого журнала метрик пакета один раз со всеми потребителями.
+
+    Returns:
+        Имена разобранных журналов (и correlation для lock_correlation).
+    """
+    from metrics.watcher import INGESTERS
+
+    journals = {JOURNAL_METRICS[name] for name in metrics if name in JOURNAL_METRICS}
+    if "custom_counters" in metrics:
+        from metrics.custom_counters import matchers
+
+        try:
+            journals.update(matchers(config))
+        except ValueError as e:
+            logger.error(f"Ошибка в секции counters: {e}")
+    done = set()
+    for journal in sorted(journals):
+        try:
+            INGESTERS[journal](config)
+            done.add(journal)
+        except Exception as e:
+            logger.exception(f"Ошибка разбора журнала {journal}: {e}")
+    if "lock_correlation" in metrics:
+        from metrics.lock_correlation import ingest_correlation
+
+        try:
+            ingest_correlation(config)
+            done.add("correlation")
+        except Exception as e:
+            logger.exception(f"Ошибка сопоставления журналов: {e}")
+    return done
+
+
+def collect_batch(
+    config: Settings, metrics: list, cache: Optional[SQLiteTTLCache] = None
+) -> Dict[str, Any]:
+    """
+    Все метрики за один запуск (формат json, null - метрика недоступна).
+
+    Метрики RAS разбирают общие снимки rac_client.snapshot. Журналы ТЖ разбираются
+    заранее, по одному проходу на журнал (ingest_batch_journals), а метрики журналов
+    только читают сохраненное состояние. Если RAS недоступен, метрики STALE_ON_OUTAGE
+    берут последнее значение из кэша (ключ <метрика>_json), каждая по отдельности.
+    """
+    from metrics.journal import already_ingested
+
+    stale_fallback = cache is not None and bool(STALE_ON_OUTAGE.intersection(metrics))
+    if stale_fallback:
+        from metrics.rac_client import get_breaker
+    result: Dict[str, Any] = {}
+    with already_ingested(ingest_batch_journals(config, metrics)):
+        for name in metrics:
+            get_metric_func = safe_import_metric(name)
+            if get_metric_func is None:
+                result[name] = None
+                continue
+            try:
+                result[name] = (
+                    get_metric_func(config, "json")
+                    if name in FORMAT_AWARE_METRICS
+                    else get_metric_func(config)
+                )
+            except Exception as e:
+                logger.exception(f"Ошибка в метрике {name}: {e}")
+                result[name] = None
+            if not stale_fallback or name not in STALE_ON_OUTAGE:
+                continue
+            cache_key = f"{name}_json"
+            # Состояние перечитывается: его обновил rac_client во время опроса метрики
+            if get_breaker(config).is_open():
+                stale = cache.get(cache_key, max_age=float("inf"))
+                if stale is not None:
+                    result[name] = json.loads(stale)
+            elif result[name] is not None:
+                cache.set(cache_key, render_output(result[name], "json"))
+    return result
+
+
+def _parse_time(value: str) -> float:
+    """Время для запроса: ISO (2024-01-10, 2024-01-10T12:00), now или смещение -7d / -12h / -30m."""
+    value = value.strip()
+    if value == "now":
+        return time.time()
+    m = re.fullmatch(r"-(\d+)([dhm])", value)
+    if m:
+        return time.time() - int(m.group(1)) * {"d": 86400, "h": 3600, "m": 60}[m.group(2)]
+    from datetime import datetime
+    return datetime.fromisoformat(value).timestamp()
+
+
+def run_query(argv: list) -> int:
+    """Подкоманда query: агрегаты по архиву событий ТЖ (секция archive конфигурации)."""
+    parser = argparse.ArgumentParser(prog="main.py query", description="Запрос к архиву событий ТЖ")
+    parser.add_argument("--journal", required=True, help="Журнал: locks, calls, sql")
+    parser.add_argument("--from", dest="start", default="-1d", help="Начало: ISO-дата или -7d/-12h")
+    parser.add_argument("--to", dest="end", default="now", help="Конец: ISO-дата, now или -1h")
+    parser.add_argument("--event", nargs="+", help="Только указанные события (TLOCK, CALL ...)")
+    parser.add_argument("--group-by", default="event",
+                        help="event, process, hour, day или имя свойства из archive.properties")
+    parser.add_argument("--where", action="append", default=[], metavar="СВОЙСТВО=ЗНАЧЕНИЕ")
+    parser.add_argument("--top", type=int, default=0)
+    parser.add_argument("--format", choices=["plain", "json"], default="json")
+    parser.add_argument("--config", help="Путь к config.yaml")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if args.debug else "ERROR")
+
+    try:
+        start, end = _parse_time(args.start), _parse_time(args.end)
+        where = dict(item.split("=", 1) for item in args.where)
+    except ValueError as e:
+        parser.error(str(e))
+
+    from metrics.archive import query
+    try:
+        rows = query(load_full_config(args.config), args.journal, start, end,
+                     events=args.event, group_by=args.group_by, where=where, top=args.top)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.format == "json":
+        print(json.dumps(rows, ensure_ascii=False))
+    else:
+        for row in rows:
+            print("\t".join(str(v) for v in row.values()))
+    return 0
+
+
+def run_watch(argv: list) -> int:
+    """Подкоманда watch: сборщик, который разбирает журналы ТЖ по мере записи (секция watch)."""
+    parser = argparse.ArgumentParser(prog="main.py watch", description="Слежение за журналами ТЖ")
+    parser.add_argument("--journal", nargs="+", choices=["locks", "calls", "sql"],
+                        help="Журналы (по умолчанию watch.journals или все)")
+    parser.add_argument("--backend", choices=["auto", "inotify", "poll"],
+                        help="inotify (Linux) или опрос каталогов; по умолчанию watch.backend")
+    parser.add_argument("--config", help="Путь к config.yaml")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if args.debug else "INFO")
+
+    import signal
+    import threading
+    from metrics.watcher import JournalWatcher
+
+    watcher = JournalWatcher(load_full_config(args.config), args.journal, args.backend)
+    if not watcher.journals:
+        logger.error("Не найден ни один каталог журнала")
+        return 1
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        watcher.run(stop)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_replay(argv: list) -> int:
+    """Подкоманда replay: метрики по сохраненному дереву ТЖ с модельными часами и замер скорости."""
+    from metrics.replay import SOURCES, replay
+    parser = argparse.ArgumentParser(prog="main.py replay", description="Воспроизведение архива ТЖ")
+    parser.add_argument("--path", help="Корень дерева ТЖ (locks, calls, Query1c, excps); "
+                                       "по умолчанию пути секции logs")
+    parser.add_argument("--metric", nargs="+", choices=list(SOURCES), help="По умолчанию все")
+    parser.add_argument("--interval", type=int, default=60, help="Шаг модельных часов, секунд")
+    parser.add_argument("--from", dest="start", help="Начало: ISO-дата или -7d/-12h")
+    parser.add_argument("--to", dest="end", help="Конец: ISO-дата, now или -1h")
+    parser.add_argument("--format", choices=["plain", "json"], default="json")
+    parser.add_argument("--config", help="Путь к config.yaml")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if args.debug else "ERROR")
+
+    if args.interval <= 0:
+        parser.error("--interval должен быть больше 0")
+    try:
+        start = _parse_time(args.start) if args.start else None
+        end = _parse_time(args.end) if args.end else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    result = replay(load_full_config(args.config), args.metric, args.path,
+                    interval=args.interval, start=start, end=end)
+    if not result["journals"]:
+        logger.error("Не найден ни один каталог журнала")
+        return 1
+
+    if args.format == "json":
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        # Ряд значений - в stdout (TSV), пропускная способность - в stderr
+        columns = list(result["series"][0]) if result["series"] else ["time"]
+        print("\t".join(columns))
+        for row in result["series"]:
+            print("\t".join(str(row.get(name, "")) for name in columns))
+        print(" ".join(f"{k}={v}" for k, v in result["throughput"].items()), file=sys.stderr)
+    return 0
+
+
+# Подкоманды: первый аргумент командной строки -> обработчик остальных аргументов
+COMMANDS: Dict[str, Callable[[list], int]] = {
+    "query": run_query, "watch": run_watch, "replay": run_replay,
+}
+
+
 def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        return COMMANDS[sys.argv[1]](sys.argv[2:])
+
     parser = argparse.ArgumentParser(description="1C Zabbix Monitor CLI")
-    parser.add_argument("--metric", required=True, 
-                        choices=["sessions", "rphost", "ras_health", "log_errors", "locks", "calls", "slow_sql", "sql_queries"])
+    parser.add_argument(
+        "--metric",
+        required=True,
+        choices=[*METRICS, "all"],
+        help="all - все метрики одним JSON-документом (batch.metrics)",
+    )
     parser.add_argument("--format", choices=["plain", "json", "lld"], default="plain")
     parser.add_argument("--config", help="Путь к config.yaml")
     parser.add_argument("--no-cache", action="store_true")
@@ -190,37 +553,84 @@ def main() -> int:
     config = load_full_config(args.config)
 
     # 2. Определение пути к RAC (автопоиск через utils_1c)
-    if "ras" not in config: config["ras"] = {}
-    config["ras"]["path"] = get_rac_path(config)
+    config.rac.path = get_rac_path(config)
+
+    batch = None
+    if args.metric == "all":
+        # Пакетный режим: один JSON для зависимых элементов Zabbix
+        args.format = "json"
+        batch = config.batch.metrics or BATCH_METRICS
 
     # 3. Кэширование
-    ttl = int(config.get("cache", {}).get("ttl", 60))
-    cache = FileTTLCache(ttl=ttl) if not args.no_cache else None
+    ttl = config.cache.ttl
+    cache = (
+        None
+        if args.no_cache
+        else SQLiteTTLCache(
+            ttl=ttl,
+            retention=config.cache.retention,
+            max_entries=config.cache.max_entries,
+        )
+    )
     cache_key = f"{args.metric}_{args.format}"
 
+    breaker = None
+    if args.metric in RAC_METRICS:
+        from metrics.rac_client import get_breaker
+        breaker = get_breaker(config)
+
     if cache:
-        cached_val = cache.get(cache_key)
-        if cached_val is not None:
-            output = cached_val if args.format == "plain" else json.dumps(cached_val, ensure_ascii=False)
-            print(output)
+        cached_output = cache.get(cache_key)
+        if (
+            cached_output is None
+            and breaker is not None
+            and breaker.is_open()
+            and args.metric in STALE_ON_OUTAGE
+        ):
+            cached_output = cache.get(cache_key, max_age=float("inf"))
+        if cached_output is not None:
+            print(cached_output)
             return 0
 
     # 4. Сбор данных
+    if batch is not None:
+        output = render_output(collect_batch(config, batch, cache), args.format)
+        if cache:
+            cache.set(cache_key, output)
+        print(output)
+        return 0
+
     get_metric_func = safe_import_metric(args.metric)
     if get_metric_func is None:
         print("0")
         return 1
 
     try:
-        if args.metric == "rphost":
+        started = time.perf_counter()
+        if args.metric in FORMAT_AWARE_METRICS:
             result = get_metric_func(config, args.format)
         else:
             result = get_metric_func(config)
 
-        if cache:
-            cache.set(cache_key, result)
+        if breaker is not None:
+            # Состояние перечитывается: его обновил rac_client во время опроса
+            breaker = get_breaker(config)
+            if not breaker.state["failures"]:
+                breaker.observe(cache_key, time.perf_counter() - started)
 
-        print(json.dumps(result, ensure_ascii=False) if args.format in ["json", "lld"] else result)
+        output = render_output(result, args.format)
+        if cache:
+            # Медленный RAS опрашивается реже: срок годности ответа растет вместе с задержкой
+            entry_ttl = (
+                None
+                if breaker is None
+                else breaker.adaptive_ttl(
+                    cache_key, ttl, config.rac.slow_latency, config.cache.max_ttl
+                )
+            )
+            cache.set(cache_key, output, entry_ttl)
+
+        print(output)
 
     except (RuntimeError, ValueError, KeyError, TypeError) as e:
         logger.exception(f"Ошибка в метрике {args.metric}: {e}")
@@ -0,0 +1,465 @@
+"""
+Сжатый колоночный архив разобранных событий ТЖ.
+
+Платформа удаляет ТЖ по истечении history, а метрики хранят только агрегаты.
+Если archive.enabled включен, метрики журналов добавляют к потребителям ingest
+EventArchive (consumers.journal_consumers): события дописываются в сегменты
+<archive.path>/<журнал>/YYYYMMDDHH.seg (один файл на час).
+
+Блоки сначала пишутся в pending.blk и переносятся в сегменты только после того,
+как ingest зафиксировал позиции чтения журнала (committed). Каждый блок помечен
+номером пакета, а pending.blk - позициями, зафиксированными до пакета: после сбоя
+до фиксации блоки отбрасываются (записи будут прочитаны повторно), после фиксации -
+дописываются, причем блок, уже попавший в сегмент, повторно не добавляется.
+
+Сегмент - последовательность блоков. Блок содержит колонки timestamp, duration,
+event, process и выбранные свойства (archive.properties), каждая колонка - массив
+array, сжатый zlib. Строковые колонки хранятся словарем значений и кодами.
+Запрос (query) распаковывает только нужные колонки и не разбирает текст журнала;
+фильтры и группировка выполняются над массивами колонок списками индексов строк.
+"""
+
+import json
+import os
+import struct
+import sys
+import time
+import uuid
+import zlib
+from array import array
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .journal import JournalRecord, RecordHeader, get_state_dir, journal_reader
+from .settings import DEFAULT_ARCHIVE_PROPERTIES, ConfigLike, as_settings
+
+_MAGIC = b"1CAB"
+_VERSION = 1
+# магия, версия, длина метаданных блока
+_BLOCK = struct.Struct("<4sHI")
+
+DEFAULT_PROPERTIES = DEFAULT_ARCHIVE_PROPERTIES
+DEFAULT_RETENTION_DAYS = 30
+# Сколько строк часа копится в памяти до записи блока
+FLUSH_ROWS = 65536
+
+_SEGMENT_NAME = "%Y%m%d%H"
+# Блоки, ожидающие фиксации позиций чтения журнала
+PENDING_NAME = "pending.blk"
+
+
+def get_archive_dir(config: ConfigLike) -> Path:
+    """Каталог архива: archive.path или подкаталог archive каталога состояния."""
+    settings = as_settings(config)
+    path = settings.archive.path
+    return Path(path) if path else get_state_dir(settings) / "archive"
+
+
+class _SegmentBuffer:
+    """Строки одного часа, накопленные до записи блока."""
+
+    def __init__(self, properties: List[str]):
+        self.timestamp = array("d")
+        self.duration = array("q")
+        # колонка -> коды значений; словарь значение -> код (код 0 - пустое значение)
+        self.codes: Dict[str, array] = {
+            name: array("I") for name in ["event", "process", *properties]
+        }
+        self.values: Dict[str, Dict[str, int]] = {name: {"": 0} for name in self.codes}
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def encode(self, column: str, value: Optional[str]) -> None:
+        values = self.values[column]
+        code = values.get(value or "")
+        if code is None:
+            code = values[value] = len(values)
+        self.codes[column].append(code)
+
+    def extend(self, other: "_SegmentBuffer") -> None:
+        """Добавляет строки other с перекодированием словарей."""
+        self.timestamp.extend(other.timestamp)
+        self.duration.extend(other.duration)
+        for column, codes in other.codes.items():
+            remap = [0] * len(other.values[column])
+            for value, code in other.values[column].items():
+                if value not in self.values[column]:
+                    self.values[column][value] = len(self.values[column])
+                remap[code] = self.values[column][value]
+            self.codes[column].extend(remap[code] for code in codes)
+
+    def write(self, f, extra: Optional[Dict[str, Any]] = None) -> None:
+        """Записывает блок; extra - дополнительные поля метаданных (час, пакет)."""
+        columns: List[Tuple[str, array]] = [
+            ("timestamp", self.timestamp),
+            ("duration", self.duration),
+            *self.codes.items(),
+        ]
+        blobs = [zlib.compress(column.tobytes(), 6) for _, column in columns]
+        meta = {
+            "rows": len(self),
+            "byteorder": sys.byteorder,
+            "columns": [
+                [name, column.typecode, len(blob)] for (name, column), blob in zip(columns, blobs)
+            ],
+            # Словарь в порядке кодов
+            "dicts": {name: list(values) for name, values in self.values.items()},
+            **(extra or {}),
+        }
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        f.write(_BLOCK.pack(_MAGIC, _VERSION, len(meta_bytes)) + meta_bytes + b"".join(blobs))
+
+
+class EventArchive:
+    """Потребитель journal.ingest: дописывает события в часовые сегменты архива."""
+
+    def __init__(
+        self,
+        directory: Optional[Path],
+        properties: Optional[Iterable[str]] = None,
+        retention_days: int = DEFAULT_RETENTION_DAYS,
+        flush_rows: int = FLUSH_ROWS,
+        state_file: Optional[Path] = None,
+    ):
+        """
+        Args:
+            state_file: файл позиций чтения журнала. Если задан, блоки ждут
+                в pending.blk вызова committed(); иначе сразу дописываются в сегменты.
+        """
+        self.directory = Path(directory) if directory else None
+        self.properties = list(DEFAULT_PROPERTIES if properties is None else properties)
+        self.retention_days = retention_days
+        self.flush_rows = flush_rows
+        self.state_file = Path(state_file) if state_file else None
+        self._buffers: Dict[int, _SegmentBuffer] = {}
+        # Метка пакета: номер и позиции журнала, зафиксированные до него
+        self._batch: Optional[Dict[str, Any]] = None
+
+    def feed(self, record: JournalRecord, header: RecordHeader) -> None:
+        hour = int(record.hour or header.timestamp // 3600 * 3600)
+        buffer = self._buffers.get(hour)
+        if buffer is None:
+            buffer = self._buffers[hour] = _SegmentBuffer(self.properties)
+        buffer.timestamp.append(header.timestamp)
+        buffer.duration.append(header.duration)
+        buffer.encode("event", header.event)
+        buffer.encode("process", os.path.basename(os.path.dirname(record.path)))
+        for name in self.properties:
+            buffer.encode(name, record.get(name))
+        if self.flush_rows and len(buffer) >= self.flush_rows:
+            self._flush(hour)
+
+    def spawn(self) -> "EventArchive":
+        # Рабочий процесс ничего не пишет: сегменты дописывает только основной процесс
+        return EventArchive(None, self.properties, self.retention_days, flush_rows=0)
+
+    def merge(self, other: "EventArchive") -> None:
+        for hour, buffer in other._buffers.items():
+            if hour in self._buffers:
+                self._buffers[hour].extend(buffer)
+            else:
+                self._buffers[hour] = buffer
+            if self.flush_rows and len(self._buffers[hour]) >= self.flush_rows:
+                self._flush(hour)
+
+    def _segment(self, hour: int) -> Path:
+        return self.directory / (time.strftime(_SEGMENT_NAME, time.localtime(hour)) + ".seg")
+
+    def _committed_token(self) -> Any:
+        """Отметка последней фиксации позиций чтения журнала (None - еще не было)."""
+        try:
+            return json.loads(self.state_file.read_text(encoding="utf-8")).get("updated_at")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _flush(self, hour: int) -> None:
+        buffer = self._buffers.pop(hour, None)
+        if not buffer or self.directory is None:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if self.state_file is None:
+                with open(self._segment(hour), "ab") as f:
+                    buffer.write(f)
+                return
+            if self._batch is None:
+                # Блоки прошлого прогона разбираются до первого блока нового пакета
+                self._recover()
+                self._batch = {"batch": uuid.uuid4().hex, "base": self._committed_token()}
+            with open(self.directory / PENDING_NAME, "ab") as f:
+                buffer.write(f, {"hour": hour, **self._batch})
+        except OSError:
+            pass
+
+    def _recover(self) -> None:
+        """Разбирает pending.blk, оставшийся после сбоя предыдущего прогона."""
+        pending = self.directory / PENDING_NAME
+        metas = [meta for meta, _ in _raw_blocks(pending)]
+        if metas and metas[0].get("base") == self._committed_token():
+            # Позиции не зафиксированы: записи пакета будут прочитаны повторно
+            try:
+                pending.unlink()
+            except OSError:
+                pass
+        elif pending.exists():
+            self.committed()
+
+    def committed(self) -> None:
+        """
+        Переносит блоки pending.blk в сегменты; вызывается ingest после фиксации позиций.
+
+        Блок пакета, который уже есть в конце сегмента (сбой во время переноса),
+        повторно не дописывается.
+        """
+        self._batch = None
+        if self.directory is None or self.state_file is None:
+            return
+        pending = self.directory / PENDING_NAME
+        try:
+            for meta, raw in _raw_blocks(pending):
+                segment = self._segment(meta["hour"])
+                tail = None
+                for tail, _ in _raw_blocks(segment, data=False):
+                    pass
+                if tail is not None and tail.get("batch") == meta["batch"]:
+                    continue
+                with open(segment, "ab") as f:
+                    f.write(raw)
+            pending.unlink()
+        except (OSError, KeyError):
+            pass
+
+    def save(self) -> None:
+        """Записывает накопленные строки и удаляет сегменты старше retention_days."""
+        for hour in sorted(self._buffers):
+            self._flush(hour)
+        if self.directory is None or not self.retention_days:
+            return
+        cutoff = time.strftime(
+            _SEGMENT_NAME, time.localtime(time.time() - self.retention_days * 86400)
+        )
+        try:
+            for path in self.directory.glob("*.seg"):
+                if path.stem < cutoff:
+                    path.unlink()
+        except OSError:
+            pass
+
+
+def archive_consumer(config: ConfigLike, journal: str) -> Optional[EventArchive]:
+    """Потребитель архива для журнала или None, если архив выключен."""
+    settings = as_settings(config)
+    if not settings.archive.enabled:
+        return None
+    return EventArchive(
+        get_archive_dir(settings) / journal,
+        settings.archive.properties,
+        settings.archive.retention_days,
+        state_file=journal_reader(settings, journal).state_file,
+    )
+
+
+# ----------------------------------------------------------------------
+# Чтение и запросы
+# ----------------------------------------------------------------------
+
+
+def _raw_blocks(path: Path, data: bool = True) -> Iterator[Tuple[Dict[str, Any], bytes]]:
+    """Метаданные и байты блоков файла как есть (без байтов, если data=False)."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                head = f.read(_BLOCK.size)
+                if len(head) < _BLOCK.size:
+                    return
+                magic, version, meta_len = _BLOCK.unpack(head)
+                if magic != _MAGIC or version != _VERSION:
+                    return
+                meta_bytes = f.read(meta_len)
+                meta = json.loads(meta_bytes.decode("utf-8"))
+                size = sum(column[2] for column in meta["columns"])
+                if data:
+                    yield meta, head + meta_bytes + f.read(size)
+                else:
+                    f.seek(size, os.SEEK_CUR)
+                    yield meta, b""
+    except (OSError, ValueError, KeyError, struct.error):
+        return
+
+
+def read_blocks(
+    path: Path, columns: Optional[Iterable[str]] = None
+) -> Iterator[Tuple[int, Dict[str, array], Dict[str, List[str]]]]:
+    """
+    Блоки сегмента: (число строк, колонки, словари строковых колонок).
+
+    Распаковываются только колонки из columns (все, если None); колонки, которых
+    в блоке нет (свойство добавлено в archive.properties позже), возвращаются нулями.
+    """
+    wanted = None if columns is None else set(columns)
+    try:
+        with open(path, "rb") as f:
+            while True:
+                head = f.read(_BLOCK.size)
+                if len(head) < _BLOCK.size:
+                    return
+                magic, version, meta_len = _BLOCK.unpack(head)
+                if magic != _MAGIC or version != _VERSION:
+                    return
+                meta = json.loads(f.read(meta_len).decode("utf-8"))
+                rows = meta["rows"]
+                data: Dict[str, array] = {}
+                for name, typecode, size in meta["columns"]:
+                    if wanted is not None and name not in wanted:
+                        f.seek(size, os.SEEK_CUR)
+                        continue
+                    column = array(typecode)
+                    column.frombytes(zlib.decompress(f.read(size)))
+                    if meta["byteorder"] != sys.byteorder:
+                        column.byteswap()
+                    data[name] = column
+                for name in wanted or ():
+                    if name not in data:
+                        data[name] = array("I", [0]) * rows
+                yield rows, data, meta["dicts"]
+    except (OSError, ValueError, KeyError, zlib.error, struct.error):
+        return
+
+
+def _aggregate(keys: List[int], values: List[int]) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    (ключ, количество, сумма, максимум) значений по ключам.
+
+    Строки сортируются по ключу, сумма и максимум берутся по срезам.
+    """
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    ordered = list(map(values.__getitem__, order))
+    pos = 0
+    for key, count in sorted(Counter(keys).items()):
+        chunk = ordered[pos : pos + count]
+        pos += count
+        yield key, count, sum(chunk), max(chunk)
+
+
+def segment_files(directory: Path, start: float, end: float) -> List[Path]:
+    """Сегменты, часы которых пересекаются с интервалом [start, end)."""
+    result = []
+    for path in sorted(Path(directory).glob("*.seg")):
+        try:
+            hour = datetime.strptime(path.stem, _SEGMENT_NAME).timestamp()
+        except ValueError:
+            continue
+        if hour + 3600 > start and hour < end:
+            result.append(path)
+    return result
+
+
+def query(
+    config: ConfigLike,
+    journal: str,
+    start: float,
+    end: float,
+    events: Optional[Iterable[str]] = None,
+    group_by: str = "event",
+    where: Optional[Dict[str, str]] = None,
+    top: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Агрегаты событий архива за [start, end): количество, суммарная, средняя
+    и максимальная длительность по группам.
+
+    Args:
+        group_by: колонка группировки (event, process, свойство) или hour / day.
+        where: точные значения колонок, например {"Usr": "Иванов"}.
+        top: сколько групп вернуть (0 - все), по убыванию суммарной длительности.
+
+    Raises:
+        ValueError: group_by не является колонкой архива, hour или day.
+    """
+    allowed = {"event", "process", "hour", "day", *as_settings(config).archive.properties}
+    if group_by not in allowed:
+        raise ValueError(
+            f"Группировка по {group_by!r} невозможна: колонка не архивируется "
+            f"(допустимо: {', '.join(sorted(allowed))})"
+        )
+    events = {e.upper() for e in events} if events else None
+    where = where or {}
+    start, end = float(start), float(end)
+    time_key = group_by if group_by in ("hour", "day") else None
+    columns = {"timestamp", "duration", "event", *where}
+    if time_key is None:
+        columns.add(group_by)
+
+    groups: Dict[Any, List[int]] = {}
+    for path in segment_files(get_archive_dir(config) / journal, start, end):
+        for rows, data, dicts in read_blocks(path, columns):
+            timestamps, durations = data["timestamp"], data["duration"]
+            if not rows or max(timestamps) < start or min(timestamps) >= end:
+                continue
+            # Фильтры по строковым колонкам - маски по кодам словаря блока
+            masks: List[Tuple[array, bytes]] = []
+            if events is not None:
+                values = dicts.get("event", [])
+                masks.append((data["event"], bytes(v.upper() in events for v in values)))
+            for name, value in where.items():
+                masks.append((data[name], bytes(v == value for v in dicts.get(name, []))))
+            if any(not any(mask) for _, mask in masks):
+                continue
+
+            # Индексы подходящих строк: map/compress без цикла Python по строкам
+            index: Iterable[int] = range(rows)
+            if min(timestamps) < start:
+                index = compress(index, map(start.__le__, timestamps))
+            if max(timestamps) >= end:
+                index = compress(index, map(end.__gt__, timestamps))
+            index = list(index)
+            for column, mask in masks:
+                index = list(compress(index, map(mask.__getitem__, map(column.__getitem__, index))))
+            if not index:
+                continue
+
+            selected = list(map(durations.__getitem__, index))
+            if time_key is None:
+                labels = dicts.get(group_by, [""])
+                keys = list(map(data[group_by].__getitem__, index))
+            else:
+                # Ключ - номер часа; день определяется по часу после агрегации
+                keys = list(
+                    map(int, map((3600.0).__rfloordiv__, map(timestamps.__getitem__, index)))
+                )
+            for code, count, total, peak in _aggregate(keys, selected):
+                if time_key is None:
+                    key: Any = labels[code]
+                elif time_key == "hour":
+                    key = code * 3600
+                else:
+                    key = time.strftime("%Y-%m-%d", time.localtime(code * 3600))
+                stats = groups.get(key)
+                if stats is None:
+                    groups[key] = [count, total, peak]
+                else:
+                    stats[0] += count
+                    stats[1] += total
+                    stats[2] = max(stats[2], peak)
+
+    result = [
+        {
+            group_by: (
+                time.strftime("%Y-%m-%d %H:00", time.localtime(key)) if time_key == "hour" else key
+            ),
+            "count": count,
+            "duration": total,
+            "avg_duration": round(total / count, 1),
+            "max_duration": peak,
+        }
+        for key, (count, total, peak) in groups.items()
+    ]
+    if time_key:
+        result.sort(key=lambda row: row[group_by])
+    else:
+        result.sort(key=lambda row: row["duration"], reverse=True)
+    return result[:top] if top else result
@@ -0,0 +1,134 @@
+"""
+Фоновые и регламентные задания по данным rac session list.
+
+Сеансы заданий отличаются от пользовательских значением app-id (BackgroundJob,
+SystemBackgroundJob, JobScheduler). Метрика разбирает тот же снимок session list,
+что и sessions (rac_client.snapshot), поэтому не обращается к кластерам повторно.
+Имена информационных баз берутся из последнего состава обнаружения infobases.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+from .discovery import discover_infobases, known_items
+from .rac_client import snapshot
+from .settings import ConfigLike, as_settings
+
+# app-id сеансов заданий
+JOB_APPS = ("BackgroundJob", "SystemBackgroundJob", "JobScheduler")
+DEFAULT_LONG_RUNNING = 600
+DEFAULT_TOP = 10
+
+
+def _to_int(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def _age(started_at: Optional[str], now: float) -> Optional[int]:
+    """Секунды с начала сеанса (started-at - локальное время сервера)."""
+    try:
+        return int(now - datetime.fromisoformat(started_at).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize_jobs(
+    sessions: List[Dict[str, str]],
+    names: Dict[str, str],
+    long_running: int = DEFAULT_LONG_RUNNING,
+    top: int = DEFAULT_TOP,
+    now: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Сводка по сеансам заданий: количество по типам и базам, CPU и память
+    (cpu-time-current, memory-current) и задания дольше long_running секунд.
+    """
+    now = time.time() if now is None else now
+    by_type = dict.fromkeys(JOB_APPS, 0)
+    infobases: Dict[str, Dict[str, Any]] = {}
+    long_jobs: List[Dict[str, Any]] = []
+
+    for block in sessions:
+        app_id = block.get("app-id")
+        if app_id not in by_type:
+            continue
+        by_type[app_id] += 1
+        infobase_id = block.get("infobase", "")
+        cpu_time = _to_int(block.get("cpu-time-current"))
+        memory = _to_int(block.get("memory-current"))
+        ib = infobases.get(infobase_id)
+        if ib is None:
+            ib = infobases[infobase_id] = {
+                "infobase": infobase_id,
+                "name": names.get(infobase_id, infobase_id),
+                "jobs": 0,
+                "long_running": 0,
+                "cpu_time": 0,
+                "memory": 0,
+            }
+        ib["jobs"] += 1
+        ib["cpu_time"] += cpu_time
+        ib["memory"] += memory
+
+        age = _age(block.get("started-at"), now)
+        if age is not None and age >= long_running:
+            ib["long_running"] += 1
+            long_jobs.append(
+                {
+                    "session_id": block.get("session-id", ""),
+                    "infobase": ib["name"],
+                    "app_id": app_id,
+                    "user": block.get("user-name", ""),
+                    "host": block.get("host", ""),
+                    "process": block.get("process", ""),
+                    "age": age,
+                    "cpu_time": cpu_time,
+                    "memory": memory,
+                }
+            )
+
+    long_jobs.sort(key=lambda job: job["age"], reverse=True)
+    ibs = sorted(infobases.values(), key=lambda ib: ib["name"])
+    return {
+        "total": sum(by_type.values()),
+        "by_type": by_type,
+        "long_running": len(long_jobs),
+        "cpu_time": sum(ib["cpu_time"] for ib in ibs),
+        "memory": sum(ib["memory"] for ib in ibs),
+        "infobases": ibs,
+        "longest": long_jobs[:top],
+    }
+
+
+def get_metric(config: ConfigLike, fmt: str = "plain") -> Union[int, Dict[str, Any]]:
+    """
+    Фоновые и регламентные задания во всех кластерах.
+
+    Формат json - сводка summarize_jobs, lld - обнаружение информационных баз,
+    plain - количество выполняющихся заданий.
+    """
+    if fmt == "lld":
+        return discover_infobases(config)
+
+    try:
+        sessions = snapshot(config, ["session", "list"])
+    except Exception:
+        sessions = None
+    if sessions is None:
+        return {} if fmt == "json" else 0
+
+    jobs_cfg = as_settings(config).background_jobs
+    names = {
+        item["{#INFOBASE_ID}"]: item["{#INFOBASE}"] for item in known_items(config, "infobases")
+    }
+    summary = summarize_jobs(
+        sessions,
+        names,
+        jobs_cfg.long_running,
+        jobs_cfg.top,
+    )
+    return summary if fmt == "json" else summary["total"]
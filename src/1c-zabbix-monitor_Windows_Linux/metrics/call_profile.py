@@ -0,0 +1,139 @@
+"""
+Профилирование серверных вызовов по событиям CALL журнала calls.
+
+Событие CALL уже содержит длительность, Context=, CpuTime=, Memory=, MemoryPeak=,
+InBytes= и OutBytes=. CallProfiler группирует вызовы по нормализованному контексту
+(или только по модулю, logs.calls.profile.group_by: module) и копит итоги
+по интервалам. Размер словаря ограничен: при переполнении остаются самые тяжелые контексты.
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .journal import IntervalAggregator, JournalRecord, RecordHeader, get_property, trim_top
+from .settings import ConfigLike
+
+DEFAULT_INTERVAL = 300
+DEFAULT_TOP = 10
+
+# Номер строки модуля в контексте: "Модуль : 123 : Метод()" -> "Модуль : Метод()"
+_LINE_NUMBER = re.compile(r"\s*:\s*\d+\s*:\s*")
+_NO_CONTEXT = "<без контекста>"
+
+# Порядок счетчиков в агрегате контекста
+_FIELDS = ("count", "duration", "cpu_time", "memory", "memory_peak", "in_bytes", "out_bytes")
+_NUMERIC_PROPERTIES = (("CpuTime", 2), ("Memory", 3), ("InBytes", 5), ("OutBytes", 6))
+
+
+def _to_int(value: Union[str, bytes, None]) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def normalize_context(context: str, group_by: str = "context") -> str:
+    """Первая строка контекста без номеров строк (или только имя модуля)."""
+    first_line = context.strip().splitlines()[0].strip() if context.strip() else ""
+    if not first_line:
+        return _NO_CONTEXT
+    if group_by == "module":
+        return first_line.split(" : ", 1)[0].strip()
+    return _LINE_NUMBER.sub(" : ", first_line)
+
+
+class CallProfiler(IntervalAggregator):
+    """Потребитель journal.ingest: итоги серверных вызовов по контекстам за интервал."""
+
+    def __init__(
+        self,
+        interval: int = DEFAULT_INTERVAL,
+        top: int = DEFAULT_TOP,
+        path: Optional[Path] = None,
+        group_by: str = "context",
+    ):
+        super().__init__(interval, top, path)
+        self.group_by = group_by
+
+    def new_interval(self, start: int) -> Dict[str, Any]:
+        # контекст -> [count, duration, cpu_time, memory, memory_peak, in_bytes, out_bytes]
+        return {"start": start, "calls": 0, "duration": 0, "contexts": {}}
+
+    def _key(self, record: JournalRecord) -> str:
+        context = record.get("Context")
+        if context:
+            return normalize_context(context, self.group_by)
+        # Вызовы без контекста (например, служебные) группируются по интерфейсу и методу
+        iname, mname = record.get("IName"), record.get("MName")
+        if iname or mname:
+            return f"{iname or ''}.{mname or ''}"
+        return _NO_CONTEXT
+
+    def feed(self, record: JournalRecord, header: RecordHeader) -> None:
+        if header.event.upper() != "CALL":
+            return
+        bucket = self.interval_for(header.timestamp)
+        if bucket is None:
+            return
+        bucket["calls"] += 1
+        bucket["duration"] += header.duration
+
+        stats = bucket["contexts"].setdefault(self._key(record), [0] * len(_FIELDS))
+        stats[0] += 1
+        stats[1] += header.duration
+        # Числа разбираются прямо из байтов записи, без декодирования
+        data = record.data
+        for name, index in _NUMERIC_PROPERTIES:
+            stats[index] += _to_int(get_property(data, name))
+        stats[4] = max(stats[4], _to_int(get_property(data, "MemoryPeak")))
+        trim_top(bucket["contexts"], self.top, key=lambda kv: kv[1][1])
+
+    def merge_interval(self, target: Dict[str, Any], source: Dict[str, Any]) -> None:
+        target["calls"] += source["calls"]
+        target["duration"] += source["duration"]
+        for context, stats in source["contexts"].items():
+            merged = target["contexts"].setdefault(context, [0] * len(_FIELDS))
+            for i, value in enumerate(stats):
+                merged[i] = max(merged[i], value) if i == 4 else merged[i] + value
+        trim_top(target["contexts"], self.top, key=lambda kv: kv[1][1])
+
+    def report(self, now: Optional[float] = None) -> Dict[str, Any]:
+        bucket = self.completed(now)
+        contexts = sorted(bucket.get("contexts", {}).items(), key=lambda kv: kv[1][1], reverse=True)
+        return {
+            "interval_start": bucket["start"],
+            "interval": self.interval,
+            "calls": bucket.get("calls", 0),
+            "duration": bucket.get("duration", 0),
+            "contexts": [
+                {"context": name, **dict(zip(_FIELDS, stats))}
+                for name, stats in contexts[: self.top]
+            ],
+        }
+
+    def discovery(self, now: Optional[float] = None) -> Dict[str, List[Dict[str, str]]]:
+        """LLD по самым тяжелым контекстам последнего завершенного интервала."""
+        return {"data": [{"{#CALL_CONTEXT}": c["context"]} for c in self.report(now)["contexts"]]}
+
+
+def get_metric(config: ConfigLike, fmt: str = "json") -> Union[int, Dict[str, Any]]:
+    """
+    Профиль серверных вызовов за последний завершенный интервал.
+
+    Формат json - топ контекстов по суммарной длительности с CPU, памятью и трафиком,
+    lld - обнаружение контекстов ({#CALL_CONTEXT}), plain - суммарная длительность вызовов.
+    """
+    from .calls import ingest_calls
+
+    stores = ingest_calls(config)
+    if stores is None:
+        return {"data": []} if fmt == "lld" else 0
+    profiler = stores[1]
+
+    if fmt == "lld":
+        return profiler.discovery()
+    report = profiler.report()
+    if fmt == "json":
+        return report
+    return report["duration"]
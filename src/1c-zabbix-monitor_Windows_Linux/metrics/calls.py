@@ -1,9 +1,17 @@
 import os
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, Any, Optional
-import glob
-import time
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from .call_profile import CallProfiler
+from .consumers import journal_consumers
+from .discovery import discover_journal_processes
+from .journal import get_state_dir, ingest, journal_lock, list_journal_files
+from .rolling import RollingCounters
+from .settings import ConfigLike, as_settings
+
+# Событие CALL (регистронезависимо, как в вашем XML)
+CALL_EVENTS = ["CALL"]
 
 
 def _get_log_location_from_cfg(target_keyword: str = "calls") -> Optional[str]:
@@ -37,56 +45,72 @@ def _get_log_location_from_cfg(target_keyword: str = "calls") -> Optional[str]:
     return None
 
 
-def get_metric(config: Dict[str, Any]) -> int:
-    """
-    Подсчитывает количество серверных вызовов, используя пути из logcfg.xml.
+def ingest_calls(
+    config: ConfigLike, log_files: Optional[List[str]] = None, wait: bool = False
+) -> Optional[Tuple[RollingCounters, CallProfiler]]:
     """
-    # 1. Автоматический поиск пути из ТЖ (секция ZABBIX — CALLS)
-    #
-    auto_path = _get_log_location_from_cfg("calls")
+    Один проход по новым записям журнала вызовов для всех потребителей.
 
-    # 2. Резервный вариант из config.yaml
-    calls_path = auto_path or config.get("logs", {}).get("calls", {}).get("path")
+    Args:
+        log_files: файлы журнала, если их список уже известен (watcher);
+            по умолчанию каталог журнала обходится заново.
+        wait: ждать, пока журнал разбирает другой процесс. По умолчанию разбор
+            пропускается и возвращается состояние, сохраненное этим процессом (watch).
 
-    if not calls_path or not os.path.exists(calls_path):
-        return 0
-
-    call_count = 0
-    try:
-        # Ищем .log файлы в подпапках rphost_*
-        search_pattern = os.path.join(calls_path, "rphost_*", "*.log")
-        log_files = glob.glob(search_pattern)
+    Returns:
+        Поминутные счетчики и профиль вызовов или None, если журнал не найден.
+    """
+    settings = as_settings(config)
+    log_cfg = settings.logs.calls
+    if log_files is None:
+        # 1. Автоматический поиск пути из ТЖ (секция ZABBIX — CALLS)
+        #
+        auto_path = _get_log_location_from_cfg("calls")
 
-        # Анализируем файлы, измененные за последние 5 минут для актуальности данных
-        now = time.time()
-        recent_files = [f for f in log_files if now - os.path.getmtime(f) < 300]
+        # 2. Резервный вариант из config.yaml
+        calls_path = auto_path or log_cfg.path
 
-        for file_path in recent_files:
-            call_count += _count_calls_in_file(Path(file_path))
+        if not calls_path or not os.path.exists(calls_path):
+            return None
 
-        return call_count
-    except Exception:
-        return 0
+        # Ищем .log файлы в подпапках rphost_*
+        log_files = list_journal_files(calls_path, ["rphost_*/*.log"])
+
+    state_dir = get_state_dir(settings)
+    with journal_lock(settings, "calls", wait) as locked:
+        counters = RollingCounters.load(state_dir / "rolling_calls.bin", CALL_EVENTS)
+        profiler = CallProfiler.load(
+            state_dir / "call_profile.json",
+            interval=log_cfg.profile.interval,
+            top=log_cfg.profile.top,
+        )
+        profiler.group_by = log_cfg.profile.group_by
+        if locked:
+            consumers = [counters, profiler, *journal_consumers(settings, "calls")]
+            ingest(settings, "calls", log_files, consumers)
+    return counters, profiler
+
+
+def get_metric(config: ConfigLike, fmt: str = "plain") -> Union[int, Dict[str, Any]]:
+    """
+    Подсчитывает количество серверных вызовов, используя пути из logcfg.xml.
 
+    Метрика - количество вызовов за последние logs.calls.window минут (по умолчанию 5)
+    по поминутным агрегатам; в формате json - сводка за 1/5/15 минут,
+    lld - обнаружение подкаталогов rphost_<pid> журнала.
+    """
+    if fmt == "lld":
+        return discover_journal_processes(config, "calls")
 
-def _count_calls_in_file(log_file: Path) -> int:
-    """Подсчитывает количество событий CALL в последних строках файла."""
-    count = 0
+    settings = as_settings(config)
     try:
-        with log_file.open("r", encoding="utf-8", errors="ignore") as f:
-            # Читаем последние 200 строк для оперативной сводки
-            lines = f.readlines()
-            recent_lines = lines[-200:] if len(lines) > 200 else lines
-
-            for line in recent_lines:
-                # В ТЖ формат: время-длительность,ИмяСобытия,...
-                # Мы ищем событие CALL (регистронезависимо, как в вашем XML)
-                #
-                parts = line.split(",")
-                if len(parts) > 1:
-                    event_info = parts[1].split("-")
-                    if event_info and event_info[-1].upper() == "CALL":
-                        count += 1
-        return count
+        stores = ingest_calls(settings)
+        if stores is None:
+            return 0
+        counters = stores[0]
+
+        if fmt == "json":
+            return counters.summary()
+        return counters.count(minutes=settings.logs.calls.window)
     except Exception:
         return 0
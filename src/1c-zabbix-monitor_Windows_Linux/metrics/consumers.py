@@ -0,0 +1,25 @@
+"""
+Дополнительные потребители журналов, которые включаются конфигурацией.
+
+journal.ingest только читает записи и раздает их переданным потребителям, о функциях
+поверх журналов он не знает. Метрики журналов (locks, calls, slow_sql) добавляют
+к своим потребителям список journal_consumers(): пользовательские счетчики (секция
+counters) и архив событий (archive.enabled). Сопоставление ожиданий на блокировках
+читает журналы отдельно (lock_correlation.ingest_correlation).
+"""
+
+from typing import Any, List
+
+from .archive import archive_consumer
+from .custom_counters import counter_consumer
+from .settings import ConfigLike, as_settings
+
+
+def journal_consumers(config: ConfigLike, journal: str) -> List[Any]:
+    """Включенные конфигурацией потребители журнала (пустой список, если таких нет)."""
+    settings = as_settings(config)
+    extras = (
+        counter_consumer(settings, journal),
+        archive_consumer(settings, journal),
+    )
+    return [extra for extra in extras if extra is not None]
@@ -0,0 +1,189 @@
+"""
+Пользовательские счетчики событий ТЖ из секции counters конфигурации.
+
+Счетчик задает журнал (locks, calls, sql, excps), события, границы длительности
+и условия на свойства записи (регулярные выражения):
+
+    counters:
+      - name: slow_dbmssql
+        journal: sql
+        events: [DBMSSQL]
+        min_duration: 1000000
+      - name: deadlock_excp
+        journal: excps
+        events: [EXCP]
+        where:
+          Descr: "(?i)взаимоблокировк"
+
+Определения компилируются один раз в CounterMatcher: счетчики раскладываются
+по таблице "имя события -> счетчики", поэтому запись чужого события отбрасывается
+одним поиском в словаре, а свойства читаются только для записей, прошедших
+проверку события и длительности. Каждое свойство извлекается и декодируется
+один раз на запись, сколько бы счетчиков его ни проверяли.
+
+Счетчики журнала считаются потребителем journal.ingest в том же проходе, что и
+встроенные метрики, и хранятся поминутными корзинами (rolling.RollingCounters).
+Журнал ошибок (excps) дочитывает log_errors.ingest_errors только для счетчиков.
+Определения проверяет схема settings.CounterSettings (журнал, шаблоны,
+уникальность имен); здесь они только компилируются.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple, Union
+
+from .journal import JournalRecord, RecordHeader, get_state_dir
+from .rolling import WINDOWS, RollingCounters
+from .settings import ConfigLike, CounterSettings, as_settings
+
+
+class _Counter:
+    def __init__(self, settings: CounterSettings):
+        self.name = settings.name
+        self.journal = settings.journal
+        self.events = settings.events
+        self.min_duration = settings.min_duration
+        self.max_duration = settings.max_duration
+        self.predicates: List[Tuple[str, Pattern[str]]] = [
+            (prop, re.compile(pattern)) for prop, pattern in settings.where.items()
+        ]
+
+
+class CounterMatcher:
+    """Набор счетчиков одного журнала, скомпилированный в таблицу по именам событий."""
+
+    def __init__(self, counters: Iterable[_Counter]):
+        self.counters = list(counters)
+        self.names = [counter.name for counter in self.counters]
+        # Счетчики без списка событий проверяются для любого события
+        wildcard = [c for c in self.counters if not c.events]
+        by_event: Dict[str, List[_Counter]] = {}
+        for counter in self.counters:
+            for event in counter.events:
+                by_event.setdefault(event, []).append(counter)
+        self._by_event = {event: tuple(found + wildcard) for event, found in by_event.items()}
+        self._wildcard = tuple(wildcard)
+
+    def match(self, record: JournalRecord, header: RecordHeader) -> List[str]:
+        """Имена счетчиков, условиям которых удовлетворяет запись."""
+        candidates = self._by_event.get(header.event.upper(), self._wildcard)
+        if not candidates:
+            return []
+        matched = []
+        values: Dict[str, Optional[str]] = {}
+        for counter in candidates:
+            if header.duration < counter.min_duration:
+                continue
+            if counter.max_duration is not None and header.duration > counter.max_duration:
+                continue
+            for prop, regex in counter.predicates:
+                if prop not in values:
+                    values[prop] = record.get(prop)
+                value = values[prop]
+                if value is None or not regex.search(value):
+                    break
+            else:
+                matched.append(counter.name)
+        return matched
+
+
+def compile_counters(definitions: Iterable[CounterSettings]) -> Dict[str, CounterMatcher]:
+    """Определения секции counters -> наборы счетчиков по журналам (пустые не создаются)."""
+    by_journal: Dict[str, List[_Counter]] = {}
+    for definition in definitions:
+        counter = _Counter(definition)
+        by_journal.setdefault(counter.journal, []).append(counter)
+    return {journal: CounterMatcher(counters) for journal, counters in by_journal.items()}
+
+
+_compiled: Optional[Tuple[List[CounterSettings], Dict[str, CounterMatcher]]] = None
+
+
+def matchers(config: ConfigLike) -> Dict[str, CounterMatcher]:
+    """Скомпилированные счетчики конфигурации (компилируются один раз на процесс)."""
+    global _compiled
+    definitions = as_settings(config).counters
+    if _compiled is not None and _compiled[0] == definitions:
+        return _compiled[1]
+    result = compile_counters(definitions)
+    _compiled = (definitions, result)
+    return result
+
+
+def _store(config: ConfigLike, journal: str, matcher: CounterMatcher) -> RollingCounters:
+    return RollingCounters.load(
+        get_state_dir(config) / f"rolling_counters_{journal}.bin", matcher.names
+    )
+
+
+class CounterConsumer:
+    """Потребитель journal.ingest: поминутные корзины пользовательских счетчиков журнала."""
+
+    def __init__(self, matcher: CounterMatcher, store: RollingCounters):
+        self.matcher = matcher
+        self.store = store
+
+    def feed(self, record: JournalRecord, header: RecordHeader) -> None:
+        for name in self.matcher.match(record, header):
+            self.store.add(name, header.timestamp, header.duration)
+
+    def spawn(self) -> "CounterConsumer":
+        return CounterConsumer(self.matcher, self.store.spawn())
+
+    def merge(self, other: "CounterConsumer") -> None:
+        self.store.merge(other.store)
+
+    def save(self) -> None:
+        self.store.save()
+
+
+def counter_consumer(config: ConfigLike, journal: str) -> Optional[CounterConsumer]:
+    """Потребитель счетчиков журнала или None, если для журнала счетчики не заданы."""
+    matcher = matchers(config).get(journal)
+    if matcher is None:
+        return None
+    return CounterConsumer(matcher, _store(config, journal, matcher))
+
+
+def summary(config: ConfigLike) -> Dict[str, Dict[str, Any]]:
+    """Значения всех счетчиков: события за 1/5/15 минут, скорость и длительность за 5 минут."""
+    result = {}
+    for journal, matcher in matchers(config).items():
+        store = _store(config, journal, matcher)
+        for name in matcher.names:
+            row: Dict[str, Any] = {f"last_{m}m": store.count([name], m) for m in WINDOWS}
+            row["rate_per_sec_5m"] = round(store.rate([name], 5), 3)
+            row["duration_5m"] = store.duration_stats([name], 5)
+            result[name] = row
+    return result
+
+
+def get_metric(config: ConfigLike, fmt: str = "json") -> Union[int, Dict[str, Any]]:
+    """
+    Пользовательские счетчики событий (секция counters).
+
+    Журналы со счетчиками дочитываются их метриками (один проход на журнал).
+    Формат json - summary() по именам счетчиков, lld - обнаружение счетчиков
+    ({#COUNTER}, {#JOURNAL}), plain - сумма всех счетчиков за 5 минут.
+    """
+    try:
+        compiled = matchers(config)
+    except ValueError:
+        return {"data": []} if fmt == "lld" else {} if fmt == "json" else 0
+    if fmt == "lld":
+        return {
+            "data": [
+                {"{#COUNTER}": name, "{#JOURNAL}": journal}
+                for journal, matcher in compiled.items()
+                for name in matcher.names
+            ]
+        }
+
+    from .watcher import INGESTERS
+
+    try:
+        for journal in compiled:
+            INGESTERS[journal](config)
+        result = summary(config)
+    except Exception:
+        return {} if fmt == "json" else 0
+    return result if fmt == "json" else sum(row["last_5m"] for row in result.values())
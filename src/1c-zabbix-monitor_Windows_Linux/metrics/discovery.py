@@ -0,0 +1,162 @@
+"""
+Низкоуровневое обнаружение (LLD) для Zabbix со стабильным выводом.
+
+Сбор состава (rac, обход каталогов ТЖ) бывает дорогим, а Zabbix запускает правила
+обнаружения по расписанию. discover() повторяет сбор не чаще discovery.refresh секунд,
+сортирует элементы и сравнивает хеш с прошлым составом: пока состав не изменился,
+вывод остается тем же байт в байт (для предобработки "Discard unchanged with heartbeat").
+Если сбор не удался, возвращается последний известный состав, чтобы Zabbix
+не пометил обнаруженные элементы как потерянные.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .journal import get_state_dir
+from .rac_client import list_in_clusters
+from .settings import ConfigLike, as_settings
+from .utils_1c import get_log_location_from_cfg
+
+# Журнал -> (ключевое слово в location файла logcfg.xml, секция logs конфигурации)
+JOURNALS = {
+    "locks": ("locks", "locks"),
+    "calls": ("calls", "calls"),
+    "sql": ("Query1c", "sql"),
+    "excps": ("excps", "errors"),
+}
+
+Items = List[Dict[str, str]]
+
+
+def _digest(items: Items) -> str:
+    return hashlib.sha1(json.dumps(items, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _state_path(config: ConfigLike, name: str) -> Path:
+    return get_state_dir(config) / "discovery" / f"{name}.json"
+
+
+def _load(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _save(path: Path, state: Dict[str, Any]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", delete=False, dir=path.parent, encoding="utf-8"
+        ) as tf:
+            json.dump(state, tf, ensure_ascii=False)
+            temp_name = tf.name
+        Path(temp_name).replace(path)
+    except OSError:
+        pass
+
+
+def discover(
+    config: ConfigLike, name: str, collect: Callable[[], Optional[Items]]
+) -> Dict[str, Items]:
+    """
+    LLD-ответ {"data": [...]} для правила обнаружения name.
+
+    Args:
+        collect: сбор элементов; None означает, что источник недоступен.
+    """
+    refresh = as_settings(config).discovery.refresh
+    path = _state_path(config, name)
+    state = _load(path)
+
+    now = time.time()
+    if state and now - state.get("checked_at", 0) < refresh:
+        return {"data": state["data"]}
+
+    try:
+        collected = collect()
+    except Exception:
+        collected = None
+    if collected is None:
+        return {"data": state["data"] if state else []}
+
+    # Канонический порядок без повторов: одинаковый состав - одинаковый вывод
+    unique = {json.dumps(item, sort_keys=True, ensure_ascii=False): item for item in collected}
+    items = [unique[key] for key in sorted(unique)]
+    digest = _digest(items)
+    if state and state.get("hash") == digest:
+        state["checked_at"] = now
+    else:
+        state = {"hash": digest, "data": items, "checked_at": now, "changed_at": now}
+    _save(path, state)
+    return {"data": state["data"]}
+
+
+def known_items(config: ConfigLike, name: str) -> Items:
+    """Последний сохраненный состав правила name (без нового сбора)."""
+    state = _load(_state_path(config, name))
+    return state["data"] if state else []
+
+
+# ----------------------------------------------------------------------
+# Источники обнаружения
+# ----------------------------------------------------------------------
+
+
+def journal_path(config: ConfigLike, journal: str) -> Optional[str]:
+    """Каталог журнала: из logcfg.xml или из секции logs конфигурации."""
+    keyword, section = JOURNALS[journal]
+    path = get_log_location_from_cfg(keyword) or getattr(as_settings(config).logs, section).path
+    return path if path and os.path.isdir(path) else None
+
+
+def journal_processes(config: ConfigLike, journal: str) -> Optional[Items]:
+    """Подкаталоги rphost_<pid> журнала, в которых есть файлы .log."""
+    base = journal_path(config, journal)
+    if base is None:
+        return None
+    items = []
+    with os.scandir(base) as entries:
+        for entry in entries:
+            if not entry.is_dir() or not entry.name.startswith("rphost_"):
+                continue
+            with os.scandir(entry.path) as files:
+                if not any(f.name.endswith(".log") for f in files):
+                    continue
+            items.append(
+                {
+                    "{#JOURNAL}": journal,
+                    "{#RPHOST_DIR}": entry.name,
+                    "{#RPHOST_PID}": entry.name[len("rphost_") :],
+                }
+            )
+    return items
+
+
+def discover_journal_processes(config: ConfigLike, journal: str) -> Dict[str, Items]:
+    return discover(config, f"journal_{journal}", lambda: journal_processes(config, journal))
+
+
+def infobases(config: ConfigLike) -> Optional[Items]:
+    """Информационные базы всех кластеров по rac infobase summary list."""
+    blocks = list_in_clusters(config, ["infobase", "summary", "list"])
+    if blocks is None:
+        return None
+    return [
+        {
+            "{#CLUSTER_ID}": block["cluster"],
+            "{#INFOBASE_ID}": block["infobase"],
+            "{#INFOBASE}": block.get("name", block["infobase"]),
+        }
+        for block in blocks
+        if "infobase" in block
+    ]
+
+
+def discover_infobases(config: ConfigLike) -> Dict[str, Items]:
+    return discover(config, "infobases", lambda: infobases(config))
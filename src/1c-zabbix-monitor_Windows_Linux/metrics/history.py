@@ -0,0 +1,323 @@
+"""
+Локальная история значений rphost и sessions в файле фиксированного размера.
+
+Каждый вызов метрик rphost и sessions дает мгновенное значение; чтобы увидеть утечку
+памяти rphost или рост числа сеансов, не запрашивая историю у Zabbix, значения
+дописываются в кольцевые буферы в файле history.bin (каталог состояния):
+
+    заголовок (64 байта) | каталог серий: имя, следующая позиция, число точек |
+    данные: для каждой серии history.slots пар (время, значение) float64
+
+Файл отображается в память (mmap), буферы - memoryview с форматом "d" поверх него:
+запись точки и производные значения (скорость роста по самой старой и самой новой
+точке буфера, время до history.memory_limit_mb) не зависят от длины истории.
+Серий не больше history.max_series; новая серия занимает место той, что дольше
+всех не обновлялась (например, rphost, перезапущенного под новым идентификатором).
+Метрики rphost и sessions могут писать одновременно: открытие (проверка заголовка
+и сброс файла) и запись идут под блокировкой файла history.bin.lock, каталог серий
+перечитывается под ней.
+"""
+
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .journal import file_lock, get_state_dir
+from .settings import ConfigLike, as_settings
+
+_MAGIC = b"1CTS"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHII")
+_HEADER_SIZE = 64
+# Имя серии (utf-8, дополнено нулями), индекс следующей записи, число точек
+_ENTRY = struct.Struct("<64sqq")
+NAME_SIZE = 64
+
+DEFAULT_SLOTS = 288
+DEFAULT_MAX_SERIES = 256
+# Последняя точка заменяется, а не дописывается, пока предыдущая за ней
+# моложе этого интервала (секунд): любые две точки через одну не ближе интервала
+DEFAULT_MIN_INTERVAL = 30
+
+
+class History:
+    """Кольцевые буферы серий в отображенном в память файле."""
+
+    def __init__(
+        self, path: Path, slots: int = DEFAULT_SLOTS, max_series: int = DEFAULT_MAX_SERIES
+    ):
+        self.path = Path(path)
+        self.slots = slots
+        self.max_series = max_series
+        self._data_offset = _HEADER_SIZE + max_series * _ENTRY.size
+        size = self._data_offset + max_series * slots * 16
+
+        self._lock_path = self.path.with_name(self.path.name + ".lock")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Проверка и сброс файла - под блокировкой: процессы, открывшие его одновременно,
+        # иначе оба сочли бы файл новым и обнулили записанное друг другом
+        with file_lock(self._lock_path):
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                fresh = os.fstat(fd).st_size != size
+                if not fresh:
+                    header = os.read(fd, _HEADER.size)
+                    magic, version, _, file_slots, file_series = _HEADER.unpack(header)
+                    fresh = (magic, version, file_slots, file_series) != (
+                        _MAGIC,
+                        _VERSION,
+                        slots,
+                        max_series,
+                    )
+                if fresh:
+                    # Другой размер буферов или поврежденный файл: история начинается заново
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                self._mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            if fresh:
+                _HEADER.pack_into(self._mm, 0, _MAGIC, _VERSION, 0, slots, max_series)
+        self._view = memoryview(self._mm)
+        self._values = self._view[self._data_offset :].cast("d")
+        self._index: Dict[str, int] = {}
+        self._read_index()
+
+    # ------------------------------------------------------------------
+    # Каталог серий
+    # ------------------------------------------------------------------
+
+    def _read_index(self) -> None:
+        self._index = {}
+        for i in range(self.max_series):
+            name = self._entry(i)[0]
+            if name:
+                self._index[name] = i
+
+    def _entry(self, i: int) -> Tuple[str, int, int]:
+        raw, head, count = _ENTRY.unpack_from(self._mm, _HEADER_SIZE + i * _ENTRY.size)
+        return raw.rstrip(b"\0").decode("utf-8", errors="replace"), head, count
+
+    def _set_entry(self, i: int, name: str, head: int, count: int) -> None:
+        _ENTRY.pack_into(
+            self._mm, _HEADER_SIZE + i * _ENTRY.size, name.encode("utf-8"), head, count
+        )
+
+    def _pos(self, i: int, slot: int) -> int:
+        return (i * self.slots + slot % self.slots) * 2
+
+    def _last_time(self, i: int) -> float:
+        _, head, count = self._entry(i)
+        return self._values[self._pos(i, head - 1)] if count else 0.0
+
+    def _allocate(self, name: str) -> int:
+        used = set(self._index.values())
+        free = next((i for i in range(self.max_series) if i not in used), None)
+        if free is None:
+            free = min(used, key=self._last_time)
+            del self._index[self._entry(free)[0]]
+        self._set_entry(free, name, 0, 0)
+        self._index[name] = free
+        return free
+
+    def series(self) -> List[str]:
+        return sorted(self._index)
+
+    # ------------------------------------------------------------------
+    # Запись и чтение
+    # ------------------------------------------------------------------
+
+    def record(
+        self,
+        values: Dict[str, float],
+        now: Optional[float] = None,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+    ) -> None:
+        """
+        Добавляет точки серий; слишком частая точка заменяет последнюю.
+
+        Сравнение идет с предпоследней точкой: последняя при замене получает новое
+        время, и сравнение с ней самой сводило бы частые вызовы к одной точке.
+        """
+        now = time.time() if now is None else now
+        with file_lock(self._lock_path):
+            # Другой процесс мог занять или освободить место серии после открытия файла
+            self._read_index()
+            for name, value in values.items():
+                if len(name.encode("utf-8")) > NAME_SIZE:
+                    continue
+                i = self._index.get(name)
+                if i is None:
+                    i = self._allocate(name)
+                _, head, count = self._entry(i)
+                if count > 1 and now - self._values[self._pos(i, head - 2)] < min_interval:
+                    head -= 1
+                    count -= 1
+                pos = self._pos(i, head)
+                self._values[pos] = now
+                self._values[pos + 1] = float(value)
+                self._set_entry(i, name, (head + 1) % self.slots, min(count + 1, self.slots))
+
+    def points(self, name: str) -> Iterator[Tuple[float, float]]:
+        """Точки серии от старой к новой."""
+        i = self._index.get(name)
+        if i is None:
+            return
+        _, head, count = self._entry(i)
+        for slot in range(head - count, head):
+            pos = self._pos(i, slot)
+            yield self._values[pos], self._values[pos + 1]
+
+    def _ends(self, name: str) -> Optional[Tuple[Tuple[float, float], Tuple[float, float]]]:
+        i = self._index.get(name)
+        if i is None:
+            return None
+        _, head, count = self._entry(i)
+        if not count:
+            return None
+        first, last = self._pos(i, head - count), self._pos(i, head - 1)
+        return (
+            (self._values[first], self._values[first + 1]),
+            (self._values[last], self._values[last + 1]),
+        )
+
+    def last(self, name: str) -> Optional[float]:
+        ends = self._ends(name)
+        return ends[1][1] if ends else None
+
+    def rate(self, name: str) -> Optional[float]:
+        """Скорость изменения в единицах в час по самой старой и самой новой точке буфера."""
+        ends = self._ends(name)
+        if ends is None or ends[1][0] <= ends[0][0]:
+            return None
+        (t0, v0), (t1, v1) = ends
+        return (v1 - v0) * 3600.0 / (t1 - t0)
+
+    def count(self, name: str) -> int:
+        i = self._index.get(name)
+        return self._entry(i)[2] if i is not None else 0
+
+    def close(self) -> None:
+        self._values.release()
+        self._view.release()
+        self._mm.close()
+
+    def __enter__(self) -> "History":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def open_history(config: ConfigLike) -> History:
+    settings = as_settings(config)
+    return History(
+        get_state_dir(settings) / "history.bin",
+        slots=settings.history.slots,
+        max_series=settings.history.max_series,
+    )
+
+
+def record(config: ConfigLike, values: Dict[str, float]) -> None:
+    """Дописывает значения в историю (ошибки файла истории не мешают метрике)."""
+    settings = as_settings(config)
+    if not values or not settings.history.enabled:
+        return
+    try:
+        with open_history(settings) as history:
+            history.record(values, min_interval=settings.history.min_interval)
+    except (OSError, ValueError, struct.error):
+        pass
+
+
+def _to_float(value: Optional[str]) -> float:
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def process_values(processes: List[Dict[str, str]]) -> Dict[str, float]:
+    """Серии по rac process list: память (КБ) и среднее время вызова каждого rphost."""
+    values: Dict[str, float] = {}
+    total = 0.0
+    for block in processes:
+        process = block.get("process")
+        if not process:
+            continue
+        memory = _to_float(block.get("memory-size"))
+        total += memory
+        values[f"rphost.{process}.memory"] = memory
+        values[f"rphost.{process}.call_time"] = _to_float(block.get("avg-call-time"))
+    values["rphost.memory"] = total
+    return values
+
+
+def session_values(sessions: List[Dict[str, str]]) -> Dict[str, float]:
+    """Серии по rac session list: всего сеансов и сеансов по информационным базам."""
+    values: Dict[str, float] = {"sessions": 0}
+    for block in sessions:
+        if "session" not in block:
+            continue
+        values["sessions"] += 1
+        key = f"sessions.{block.get('infobase', '')}"
+        values[key] = values.get(key, 0) + 1
+    return values
+
+
+def trends(config: ConfigLike) -> Dict[str, Any]:
+    """Последнее значение и скорость роста серий, время до предела памяти rphost."""
+    limit = as_settings(config).history.memory_limit_mb * 1024  # memory-size rac - в КБ
+    result: Dict[str, Any] = {"series": {}, "min_minutes_to_limit": None}
+    with open_history(config) as history:
+        for name in history.series():
+            rate = history.rate(name)
+            last = history.last(name)
+            row = {
+                "last": last,
+                "rate_per_hour": None if rate is None else round(rate, 3),
+                "points": history.count(name),
+            }
+            if limit and name.startswith("rphost.") and name.endswith(".memory"):
+                if name != "rphost.memory":
+                    if last is not None and last >= limit:
+                        minutes = 0.0
+                    elif rate and rate > 0:
+                        minutes = round((limit - last) / rate * 60, 1)
+                    else:
+                        minutes = None
+                    row["minutes_to_limit"] = minutes
+                    current = result["min_minutes_to_limit"]
+                    if minutes is not None and (current is None or minutes < current):
+                        result["min_minutes_to_limit"] = minutes
+            result["series"][name] = row
+    return result
+
+
+def get_metric(config: ConfigLike, fmt: str = "json") -> Union[float, Dict[str, Any]]:
+    """
+    Тренды по локальной истории rphost и sessions (без новых запросов к RAS).
+
+    Формат json - trends(), lld - обнаружение процессов rphost с историей ({#RPHOST_ID}),
+    plain - минимальное время до history.memory_limit_mb среди rphost, минут
+    (-1, если предел не задан или память не растет).
+    """
+    try:
+        if fmt == "lld":
+            with open_history(config) as history:
+                ids = {
+                    name.split(".")[1]
+                    for name in history.series()
+                    if name.startswith("rphost.") and name.count(".") == 2
+                }
+            return {"data": [{"{#RPHOST_ID}": process} for process in sorted(ids)]}
+        report = trends(config)
+    except (OSError, ValueError, struct.error):
+        return {"data": []} if fmt == "lld" else {} if fmt == "json" else -1
+    if fmt == "json":
+        return report
+    minutes = report["min_minutes_to_limit"]
+    return -1 if minutes is None else minutes
@@ -0,0 +1,109 @@
+"""
+Производительность информационных баз по счетчикам сеансов rac session list.
+
+Сеанс содержит время вызовов и СУБД (duration-*, duration-*-dbms, db-proc-took),
+признаки ожидания блокировок (blocked-by-dbms, blocked-by-ls) и число вызовов
+за 5 минут. rollup() разбирает общий снимок session list (rac_client.snapshot)
+в колонки, суммирует их по базам срезами отсортированных строк, затем считает
+долю СУБД во времени вызовов, ожидание блокировок и частоту вызовов.
+Элементы баз - зависимые от JSON-ответа, их прототипы строятся по LLD infobases.
+"""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Union
+
+from .discovery import discover_infobases, known_items
+from .rac_client import snapshot
+from .settings import ConfigLike
+
+# Счетчики сеанса, которые суммируются по базе (имя колонки -> свойство rac)
+COUNTERS = {
+    "calls_last_5min": "calls-last-5min",
+    "duration_last_5min": "duration-last-5min",
+    "dbms_last_5min": "duration-last-5min-dbms",
+    "duration_current": "duration-current",
+    "dbms_current": "duration-current-dbms",
+    "db_proc_took": "db-proc-took",
+}
+# Ненулевое значение - номер сеанса, который держит блокировку (колонка -> свойство rac)
+BLOCKERS = {"lock_wait_dbms": "blocked-by-dbms", "lock_wait_ls": "blocked-by-ls"}
+# Окно счетчиков *-last-5min, секунд
+WINDOW = 300
+
+
+def _to_int(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def _share(part: int, total: int) -> float:
+    return round(part * 100.0 / total, 1) if total else 0.0
+
+
+def _row(totals: Dict[str, int], sessions: int) -> Dict[str, Any]:
+    return {
+        "sessions": sessions,
+        **totals,
+        "call_rate": round(totals["calls_last_5min"] / WINDOW, 2),
+        # Доля СУБД во времени вызовов за 5 минут и в текущих вызовах, %
+        "dbms_share": _share(totals["dbms_last_5min"], totals["duration_last_5min"]),
+        "dbms_share_current": _share(totals["dbms_current"], totals["duration_current"]),
+        # Доля сеансов, ожидающих блокировку СУБД или управляемую блокировку, %
+        "lock_wait_share": _share(totals["lock_wait_sessions"], sessions),
+    }
+
+
+def rollup(sessions: List[Dict[str, str]], names: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Сводка по базам и итог кластера.
+
+    Сеансы сортируются по базе и разбираются в колонки, суммы по базам
+    берутся по срезам колонок.
+    """
+    keys = [block.get("infobase", "") for block in sessions]
+    ordered = [sessions[i] for i in sorted(range(len(keys)), key=keys.__getitem__)]
+    columns = {
+        name: [_to_int(block.get(prop)) for block in ordered] for name, prop in COUNTERS.items()
+    }
+    for name, prop in BLOCKERS.items():
+        columns[name] = [1 if _to_int(block.get(prop)) else 0 for block in ordered]
+    # Сеанс ждет блокировку, если заблокирован СУБД или менеджером блокировок
+    columns["lock_wait_sessions"] = list(map(max, *(columns[name] for name in BLOCKERS)))
+
+    infobases = []
+    pos = 0
+    for infobase, count in sorted(Counter(keys).items()):
+        totals = {name: sum(column[pos : pos + count]) for name, column in columns.items()}
+        pos += count
+        infobases.append(
+            {"infobase": infobase, "name": names.get(infobase, infobase), **_row(totals, count)}
+        )
+    infobases.sort(key=lambda row: row["duration_last_5min"], reverse=True)
+    total = _row({name: sum(column) for name, column in columns.items()}, len(keys))
+    return {"total": total, "infobases": infobases}
+
+
+def get_metric(config: ConfigLike, fmt: str = "json") -> Union[float, Dict[str, Any]]:
+    """
+    Производительность баз по данным сеансов.
+
+    Формат json - rollup() (базы по убыванию времени вызовов за 5 минут),
+    lld - обнаружение информационных баз, plain - доля СУБД во времени вызовов кластера, %.
+    """
+    if fmt == "lld":
+        return discover_infobases(config)
+
+    try:
+        sessions = snapshot(config, ["session", "list"])
+    except Exception:
+        sessions = None
+    if sessions is None:
+        return {} if fmt == "json" else 0
+
+    names = {
+        item["{#INFOBASE_ID}"]: item["{#INFOBASE}"] for item in known_items(config, "infobases")
+    }
+    report = rollup(sessions, names)
+    return report if fmt == "json" else report["total"]["dbms_share"]
@@ -0,0 +1,697 @@
+"""
+Инкрементальное чтение технологического журнала (ТЖ) 1С.
+
+Платформа пишет ТЖ в файлы <каталог>/rphost_<pid>/YYMMDDHH.log и открывает новый файл
+каждый час. Файлы читаются "на живую", поэтому последняя запись может быть записана
+не полностью. JournalReader запоминает для каждого файла границу последней завершенной
+записи (committed offset) и при следующем опросе продолжает чтение с нее:
+
+* незавершенная последняя запись не отдается, а дочитывается в следующий раз;
+* файл предыдущего часа дочитывается до конца после появления файла нового часа;
+* каждый байт журнала обрабатывается один раз, без фильтра по времени изменения файла.
+
+Записи не декодируются целиком: BOM и кодировка определяются один раз на файл,
+заголовок и свойства ищутся в байтах, в строку переводятся только нужные значения.
+
+Новые данные планируются как участки файлов (ScanRange) по границам записей. Большие
+объемы ingest раздает пулу процессов, а частичные агрегаты потребителей объединяет.
+
+Журнал одновременно дочитывает только один процесс: разборщик держит блокировку
+journal_lock на время загрузки состояния потребителей, прохода и сохранения позиций.
+"""
+
+import abc
+import codecs
+import copy
+import glob
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    AnyStr,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .settings import ConfigLike, JournalSettings, as_settings
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:
+    # Windows: блокировка первого байта файла через msvcrt
+    import msvcrt
+
+    HAS_FCNTL = False
+
+BOM = b"\xef\xbb\xbf"
+MB = 1024 * 1024
+CHUNK_SIZE = MB
+# Сколько байт начала файла используется для определения кодировки
+DETECT_SIZE = 64 * 1024
+# Период повторных попыток взять блокировку файла (msvcrt не умеет ждать без предела)
+LOCK_POLL = 0.05
+
+# Начало записи ТЖ: MM:SS.ffffff-Длительность,
+RECORD_START = re.compile(rb"^\d\d:\d\d\.\d{4,6}-\d+,", re.M)
+# Граница записей внутри файла: перевод строки, за которым следует заголовок
+_BOUNDARY = re.compile(rb"(?<=\n)\d\d:\d\d\.\d{4,6}-\d+,")
+# Открывающая кавычка значения свойства: Имя='...' или Имя="..."
+_QUOTE_OPEN = re.compile(rb"=(['\"])")
+_HEADER = re.compile(rb"^(\d\d):(\d\d\.\d+)-(\d+),([^,]+),")
+# Кавычки, разделитель, пустое значение и концы строк для get_property
+_BYTES_TOKENS = ((b"'", b'"'), b",", b"", b"\r\n")
+_STR_TOKENS = (("'", '"'), ",", "", "\r\n")
+_HOUR_FILE = re.compile(r"^(\d\d)(\d\d)(\d\d)(\d\d)\.log$")
+
+
+class JournalRecord(NamedTuple):
+    path: str
+    hour: float  # начало часа файла (Unix time), 0 если имя файла не в формате YYMMDDHH
+    data: bytes  # запись как есть, без декодирования
+    encoding: str = "utf-8"  # кодировка файла, определяется один раз при первом чтении
+
+    @property
+    def text(self) -> str:
+        """Запись целиком в виде строки (декодируется при каждом обращении)."""
+        return self.data.decode(self.encoding, errors="replace")
+
+    def get(self, name: str) -> Optional[str]:
+        """Значение свойства: поиск идет по байтам, декодируется только само значение."""
+        value = get_property(self.data, name)
+        return None if value is None else value.decode(self.encoding, errors="replace")
+
+
+class RecordHeader(NamedTuple):
+    timestamp: float
+    duration: int
+    event: str
+
+
+def get_state_dir(config: ConfigLike) -> Path:
+    """Каталог для состояния между вызовами (позиции чтения журналов и т.п.)."""
+    state_path = as_settings(config).state.path
+    if state_path:
+        return Path(state_path)
+    if os.name == "nt":
+        temp_base = os.environ.get("TEMP") or os.environ.get("TMP") or "C:/Windows/Temp"
+    else:
+        temp_base = "/tmp"
+    return Path(temp_base) / "1c_zabbix_monitor_state"
+
+
+def _try_lock(f: Any, wait: bool) -> bool:
+    try:
+        if HAS_FCNTL:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        if wait and HAS_FCNTL:
+            raise
+        return False
+    return True
+
+
+@contextmanager
+def file_lock(path: Path, wait: bool = True) -> Iterator[bool]:
+    """
+    Исключительная блокировка файла path между процессами (fcntl.flock или msvcrt).
+
+    Возвращает True, если блокировка взята. При wait=False занятая блокировка
+    не ожидается: возвращается False, и вызывающий пропускает работу под ней.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        locked = _try_lock(f, wait)
+        while wait and not locked:
+            time.sleep(LOCK_POLL)
+            locked = _try_lock(f, wait)
+        try:
+            yield locked
+        finally:
+            if locked:
+                if HAS_FCNTL:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Журналы, уже разобранные этим процессом в текущем пакетном опросе (already_ingested)
+_INGESTED: Set[str] = set()
+
+
+@contextmanager
+def already_ingested(names: Iterable[str]) -> Iterator[None]:
+    """
+    Внутри блока журналы names не разбираются повторно: вызывающий (main.collect_batch)
+    уже разобрал их со всеми потребителями, метрики только загружают состояние.
+    """
+    added = set(names) - _INGESTED
+    _INGESTED.update(added)
+    try:
+        yield
+    finally:
+        _INGESTED.difference_update(added)
+
+
+def journal_lock(config: ConfigLike, name: str, wait: bool = False) -> Any:
+    """
+    Блокировка разбора журнала name (файл journal_<name>.lock в state.path).
+
+    Под ней загружается состояние потребителей, выполняется ingest и сохраняются
+    позиции чтения: иначе два процесса (watch и вызов метрики) учли бы одни и те же
+    записи дважды или перезаписали бы состояние друг друга. Для журнала внутри
+    already_ingested() сразу возвращается False - как если бы его разбирал другой процесс.
+    """
+    if name in _INGESTED:
+        return nullcontext(False)
+    return file_lock(get_state_dir(config) / f"journal_{name}.lock", wait)
+
+
+def file_hour(path: str) -> float:
+    """Начало часа по имени файла YYMMDDHH.log (локальное время сервера)."""
+    m = _HOUR_FILE.match(os.path.basename(path))
+    if not m:
+        return 0.0
+    yy, mm, dd, hh = (int(x) for x in m.groups())
+    try:
+        return datetime(2000 + yy, mm, dd, hh).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def parse_header(record: JournalRecord) -> Optional[RecordHeader]:
+    """Разбирает заголовок записи: время события, длительность и имя события."""
+    m = _HEADER.match(record.data)
+    if not m:
+        return None
+    minute, seconds, duration, event = m.groups()
+    return RecordHeader(
+        record.hour + int(minute) * 60 + float(seconds),
+        int(duration),
+        event.decode("ascii", errors="replace"),
+    )
+
+
+def get_property(text: AnyStr, name: str) -> Optional[AnyStr]:
+    """
+    Значение свойства записи ТЖ (Имя=Значение) без кавычек или None.
+
+    Значения с запятыми и переводами строк платформа берет в кавычки ' или ",
+    кавычка внутри значения удваивается. Для записи в байтах (JournalRecord.data)
+    значение возвращается в байтах - декодировать его должен вызывающий.
+    """
+    if isinstance(text, bytes):
+        key = b"," + name.encode("ascii") + b"="
+        quotes, comma, empty, eol = _BYTES_TOKENS
+    else:
+        key = "," + name + "="
+        quotes, comma, empty, eol = _STR_TOKENS
+    start = text.find(key)
+    if start < 0:
+        return None
+    start += len(key)
+    quote = text[start : start + 1]
+    if quote in quotes:
+        pos = start + 1
+        parts = []
+        while True:
+            end = text.find(quote, pos)
+            if end < 0:
+                parts.append(text[pos:])
+                break
+            if text[end + 1 : end + 2] == quote:
+                parts.append(text[pos : end + 1])
+                pos = end + 2
+                continue
+            parts.append(text[pos:end])
+            break
+        return empty.join(parts)
+    end = text.find(comma, start)
+    return (text[start:] if end < 0 else text[start:end]).rstrip(eol)
+
+
+def list_journal_files(base_path: str, patterns: Iterable[str] = ("rphost_*/*.log",)) -> List[str]:
+    """Все файлы журнала по шаблонам относительно base_path, без фильтра по времени."""
+    files = set()
+    for pattern in patterns:
+        files.update(glob.glob(os.path.join(base_path, pattern)))
+    return sorted(files)
+
+
+def detect_encoding(head: bytes) -> Tuple[int, str]:
+    """
+    Длина BOM и кодировка файла по его началу.
+
+    Платформа пишет ТЖ в UTF-8 с BOM; файлы без BOM, которые не читаются как UTF-8
+    (выгрузки и копии, сохраненные в Windows), считаются windows-1251.
+    """
+    if head.startswith(BOM):
+        return len(BOM), "utf-8"
+    try:
+        # Начало файла может оборваться посреди многобайтового символа
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return 0, "cp1251"
+    return 0, "utf-8"
+
+
+def _is_complete(record: bytes) -> bool:
+    """Запись завершена, если оканчивается переводом строки вне кавычек значения."""
+    if not record.endswith(b"\n"):
+        return False
+    pos = 0
+    while True:
+        m = _QUOTE_OPEN.search(record, pos)
+        if not m:
+            return True
+        quote = m.group(1)
+        pos = m.end()
+        while True:
+            end = record.find(quote, pos)
+            if end < 0:
+                return False
+            # Удвоенная кавычка внутри значения - экранирование
+            if record[end + 1 : end + 2] == quote:
+                pos = end + 2
+                continue
+            pos = end + 1
+            break
+
+
+class ScanRange(NamedTuple):
+    """Участок файла [start, end), выровненный по границам завершенных записей."""
+
+    path: str
+    start: int
+    end: int
+    hour: float
+    encoding: str = "utf-8"
+
+
+def _record_boundary(f, pos: int, end: int) -> int:
+    """Начало первой записи не раньше pos (перевод строки + заголовок) или end."""
+    while pos < end:
+        f.seek(pos - 1)
+        data = f.read(min(CHUNK_SIZE, end - pos + 1))
+        if not data:
+            break
+        m = _BOUNDARY.search(data)
+        if m:
+            return pos - 1 + m.start()
+        # Заголовок мог попасть на границу окна: следующее окно перекрывает хвост
+        pos += max(1, len(data) - 64)
+    return end
+
+
+def _committed_end(f, start: int, size: int) -> int:
+    """Граница после последней завершенной записи файла, который еще дописывается."""
+    window = CHUNK_SIZE
+    while True:
+        pos = max(start, size - window)
+        f.seek(pos)
+        data = f.read(size - pos)
+        last = None
+        for m in RECORD_START.finditer(data):
+            # Начало окна может оказаться в середине строки
+            if m.start() == 0 and pos > start:
+                f.seek(pos - 1)
+                if f.read(1) != b"\n":
+                    continue
+            last = m.start()
+        if last is not None:
+            return size if _is_complete(data[last:]) else pos + last
+        if pos == start:
+            # Ни одного заголовка: хвост записи, учтенной ранее, или запись еще пишется
+            return start
+        window *= 4
+
+
+def read_range(scan: ScanRange) -> Iterator[JournalRecord]:
+    """Записи участка файла; участок уже выровнен, поэтому все записи в нем завершены."""
+    try:
+        with open(scan.path, "rb") as f:
+            f.seek(scan.start)
+            remaining = scan.end - scan.start
+            buf = b""
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                buf += chunk
+                starts = [m.start() for m in RECORD_START.finditer(buf)]
+                if not starts:
+                    continue
+                for a, b in zip(starts, starts[1:]):
+                    yield JournalRecord(scan.path, scan.hour, buf[a:b], scan.encoding)
+                # Байты до первого заголовка - хвост записи, учтенной ранее
+                buf = buf[starts[-1] :]
+            if buf and RECORD_START.match(buf):
+                yield JournalRecord(scan.path, scan.hour, buf, scan.encoding)
+    except OSError:
+        return
+
+
+class JournalReader:
+    """Читает из файлов журнала только новые завершенные записи."""
+
+    def __init__(self, state_file: Path, start_at_end: bool = True):
+        """
+        Args:
+            state_file: файл с позициями чтения между вызовами.
+            start_at_end: при первом запуске пропустить уже накопленную историю
+                и считать только события, записанные после него.
+        """
+        self.state_file = Path(state_file)
+        self.start_at_end = start_at_end
+        self._state = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            state = json.loads(self.state_file.read_text(encoding="utf-8"))
+            if isinstance(state, dict) and isinstance(state.get("files"), dict):
+                return state
+        except (OSError, ValueError):
+            pass
+        return {"initialized": False, "files": {}}
+
+    def commit(self) -> None:
+        """Сохраняет позиции чтения (атомарно, через временный файл)."""
+        self._state["updated_at"] = time.time()
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", delete=False, dir=self.state_file.parent, encoding="utf-8"
+            ) as tf:
+                json.dump(self._state, tf)
+                temp_name = tf.name
+            Path(temp_name).replace(self.state_file)
+        except OSError:
+            pass
+
+    def plan(self, files: List[str], split_size: int = 0) -> List[ScanRange]:
+        """
+        Участки файлов с новыми завершенными записями, в порядке чтения (по часу файла).
+
+        Файл считается закрытым, если в его каталоге есть файл с более поздним часом:
+        платформа туда больше не пишет, и последняя запись отдается без ожидания.
+        При split_size > 0 большие участки делятся на части примерно такого размера
+        по границам записей - их можно обрабатывать независимо.
+        """
+        known: Dict[str, Dict[str, int]] = self._state["files"]
+        first_run = not self._state.get("initialized")
+
+        latest_in_dir: Dict[str, str] = {}
+        for path in files:
+            directory, name = os.path.split(path)
+            if name > latest_in_dir.get(directory, ""):
+                latest_in_dir[directory] = name
+
+        ranges: List[ScanRange] = []
+        seen = set()
+        for path in files:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen.add(path)
+            entry = known.get(path)
+            if entry is None or (entry.get("inode") and st.st_ino and entry["inode"] != st.st_ino):
+                # Новый файл читается с начала, при первом запуске - с текущего конца
+                entry = {"offset": st.st_size if first_run and self.start_at_end else 0}
+                known[path] = entry
+            entry["inode"] = st.st_ino
+            if st.st_size < entry["offset"]:
+                # Файл был усечен или перезаписан
+                entry["offset"] = 0
+            if st.st_size == entry["offset"]:
+                continue
+
+            directory, name = os.path.split(path)
+            closed = name < latest_in_dir[directory]
+            try:
+                with open(path, "rb") as f:
+                    start = entry["offset"]
+                    if start == 0 or "encoding" not in entry:
+                        # Кодировка определяется один раз на файл и хранится с позицией
+                        bom_size, entry["encoding"] = detect_encoding(f.read(DETECT_SIZE))
+                        start = max(start, bom_size)
+                    end = st.st_size if closed else _committed_end(f, start, st.st_size)
+                    if end <= start:
+                        continue
+                    bounds = [start]
+                    while split_size and end - bounds[-1] > split_size * 3 // 2:
+                        boundary = _record_boundary(f, bounds[-1] + split_size, end)
+                        if boundary >= end:
+                            break
+                        bounds.append(boundary)
+                    bounds.append(end)
+            except OSError:
+                continue
+            hour = file_hour(path)
+            ranges.extend(
+                ScanRange(path, a, b, hour, entry["encoding"]) for a, b in zip(bounds, bounds[1:])
+            )
+
+        # Файлы, удаленные платформой по истечении history, больше не отслеживаем
+        for path in [p for p in known if p not in seen]:
+            del known[path]
+        self._state["initialized"] = True
+        # Часовые файлы разных процессов rphost читаются вперемешку по часам, а не каталог
+        # за каталогом: интервальные агрегаты получают записи почти по порядку времени
+        ranges.sort(key=lambda scan: (scan.hour, scan.path, scan.start))
+        return ranges
+
+    def advance(self, ranges: Iterable[ScanRange]) -> None:
+        """Сдвигает позиции чтения за обработанные участки (сохраняются в commit)."""
+        known = self._state["files"]
+        for scan in ranges:
+            entry = known.get(scan.path)
+            if entry is not None and scan.end > entry["offset"]:
+                entry["offset"] = scan.end
+
+    def read(self, files: List[str]) -> Iterator[JournalRecord]:
+        """Возвращает новые завершенные записи из переданных файлов."""
+        for scan in self.plan(files):
+            yield from read_range(scan)
+            self.advance([scan])
+
+
+def journal_reader(config: ConfigLike, name: str) -> JournalReader:
+    """Читатель журнала с состоянием в каталоге state.path."""
+    settings = as_settings(config)
+    return JournalReader(
+        get_state_dir(settings) / f"journal_{name}.json",
+        start_at_end=settings.journal.start_position != "begin",
+    )
+
+
+def _feed_range(scan: ScanRange, consumers: List[Any]) -> int:
+    processed = 0
+    for record in read_range(scan):
+        header = parse_header(record)
+        if header is None:
+            continue
+        for consumer in consumers:
+            consumer.feed(record, header)
+        processed += 1
+    return processed
+
+
+def _scan_range(scan: ScanRange, consumers: List[Any]) -> Tuple[int, List[Any]]:
+    """Задача рабочего процесса: заполняет пустые копии потребителей и возвращает их."""
+    return _feed_range(scan, consumers), consumers
+
+
+def _parallel_workers(journal_cfg: JournalSettings, ranges: List[ScanRange]) -> int:
+    """Число рабочих процессов: 1, если объем новых данных меньше journal.parallel_min_mb."""
+    pending = sum(scan.end - scan.start for scan in ranges)
+    if len(ranges) < 2 or pending < journal_cfg.parallel_min_mb * MB:
+        return 1
+    workers = journal_cfg.workers or os.cpu_count() or 1
+    return max(1, min(workers, len(ranges)))
+
+
+def _scan_parallel(ranges: List[ScanRange], consumers: List[Any], workers: int) -> Optional[int]:
+    """
+    Обрабатывает участки в пуле процессов и объединяет частичные агрегаты.
+
+    Returns:
+        Количество записей или None, если пул процессов недоступен
+        (тогда ничего не объединено и можно читать последовательно).
+    """
+    templates = [consumer.spawn() for consumer in consumers]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Частичные результаты объединяются только после успеха всех задач
+            results = list(pool.map(_scan_range, ranges, [templates] * len(ranges)))
+    except (OSError, BrokenProcessPool):
+        return None
+    processed = 0
+    # pool.map сохраняет порядок участков - объединение идет в порядке чтения
+    for count, partials in results:
+        processed += count
+        for consumer, partial in zip(consumers, partials):
+            consumer.merge(partial)
+    return processed
+
+
+def ingest(config: ConfigLike, name: str, files: List[str], consumers: List[Any]) -> int:
+    """
+    Передает новые записи журнала потребителям и сохраняет их состояние.
+
+    Потребитель реализует feed(record, header) и save(). Позиции чтения фиксируются
+    после сохранения потребителей, поэтому каждая запись учитывается один раз.
+    Потребитель с методом committed() получает его вызов после фиксации позиций
+    (архив переносит в сегменты только зафиксированные блоки).
+
+    Если новых данных больше journal.parallel_min_mb, участки файлов раздаются
+    пулу из journal.workers процессов (0 - по числу ядер). Тогда потребитель
+    также реализует spawn() (пустая копия с теми же настройками) и merge(other).
+    Потребителей, включаемых конфигурацией, добавляет вызывающий
+    (consumers.journal_consumers). Вызывающий держит journal_lock журнала.
+
+    Returns:
+        Количество обработанных записей.
+    """
+    settings = as_settings(config)
+    journal_cfg = settings.journal
+    reader = journal_reader(settings, name)
+    ranges = reader.plan(files, split_size=int(journal_cfg.split_mb * MB))
+
+    processed = None
+    workers = _parallel_workers(journal_cfg, ranges)
+    if workers > 1:
+        processed = _scan_parallel(ranges, consumers, workers)
+    if processed is None:
+        processed = sum(_feed_range(scan, consumers) for scan in ranges)
+
+    reader.advance(ranges)
+    for consumer in consumers:
+        consumer.save()
+    reader.commit()
+    for consumer in consumers:
+        if hasattr(consumer, "committed"):
+            consumer.committed()
+    return processed
+
+
+def trim_top(table: Dict[str, Any], capacity: int, key: Callable[[Any], Any]) -> None:
+    """
+    Ограничивает словарь агрегатов: при превышении capacity * 8 элементов
+    оставляет capacity самых весомых по key(item).
+    """
+    if len(table) <= capacity * 8:
+        return
+    keep = sorted(table.items(), key=key, reverse=True)[:capacity]
+    table.clear()
+    table.update(keep)
+
+
+class IntervalAggregator(abc.ABC):
+    """
+    Основа потребителей ingest, которые копят агрегаты по интервалам времени.
+
+    Хранятся только текущий и предыдущий интервалы; отчет строится по последнему
+    завершенному интервалу относительно текущего времени. Состояние - JSON-файл.
+    """
+
+    def __init__(self, interval: int, top: int, path: Optional[Path] = None):
+        self.interval = interval
+        self.top = top
+        self.path = path
+        self.current: Optional[Dict[str, Any]] = None
+        self.previous: Optional[Dict[str, Any]] = None
+
+    @abc.abstractmethod
+    def new_interval(self, start: int) -> Dict[str, Any]:
+        """Пустые агрегаты интервала, начинающегося в start (ключ "start" обязателен)."""
+
+    def interval_for(self, timestamp: float) -> Optional[Dict[str, Any]]:
+        """Агрегаты интервала, к которому относится событие, или None для устаревших событий."""
+        start = int(timestamp // self.interval * self.interval)
+        if self.current is None or start > self.current["start"]:
+            self.previous = self.current
+            self.current = self.new_interval(start)
+            return self.current
+        if start == self.current["start"]:
+            return self.current
+        if self.previous is not None and start == self.previous["start"]:
+            return self.previous
+        # Запись старше двух интервалов уже не влияет на отчет
+        return None
+
+    def completed(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Последний завершенный интервал (пустой, если событий в нем не было)."""
+        now = time.time() if now is None else now
+        expected = int(now // self.interval * self.interval) - self.interval
+        for bucket in (self.current, self.previous):
+            if bucket is not None and bucket["start"] == expected:
+                return bucket
+        return self.new_interval(expected)
+
+    def spawn(self):
+        """Пустая копия с теми же настройками - для рабочего процесса ingest."""
+        clone = copy.copy(self)
+        clone.path = None
+        clone.current = clone.previous = None
+        return clone
+
+    @abc.abstractmethod
+    def merge_interval(self, target: Dict[str, Any], source: Dict[str, Any]) -> None:
+        """Добавляет агрегаты интервала source к target."""
+
+    def merge(self, other: "IntervalAggregator") -> None:
+        """Объединяет интервалы, накопленные копией из spawn()."""
+        for source in (other.previous, other.current):
+            if source is None:
+                continue
+            target = self.interval_for(source["start"])
+            if target is not None:
+                self.merge_interval(target, source)
+
+    @classmethod
+    def load(cls, path: Path, interval: int, top: int):
+        aggregator = cls(interval, top, path)
+        try:
+            state = json.loads(Path(path).read_text(encoding="utf-8"))
+            if state.get("interval") == interval:
+                aggregator.current = state.get("current")
+                aggregator.previous = state.get("previous")
+        except (OSError, ValueError, AttributeError):
+            pass
+        return aggregator
+
+    def save(self, path: Optional[Path] = None) -> None:
+        path = Path(path or self.path)
+        state = {"interval": self.interval, "current": self.current, "previous": self.previous}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", delete=False, dir=path.parent, encoding="utf-8"
+            ) as tf:
+                json.dump(state, tf, ensure_ascii=False)
+                temp_name = tf.name
+            Path(temp_name).replace(path)
+        except OSError:
+            pass
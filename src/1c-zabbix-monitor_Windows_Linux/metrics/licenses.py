@@ -0,0 +1,115 @@
+"""
+Лицензии и соединения кластеров по данным rac.
+
+За цикл опроса по каждому кластеру выполняются rac session list --licenses и
+rac connection list (через rac_client.snapshot - параллельно по кластерам и с общим
+кэшем). Лицензии считаются по типам (license-type), соединения - по рабочим
+процессам; запас считается относительно licenses.limit и licenses.connections_per_process.
+Если licenses.limit не задан, предел берется из max-users-all ключей (по серии).
+"""
+
+from typing import Any, Dict, List, Optional, Union
+
+from .rac_client import snapshot
+from .rphost import get_metric as rphost_metric
+from .settings import ConfigLike, as_settings
+
+
+def _to_int(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def _headroom(used: int, limit: int) -> Dict[str, Any]:
+    if not limit:
+        return {"limit": 0, "headroom": None, "utilization": None}
+    return {
+        "limit": limit,
+        "headroom": limit - used,
+        "utilization": round(used * 100.0 / limit, 1),
+    }
+
+
+def summarize_licenses(licenses: List[Dict[str, str]], limit: int = 0) -> Dict[str, Any]:
+    """Занятые лицензии по типам и запас до предела."""
+    by_type: Dict[str, int] = {}
+    series_limits: Dict[str, int] = {}
+    for block in licenses:
+        license_type = block.get("license-type") or "unknown"
+        by_type[license_type] = by_type.get(license_type, 0) + 1
+        series = block.get("series")
+        if series:
+            series_limits[series] = max(
+                series_limits.get(series, 0), _to_int(block.get("max-users-all"))
+            )
+    used = len(licenses)
+    return {
+        "used": used,
+        "by_type": dict(sorted(by_type.items())),
+        **_headroom(used, limit or sum(series_limits.values())),
+    }
+
+
+def summarize_connections(
+    connections: List[Dict[str, str]], processes: List[Dict[str, str]], limit_per_process: int = 0
+) -> Dict[str, Any]:
+    """Соединения по рабочим процессам (pid, host:port из process list) и запас до предела."""
+    counts: Dict[str, int] = {}
+    for block in connections:
+        process = block.get("process", "")
+        counts[process] = counts.get(process, 0) + 1
+    known = {block["process"]: block for block in processes if "process" in block}
+
+    by_process = []
+    for process_id in sorted(set(counts) | set(known)):
+        info = known.get(process_id, {})
+        used = counts.get(process_id, 0)
+        by_process.append(
+            {
+                "process": process_id,
+                "pid": info.get("pid", ""),
+                "host": info.get("host", ""),
+                "port": info.get("port", ""),
+                "connections": used,
+                **_headroom(used, limit_per_process),
+            }
+        )
+    return {
+        "total": len(connections),
+        "max_per_process": max(counts.values(), default=0),
+        "by_process": by_process,
+    }
+
+
+def get_metric(config: ConfigLike, fmt: str = "plain") -> Union[int, Dict[str, Any]]:
+    """
+    Лицензии и соединения всех кластеров.
+
+    Формат json - {"licenses": ..., "connections": ...}, lld - обнаружение рабочих
+    процессов (как у rphost, {#RPHOST_ID} совпадает с process в by_process),
+    plain - количество занятых лицензий.
+    """
+    if fmt == "lld":
+        return rphost_metric(config, "lld")
+
+    license_cfg = as_settings(config).licenses
+    try:
+        licenses = snapshot(config, ["session", "list", "--licenses"])
+        connections = snapshot(config, ["connection", "list"]) if fmt == "json" else None
+        processes = snapshot(config, ["process", "list"]) if fmt == "json" else None
+    except Exception:
+        licenses = None
+    if licenses is None:
+        return {} if fmt == "json" else 0
+
+    summary = summarize_licenses(licenses, license_cfg.limit)
+    if fmt != "json":
+        return summary["used"]
+    return {
+        "licenses": summary,
+        "connections": summarize_connections(
+            connections or [], processes or [], license_cfg.connections_per_process
+        ),
+    }
@@ -0,0 +1,155 @@
+"""
+Анализ конкуренции за управляемые блокировки по журналу locks.
+
+Разбирает события TLOCK/TTIMEOUT/TDEADLOCK потоком, без хранения самих записей:
+
+* Regions= - пространства блокировок: количество, ожидания и суммарное время ожидания;
+* WaitConnections= - соединения, которые удерживали блокировку (кто кого ждал);
+* DeadlockConnectionIntersections= - цепочки взаимоблокировок.
+
+Агрегаты копятся по интервалам (logs.locks.analysis.interval, по умолчанию 300 с),
+размер словарей ограничен: при переполнении остаются top-N самых тяжелых элементов.
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .journal import IntervalAggregator, JournalRecord, RecordHeader, trim_top
+from .settings import ConfigLike
+
+DEFAULT_INTERVAL = 300
+DEFAULT_TOP = 10
+
+_CONNECTION_ID = re.compile(r"\d+")
+
+
+class LockAnalyzer(IntervalAggregator):
+    """Потребитель journal.ingest: агрегаты конкуренции за блокировки по интервалам."""
+
+    def __init__(
+        self, interval: int = DEFAULT_INTERVAL, top: int = DEFAULT_TOP, path: Optional[Path] = None
+    ):
+        super().__init__(interval, top, path)
+
+    def new_interval(self, start: int) -> Dict[str, Any]:
+        return {
+            "start": start,
+            "events": {"TLOCK": 0, "TTIMEOUT": 0, "TDEADLOCK": 0},
+            "waits": 0,
+            "wait_time": 0,
+            # регион -> [событий, ожиданий, суммарная длительность]
+            "regions": {},
+            # "ожидающий>блокирующий>вид" -> количество
+            "edges": {},
+        }
+
+    def feed(self, record: JournalRecord, header: RecordHeader) -> None:
+        event = header.event.upper()
+        if event not in ("TLOCK", "TTIMEOUT", "TDEADLOCK"):
+            return
+        bucket = self.interval_for(header.timestamp)
+        if bucket is None:
+            return
+        bucket["events"][event] += 1
+
+        waiter = record.get("t:connectID") or "?"
+        blockers = _CONNECTION_ID.findall(record.get("WaitConnections") or "")
+        waited = bool(blockers) or event == "TTIMEOUT"
+        if waited:
+            bucket["waits"] += 1
+            bucket["wait_time"] += header.duration
+
+        regions = record.get("Regions")
+        if regions:
+            for region in regions.split(","):
+                region = region.strip()
+                if not region:
+                    continue
+                stats = bucket["regions"].setdefault(region, [0, 0, 0])
+                stats[0] += 1
+                if waited:
+                    stats[1] += 1
+                    stats[2] += header.duration
+            trim_top(bucket["regions"], self.top, key=lambda kv: (kv[1][2], kv[1][0]))
+
+        kind = "timeout" if event == "TTIMEOUT" else "wait"
+        for blocker in blockers:
+            edge = f"{waiter}>{blocker}>{kind}"
+            bucket["edges"][edge] = bucket["edges"].get(edge, 0) + 1
+
+        if event == "TDEADLOCK":
+            # Элементы цепочки: "ожидающий блокирующий регион режим поля", через запятую
+            chain = record.get("DeadlockConnectionIntersections") or ""
+            for item in chain.split(","):
+                parts = item.split()
+                if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
+                    edge = f"{parts[0]}>{parts[1]}>deadlock"
+                    bucket["edges"][edge] = bucket["edges"].get(edge, 0) + 1
+        trim_top(bucket["edges"], self.top, key=lambda kv: kv[1])
+
+    def merge_interval(self, target: Dict[str, Any], source: Dict[str, Any]) -> None:
+        for event, count in source["events"].items():
+            target["events"][event] = target["events"].get(event, 0) + count
+        target["waits"] += source["waits"]
+        target["wait_time"] += source["wait_time"]
+        for region, stats in source["regions"].items():
+            merged = target["regions"].setdefault(region, [0, 0, 0])
+            for i, value in enumerate(stats):
+                merged[i] += value
+        for edge, count in source["edges"].items():
+            target["edges"][edge] = target["edges"].get(edge, 0) + count
+        trim_top(target["regions"], self.top, key=lambda kv: (kv[1][2], kv[1][0]))
+        trim_top(target["edges"], self.top, key=lambda kv: kv[1])
+
+    # ------------------------------------------------------------------
+    # Отчет
+    # ------------------------------------------------------------------
+
+    def report(self, now: Optional[float] = None) -> Dict[str, Any]:
+        bucket = self.completed(now)
+        regions = sorted(
+            bucket["regions"].items(), key=lambda kv: (kv[1][2], kv[1][0]), reverse=True
+        )
+        edges = sorted(bucket["edges"].items(), key=lambda kv: kv[1], reverse=True)
+        return {
+            "interval_start": bucket["start"],
+            "interval": self.interval,
+            "events": bucket["events"],
+            "waits": bucket["waits"],
+            "wait_time": bucket["wait_time"],
+            "regions": [
+                {"region": name, "count": s[0], "waits": s[1], "wait_time": s[2]}
+                for name, s in regions[: self.top]
+            ],
+            "edges": [
+                dict(zip(("waiter", "blocker", "kind"), key.split(">")), count=count)
+                for key, count in edges[: self.top]
+            ],
+        }
+
+    def discovery(self, now: Optional[float] = None) -> Dict[str, List[Dict[str, str]]]:
+        """LLD по пространствам блокировок из последнего завершенного интервала."""
+        return {"data": [{"{#LOCK_REGION}": r["region"]} for r in self.report(now)["regions"]]}
+
+
+def get_metric(config: ConfigLike, fmt: str = "json") -> Union[int, Dict[str, Any]]:
+    """
+    Конкуренция за блокировки за последний завершенный интервал.
+
+    Формат json - топ пространств блокировок и граф ожиданий, lld - обнаружение
+    пространств блокировок ({#LOCK_REGION}), plain - количество ожиданий за интервал.
+    """
+    from .locks import ingest_locks
+
+    stores = ingest_locks(config)
+    if stores is None:
+        return {"data": []} if fmt == "lld" else 0
+    analyzer = stores[1]
+
+    if fmt == "lld":
+        return analyzer.discovery()
+    report = analyzer.report()
+    if fmt == "json":
+        return report
+    return report["waits"]
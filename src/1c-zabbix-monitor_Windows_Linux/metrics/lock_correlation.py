@@ -0,0 +1,473 @@
+"""
+Виновники ожиданий на блокировках: сопоставление журналов locks, calls и sql.
+
+Ожидание (TLOCK с WaitConnections=, TTIMEOUT) знает только номера блокирующих
+соединений. Что они в это время делали, записано в других журналах: вызов CALL
+с Context= в calls и запросы DBMSSQL/SDBL в sql, с тем же t:connectID.
+Записи без t:connectID сопоставляются по SessionID: соединение сеанса запоминается
+по записям, в которых есть оба свойства.
+
+ingest_correlation() читает три журнала со своими позициями чтения и сливает записи
+всех файлов по времени события (heapq.merge, как replay), поэтому LockCorrelator
+видит единый поток событий в хронологическом порядке и соединяет их так:
+
+* по каждому соединению хранятся последние ACTIVITY_DEPTH вызовов и столько же запросов,
+  соединений не больше correlation.max_connections (вытесняются давно неактивные);
+* ожидание ищет активность своих блокирующих соединений, а пока журналы
+  не дочитаны дальше correlation.window секунд после него, остается в очереди
+  (не больше correlation.max_pending) и уточняется новыми событиями;
+* предпочитается активность, которая шла во время ожидания, иначе - ближайшая
+  закончившаяся до него, но не раньше чем за window секунд.
+
+Итоги копятся по интервалам: контексты и запросы блокирующих соединений
+(по каждому блокирующему соединению ожидания) и контексты ожидающих
+с количеством и временем ожиданий.
+"""
+
+import heapq
+import json
+import re
+import tempfile
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from .call_profile import normalize_context
+from .discovery import journal_path
+from .journal import (
+    IntervalAggregator,
+    JournalReader,
+    JournalRecord,
+    RecordHeader,
+    ScanRange,
+    get_state_dir,
+    journal_lock,
+    list_journal_files,
+    parse_header,
+    read_range,
+    trim_top,
+)
+from .settings import ConfigLike, as_settings
+
+DEFAULT_INTERVAL = 300
+DEFAULT_TOP = 10
+DEFAULT_WINDOW = 60
+DEFAULT_MAX_CONNECTIONS = 1000
+DEFAULT_MAX_PENDING = 5000
+# Сколько последних вызовов (и отдельно запросов) хранится по соединению
+ACTIVITY_DEPTH = 4
+# Единица длительности ТЖ - микросекунды (платформа 8.3.12 и новее)
+DURATION_UNIT = 1_000_000
+QUERY_LENGTH = 200
+
+# Журнал -> шаблоны файлов; запросы 1С пишет и в корень каталога
+JOURNALS = {
+    "locks": ("rphost_*/*.log",),
+    "calls": ("rphost_*/*.log",),
+    "sql": ("*.log", "rphost_*/*.log"),
+}
+WAIT_EVENTS = ("TLOCK", "TTIMEOUT")
+QUERY_EVENTS = ("DBMSSQL", "SDBL")
+UNKNOWN = "<не найдено>"
+
+_CONNECTION_ID = re.compile(r"\d+")
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Текст запроса без литералов и лишних пробелов, не длиннее QUERY_LENGTH."""
+    query = _SPACES.sub(" ", _SQL_LITERAL.sub("?", text)).strip()
+    return query[:QUERY_LENGTH] or UNKNOWN
+
+
+def _call_context(record: JournalRecord) -> str:
+    context = record.get("Context")
+    if context:
+        return normalize_context(context)
+    iname, mname = record.get("IName"), record.get("MName")
+    return f"{iname or ''}.{mname or ''}" if iname or mname else UNKNOWN
+
+
+class LockCorrelator(IntervalAggregator):
+    """
+    Контексты и запросы, стоящие за ожиданиями блокировок.
+
+    Записи трех журналов подаются в feed() в порядке времени события (ingest_correlation).
+    """
+
+    def __init__(
+        self,
+        interval: int = DEFAULT_INTERVAL,
+        top: int = DEFAULT_TOP,
+        path: Optional[Path] = None,
+        window: float = DEFAULT_WINDOW,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        super().__init__(interval, top, path)
+        self.window = window
+        self.max_connections = max_connections
+        self.max_pending = max_pending
+        self._reset_buffers()
+
+    def _reset_buffers(self) -> None:
+        # соединение -> [[начало, конец, "call" | "sql", текст], ...], старые первыми
+        self.activity: "OrderedDict[str, List[list]]" = OrderedDict()
+        # SessionID -> соединение, по последней записи с обоими свойствами
+        self.sessions: "OrderedDict[str, str]" = OrderedDict()
+        # ожидания в порядке поступления:
+        # {"at", "start", "duration", "waiting", "blockers": {соединение: {вид: кандидат}}}
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self._waits_by_blocker: Dict[str, List[Dict[str, Any]]] = {}
+        # Самое позднее время события, дочитанное из журналов
+        self.watermark = 0.0
+
+    def new_interval(self, start: int) -> Dict[str, Any]:
+        return {
+            "start": start,
+            "waits": 0,
+            "wait_time": 0,
+            "attributed": 0,
+            # текст -> [ожиданий, время ожиданий]
+            "blocking_contexts": {},
+            "blocking_queries": {},
+            "waiting_contexts": {},
+        }
+
+    # ------------------------------------------------------------------
+    # Поток событий
+    # ------------------------------------------------------------------
+
+    def feed(self, record: JournalRecord, header: RecordHeader) -> None:
+        event = header.event.upper()
+        if event in WAIT_EVENTS:
+            self._feed_wait(record, header)
+        elif event == "CALL":
+            self._feed_activity(record, header, "call", _call_context)
+        elif event in QUERY_EVENTS:
+            self._feed_activity(
+                record,
+                header,
+                "sql",
+                lambda r: normalize_query(r.get("Sql") or r.get("Sdbl") or ""),
+            )
+
+    def _connection(self, record: JournalRecord) -> Optional[str]:
+        """Соединение записи: t:connectID или соединение ее сеанса (SessionID)."""
+        connection = record.get("t:connectID")
+        session = record.get("SessionID")
+        if not session:
+            return connection
+        if not connection:
+            return self.sessions.get(session)
+        self.sessions.pop(session, None)
+        self.sessions[session] = connection
+        while len(self.sessions) > self.max_connections:
+            self.sessions.popitem(last=False)
+        return connection
+
+    def _feed_activity(
+        self,
+        record: JournalRecord,
+        header: RecordHeader,
+        kind: str,
+        describe: Callable[[JournalRecord], str],
+    ) -> None:
+        connection = self._connection(record)
+        if not connection:
+            self._advance(header.timestamp)
+            return
+        end = header.timestamp
+        entry = [end - header.duration / DURATION_UNIT, end, kind, describe(record)]
+        self._remember(connection, entry)
+        for wait in self._waits_by_blocker.get(connection, ()):
+            self._offer(wait, connection, entry)
+        self._advance(end)
+
+    def _remember(self, connection: str, entry: list) -> None:
+        entries = self.activity.pop(connection, None) or []
+        entries.append(entry)
+        # Частые запросы не вытесняют вызов, внутри которого они выполняются
+        same = [e for e in entries if e[2] == entry[2]]
+        if len(same) > ACTIVITY_DEPTH:
+            entries.remove(same[0])
+        self.activity[connection] = entries
+        while len(self.activity) > self.max_connections:
+            self.activity.popitem(last=False)
+
+    def _feed_wait(self, record: JournalRecord, header: RecordHeader) -> None:
+        blockers = _CONNECTION_ID.findall(record.get("WaitConnections") or "")
+        waiter = self._connection(record)
+        if not blockers:
+            self._advance(header.timestamp)
+            return
+        at = header.timestamp
+        context = record.get("Context")
+        if context:
+            waiting = normalize_context(context)
+        else:
+            calls = [e for e in self.activity.get(waiter or "", ()) if e[2] == "call"]
+            waiting = calls[-1][3] if calls else UNKNOWN
+        wait = {
+            "at": at,
+            "start": at - header.duration / DURATION_UNIT,
+            "duration": header.duration,
+            "waiting": waiting,
+            "blockers": {blocker: {} for blocker in blockers},
+        }
+        self._add_wait(wait)
+        self._advance(at)
+
+    def _add_wait(self, wait: Dict[str, Any]) -> None:
+        for blocker in wait["blockers"]:
+            for entry in self.activity.get(blocker, ()):
+                self._offer(wait, blocker, entry)
+            self._waits_by_blocker.setdefault(blocker, []).append(wait)
+        self.pending.append(wait)
+        while len(self.pending) > self.max_pending:
+            self._finish(self.pending.popleft())
+
+    def _offer(self, wait: Dict[str, Any], blocker: str, entry: list) -> None:
+        """Запоминает активность блокирующего соединения, если она лучше найденной."""
+        start, end, kind, text = entry
+        if start > wait["at"] or end < wait["start"] - self.window:
+            return
+        # Активность во время ожидания важнее; затем - более поздняя
+        score = [end >= wait["start"], end]
+        best = wait["blockers"][blocker].get(kind)
+        if best is None or score > best[:2]:
+            wait["blockers"][blocker][kind] = [*score, text]
+
+    def _advance(self, timestamp: float) -> None:
+        """Сдвигает время журналов и подводит итог ожиданиям, для которых окно закрыто."""
+        if timestamp > self.watermark:
+            self.watermark = timestamp
+        cutoff = self.watermark - self.window
+        while self.pending and self.pending[0]["at"] < cutoff:
+            self._finish(self.pending.popleft())
+
+    def _finish(self, wait: Dict[str, Any]) -> None:
+        for blocker in wait["blockers"]:
+            waits = self._waits_by_blocker.get(blocker)
+            if waits is None:
+                continue
+            waits[:] = [w for w in waits if w is not wait]
+            if not waits:
+                del self._waits_by_blocker[blocker]
+
+        bucket = self.interval_for(wait["at"])
+        if bucket is None:
+            return
+        duration = wait["duration"]
+        bucket["waits"] += 1
+        bucket["wait_time"] += duration
+        _add(bucket["waiting_contexts"], wait["waiting"], duration)
+        found = False
+        for candidates in wait["blockers"].values():
+            for kind, table in (("call", "blocking_contexts"), ("sql", "blocking_queries")):
+                best = candidates.get(kind)
+                found = found or best is not None
+                _add(bucket[table], best[2] if best else UNKNOWN, duration)
+        bucket["attributed"] += found
+        for table in ("blocking_contexts", "blocking_queries", "waiting_contexts"):
+            trim_top(bucket[table], self.top, key=lambda kv: kv[1][1])
+
+    def close_window(self, now: Optional[float] = None) -> None:
+        """Журналы дочитаны до now: итог подводится и без новых событий (тихий период)."""
+        self._advance(time.time() if now is None else now)
+
+    def merge_interval(self, target: Dict[str, Any], source: Dict[str, Any]) -> None:
+        for field in ("waits", "wait_time", "attributed"):
+            target[field] += source[field]
+        for table in ("blocking_contexts", "blocking_queries", "waiting_contexts"):
+            for text, (count, duration) in source[table].items():
+                _add(target[table], text, duration, count)
+            trim_top(target[table], self.top, key=lambda kv: kv[1][1])
+
+    # ------------------------------------------------------------------
+    # Отчет и хранение
+    # ------------------------------------------------------------------
+
+    def report(self, now: Optional[float] = None) -> Dict[str, Any]:
+        bucket = self.completed(now)
+
+        def top(table: str, key: str) -> List[Dict[str, Any]]:
+            rows = sorted(bucket.get(table, {}).items(), key=lambda kv: kv[1][1], reverse=True)
+            return [
+                {key: text, "waits": count, "wait_time": duration}
+                for text, (count, duration) in rows[: self.top]
+            ]
+
+        waits = bucket.get("waits", 0)
+        return {
+            "interval_start": bucket["start"],
+            "interval": self.interval,
+            "waits": waits,
+            "wait_time": bucket.get("wait_time", 0),
+            "attributed": bucket.get("attributed", 0),
+            "attributed_share": (
+                round(bucket.get("attributed", 0) * 100.0 / waits, 1) if waits else 0.0
+            ),
+            "blocking_contexts": top("blocking_contexts", "context"),
+            "blocking_queries": top("blocking_queries", "query"),
+            "waiting_contexts": top("waiting_contexts", "context"),
+        }
+
+    def discovery(self, now: Optional[float] = None) -> Dict[str, List[Dict[str, str]]]:
+        """LLD по контекстам блокирующих соединений последнего завершенного интервала."""
+        return {
+            "data": [
+                {"{#BLOCKING_CONTEXT}": row["context"]}
+                for row in self.report(now)["blocking_contexts"]
+                if row["context"] != UNKNOWN
+            ]
+        }
+
+    @classmethod
+    def load(cls, path: Path, interval: int, top: int, **limits: Any) -> "LockCorrelator":
+        correlator = cls(interval, top, path, **limits)
+        try:
+            state = json.loads(Path(path).read_text(encoding="utf-8"))
+            if state.get("interval") != interval:
+                return correlator
+            correlator.current = state.get("current")
+            correlator.previous = state.get("previous")
+            for connection, entries in state.get("activity", []):
+                correlator._remember_all(connection, entries)
+            for wait in state.get("pending", []):
+                correlator._add_wait(wait)
+            correlator.sessions.update(state.get("sessions", []))
+            correlator.watermark = float(state.get("watermark", 0))
+        except (OSError, ValueError, AttributeError, TypeError):
+            pass
+        return correlator
+
+    def _remember_all(self, connection: str, entries: List[list]) -> None:
+        for entry in entries:
+            self._remember(connection, entry)
+
+    def save(self, path: Optional[Path] = None) -> None:
+        path = Path(path or self.path)
+        # Активность, которая уже не может относиться к новым ожиданиям, не сохраняется
+        horizon = self.watermark - 2 * self.window
+        state = {
+            "interval": self.interval,
+            "current": self.current,
+            "previous": self.previous,
+            "watermark": self.watermark,
+            "activity": [
+                [connection, entries]
+                for connection, entries in self.activity.items()
+                if entries[-1][1] >= horizon
+            ],
+            "pending": list(self.pending),
+            "sessions": list(self.sessions.items()),
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", delete=False, dir=path.parent, encoding="utf-8"
+            ) as tf:
+                json.dump(state, tf, ensure_ascii=False)
+                temp_name = tf.name
+            Path(temp_name).replace(path)
+        except OSError:
+            pass
+
+
+def _add(table: Dict[str, List[int]], text: str, duration: int, count: int = 1) -> None:
+    stats = table.setdefault(text, [0, 0])
+    stats[0] += count
+    stats[1] += duration
+
+
+def load_correlator(config: ConfigLike) -> LockCorrelator:
+    settings = as_settings(config)
+    cfg = settings.correlation
+    return LockCorrelator.load(
+        get_state_dir(settings) / "correlation.json",
+        interval=cfg.interval,
+        top=cfg.top,
+        window=cfg.window,
+        max_connections=cfg.max_connections,
+        max_pending=cfg.max_pending,
+    )
+
+
+def _timed(scan: ScanRange) -> Iterator[Tuple[float, JournalRecord, RecordHeader]]:
+    for record in read_range(scan):
+        header = parse_header(record)
+        if header is not None:
+            yield header.timestamp, record, header
+
+
+def ingest_correlation(config: ConfigLike, wait: bool = False) -> Optional[LockCorrelator]:
+    """
+    Один проход по новым записям журналов locks, calls и sql, слитым по времени события.
+
+    У сопоставления свои позиции чтения (correlation_journal_<журнал>.json) и своя
+    блокировка, поэтому порядок, в котором метрики дочитывают журналы, на него
+    не влияет. Файлы читаются потоком: в памяти одновременно по записи на файл.
+
+    Args:
+        wait: ждать, пока журналы сопоставляет другой процесс (watch); по умолчанию
+            проход пропускается и возвращается сохраненное состояние.
+
+    Returns:
+        Состояние сопоставления или None, если оно выключено.
+    """
+    settings = as_settings(config)
+    if not settings.correlation.enabled:
+        return None
+    state_dir = get_state_dir(settings)
+    with journal_lock(settings, "correlation", wait) as locked:
+        correlator = load_correlator(settings)
+        if not locked:
+            return correlator
+        readers: List[Tuple[JournalReader, List[ScanRange]]] = []
+        streams = []
+        for journal, patterns in JOURNALS.items():
+            base = journal_path(settings, journal)
+            if base is None:
+                continue
+            reader = JournalReader(
+                state_dir / f"correlation_journal_{journal}.json",
+                start_at_end=settings.journal.start_position != "begin",
+            )
+            ranges = reader.plan(list_journal_files(base, patterns))
+            readers.append((reader, ranges))
+            streams.extend(_timed(scan) for scan in ranges)
+        for _, record, header in heapq.merge(*streams, key=lambda item: item[0]):
+            correlator.feed(record, header)
+        correlator.close_window()
+        for reader, ranges in readers:
+            reader.advance(ranges)
+        correlator.save()
+        for reader, _ in readers:
+            reader.commit()
+    return correlator
+
+
+def get_metric(config: ConfigLike, fmt: str = "json") -> Union[float, Dict[str, Any]]:
+    """
+    Виновники ожиданий на блокировках за последний завершенный интервал.
+
+    Журналы дочитываются ingest_correlation() одним потоком по времени событий.
+    Формат json - report(),
+    lld - обнаружение блокирующих контекстов ({#BLOCKING_CONTEXT}),
+    plain - доля ожиданий, для которых найдена активность блокирующих соединений, %.
+    """
+    try:
+        correlator = ingest_correlation(config)
+        if correlator is None:
+            return {"data": []} if fmt == "lld" else {} if fmt == "json" else 0
+        # Состояние, сохраненное watch в тихий период, досчитывается по текущему времени
+        correlator.close_window()
+    except Exception:
+        return {"data": []} if fmt == "lld" else {} if fmt == "json" else 0
+    if fmt == "lld":
+        return correlator.discovery()
+    report = correlator.report()
+    return report if fmt == "json" else report["attributed_share"]
@@ -1,8 +1,17 @@
 import os
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, Any, Optional
-import glob
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from .consumers import journal_consumers
+from .discovery import discover_journal_processes
+from .journal import get_state_dir, ingest, journal_lock, list_journal_files
+from .lock_contention import LockAnalyzer
+from .rolling import RollingCounters
+from .settings import ConfigLike, as_settings
+
+# Ключевые события из вашего logcfg.xml
+LOCK_EVENTS = ["TLOCK", "TTIMEOUT", "TDEADLOCK"]
 
 
 def _get_log_location_from_cfg(target_keyword: str = "locks") -> Optional[str]:
@@ -34,58 +43,72 @@ def _get_log_location_from_cfg(target_keyword: str = "locks") -> Optional[str]:
     return None
 
 
-def get_metric(config: Dict[str, Any]) -> int:
+def ingest_locks(
+    config: ConfigLike, log_files: Optional[List[str]] = None, wait: bool = False
+) -> Optional[Tuple[RollingCounters, LockAnalyzer]]:
     """
-    Подсчитывает количество новых событий блокировок, используя пути из logcfg.xml.
+    Один проход по новым записям журнала блокировок для всех потребителей.
+
+    Args:
+        log_files: файлы журнала, если их список уже известен (watcher);
+            по умолчанию каталог журнала обходится заново.
+        wait: ждать, пока журнал разбирает другой процесс. По умолчанию разбор
+            пропускается и возвращается состояние, сохраненное этим процессом (watch).
+
+    Returns:
+        Поминутные счетчики и анализатор конкуренции или None, если журнал не найден.
     """
-    # 1. Пытаемся найти путь автоматически из ТЖ
-    auto_path = _get_log_location_from_cfg("locks")
+    settings = as_settings(config)
+    log_cfg = settings.logs.locks
+    if log_files is None:
+        # 1. Пытаемся найти путь автоматически из ТЖ
+        auto_path = _get_log_location_from_cfg("locks")
 
-    # 2. Если автомат не нашел, пробуем взять из конфига (для гибкости)
-    locks_path = auto_path or config.get("logs", {}).get("locks", {}).get("path")
+        # 2. Если автомат не нашел, пробуем взять из конфига (для гибкости)
+        locks_path = auto_path or log_cfg.path
 
-    if not locks_path or not os.path.exists(locks_path):
-        return 0
+        if not locks_path or not os.path.exists(locks_path):
+            return None
 
-    lock_count = 0
-    try:
         # Ищем все .log файлы в подпапках rphost_* (стандарт 1С)
         # Пример: G:\1c_log\zabbix\locks\rphost_*\*.log
-        search_pattern = os.path.join(locks_path, "rphost_*", "*.log")
-        log_files = glob.glob(search_pattern)
-
-        # Берем файлы, измененные за последние 5 минут (чтобы не парсить старье)
-        import time
-
-        now = time.time()
-        recent_files = [f for f in log_files if now - os.path.getmtime(f) < 300]
-
-        for file_path in recent_files:
-            lock_count += _count_locks_in_file(Path(file_path))
-
-        return lock_count
-    except Exception:
-        return 0
-
+        log_files = list_journal_files(locks_path, ["rphost_*/*.log"])
+
+    state_dir = get_state_dir(settings)
+    with journal_lock(settings, "locks", wait) as locked:
+        counters = RollingCounters.load(state_dir / "rolling_locks.bin", LOCK_EVENTS)
+        analyzer = LockAnalyzer.load(
+            state_dir / "lock_contention.json",
+            interval=log_cfg.analysis.interval,
+            top=log_cfg.analysis.top,
+        )
+        if locked:
+            consumers = [counters, analyzer, *journal_consumers(settings, "locks")]
+            ingest(settings, "locks", log_files, consumers)
+    return counters, analyzer
+
+
+def get_metric(config: ConfigLike, fmt: str = "plain") -> Union[int, Dict[str, Any]]:
+    """
+    Подсчитывает количество событий блокировок, используя пути из logcfg.xml.
 
-def _count_locks_in_file(log_file: Path) -> int:
-    """Подсчитывает количество событий TLOCK/TTIMEOUT/TDEADLOCK в файле."""
-    count = 0
-    # Ключевые события из вашего logcfg.xml
-    target_events = {"TLOCK", "TTIMEOUT", "TDEADLOCK"}
+    Новые записи журнала раскладываются по поминутным корзинам (см. rolling.RollingCounters),
+    метрика - количество событий за последние logs.locks.window минут (по умолчанию 5).
+    В формате json возвращается сводка за 1/5/15 минут со скоростью и максимумом,
+    в формате lld - обнаружение подкаталогов rphost_<pid> журнала.
+    """
+    if fmt == "lld":
+        return discover_journal_processes(config, "locks")
 
+    settings = as_settings(config)
     try:
-        with log_file.open("r", encoding="utf-8", errors="ignore") as f:
-            # Читаем только последние 100 строк, так как нас интересует оперативная статистика
-            content = f.readlines()
-            for line in content[-100:]:
-                # Формат ТЖ: MM:SS.uuuuuu-Duration,EventName,...
-                parts = line.split(",")
-                if len(parts) > 1:
-                    event_part = parts[1].split("-")
-                    event_name = event_part[-1] if event_part else ""
-                    if event_name.upper() in target_events:
-                        count += 1
-        return count
+        stores = ingest_locks(settings)
+        if stores is None:
+            return 0
+        counters = stores[0]
+
+        if fmt == "json":
+            return counters.summary()
+        return counters.count(minutes=settings.logs.locks.window)
     except Exception:
         return 0
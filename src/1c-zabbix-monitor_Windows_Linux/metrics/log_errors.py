@@ -2,73 +2,157 @@ import os
 import glob
 import re
 from datetime import datetime, timedelta
+from .custom_counters import counter_consumer
+from .discovery import discover
+from .journal import DETECT_SIZE, detect_encoding, get_property, ingest, journal_lock
+from .settings import as_settings
 from .utils_1c import get_log_location_from_cfg
 
+# Маркеры ошибок ищутся в байтах строки: декодируются только строки, попавшие в ответ
+ERROR_PATTERN = re.compile(rb'(EXCP|ERROR|FATAL|EXCPCNTX)', re.IGNORECASE)
+# Заголовок записи ТЖ: MM:SS.ffffff-Длительность,Событие,
+EVENT_PATTERN = re.compile(rb'^\d\d:\d\d\.\d+-\d+,(\w+),')
+# Ошибки ищутся в файлах, измененных за последние WINDOW_HOURS часов, не более MAX_FILES самых новых
+WINDOW_HOURS = 2
+MAX_FILES = 10
+
+
+def select_recent_files(mtimes, now=None, hours=WINDOW_HOURS, limit=MAX_FILES):
+    """
+    Файлы, измененные за последние hours часов, новые первыми (не больше limit).
+
+    mtimes - словарь путь -> время изменения; replay передает сюда модельное время
+    последней записи файла, поэтому отбор совпадает с живой метрикой.
+    """
+    now = datetime.now() if now is None else datetime.fromtimestamp(now)
+    recent = [
+        path for path, mtime in mtimes.items()
+        if now - datetime.fromtimestamp(mtime) <= timedelta(hours=hours)
+    ]
+    recent.sort(key=mtimes.get, reverse=True)
+    return recent[:limit] if limit else recent
+
 
 def get_latest_log_files(base_path, hours=1):
     """Получает все лог-файлы за последние N часов"""
-    all_files = []
-    
     # Ищем файлы во всех подкаталогах
-    for root, dirs, files in os.walk(base_path):
-        for file in files:
-            if file.endswith('.log'):
-                file_path = os.path.join(root, file)
-                # Проверяем, что файл изменялся за последние N часов
-                file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if datetime.now() - file_time <= timedelta(hours=hours):
-                    all_files.append(file_path)
-    
+    mtimes = {}
+    for file_path in list_error_files(base_path):
+        try:
+            mtimes[file_path] = os.path.getmtime(file_path)
+        except OSError:
+            continue
     # Сортируем по времени модификации (новые первыми)
-    all_files.sort(key=os.path.getmtime, reverse=True)
-    return all_files
+    return select_recent_files(mtimes, hours=hours, limit=0)
+
+
+def error_lines(lines):
+    """Строки (bytes) с маркерами ошибок - так их считают log_errors и replay."""
+    return (line for line in lines if ERROR_PATTERN.search(line))
+
+
+def list_error_files(base_path):
+    """Все файлы .log журнала ошибок на любой глубине, без фильтра по времени."""
+    return sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(base_path)
+        for name in files
+        if name.endswith(".log")
+    )
+
+
+def ingest_errors(config, log_files=None, wait=False):
+    """
+    Один проход по новым записям журнала ошибок для пользовательских счетчиков
+    (counters с journal: excps).
 
+    Журнал читается journal.ingest (JournalReader со своими позициями чтения), как
+    locks, calls и sql. Сама метрика log_errors по-прежнему просматривает файлы
+    за последние 2 часа.
 
-def get_metric(config):
+    Returns:
+        Поминутные счетчики или None, если счетчиков журнала нет или журнал не найден.
+    """
+    settings = as_settings(config)
+    if counter_consumer(settings, "excps") is None:
+        return None
+    if log_files is None:
+        base = get_log_location_from_cfg(target_subfolder="excps") or settings.logs.errors.path
+        if not base or not os.path.isdir(base):
+            return None
+        log_files = list_error_files(base)
+
+    with journal_lock(settings, "excps", wait) as locked:
+        consumer = counter_consumer(settings, "excps")
+        if locked:
+            ingest(settings, "excps", log_files, [consumer])
+    return consumer.store
+
+
+def _decode(error):
+    """Текст строки с ошибкой в кодировке ее файла."""
+    return error["line"].decode(error["encoding"], errors="replace")
+
+
+def error_class(line, encoding):
+    """Класс ошибки: свойство Exception= записи, иначе имя события или найденный маркер."""
+    exception = get_property(line, "Exception")
+    if exception:
+        return exception.decode(encoding, errors="replace").strip()
+    match = EVENT_PATTERN.match(line) or ERROR_PATTERN.search(line)
+    return match.group(1).decode("ascii", errors="replace").upper()
+
+
+def _collect_errors(config):
     # 1. Пытаемся получить путь АВТОМАТИЧЕСКИ из logcfg.xml
     # Ищем секцию, где в пути есть 'excps' (как в вашем конфиге)
     auto_path = get_log_location_from_cfg(target_subfolder="excps")
 
-    # 2. Если автомат не сработал, берем из config.yaml
-    log_base_path = auto_path or config.get("logs", {}).get("zabbix_excps", {}).get("path")
+    # 2. Если автомат не сработал, берем из config.yaml (logs.errors, бывший logs.zabbix_excps)
+    log_base_path = auto_path or as_settings(config).logs.errors.path
 
     if not log_base_path or not os.path.exists(log_base_path):
         return {"error": "Log path not found (check logcfg.xml location or config.yaml)"}
 
     # Получаем последние лог-файлы за последние 2 часа
-    log_files = get_latest_log_files(log_base_path, hours=2)
+    log_files = get_latest_log_files(log_base_path, hours=WINDOW_HOURS)
     
     if not log_files:
         return {"count": 0, "last_error": None}
 
     errors_found = []
     recent_errors_count = 0
+    classes = {}
     
     # Читаем последние файлы (ограничимся 10 файлами для производительности)
-    for log_file in log_files[:10]:
+    for log_file in log_files[:MAX_FILES]:
         try:
-            with open(log_file, "r", encoding="utf-8-sig", errors="ignore") as f:
-                lines = f.readlines()
-                
+            with open(log_file, "rb") as f:
+                # BOM и кодировка определяются один раз на файл
+                bom_size, encoding = detect_encoding(f.read(DETECT_SIZE))
+                f.seek(bom_size)
+                timestamp = os.path.getmtime(log_file)
+
                 # Ищем строки с ошибками (обычно содержат EXCP, ERROR, FATAL и т.д.)
-                for line in lines:
-                    if re.search(r'(EXCP|ERROR|FATAL|EXCPCNTX)', line, re.IGNORECASE):
-                        recent_errors_count += 1
-                        # Удаляем потенциальные проблемные символы из строки
-                        clean_line = line.strip().encode('utf-8', errors='ignore').decode('utf-8')
-                        errors_found.append({
-                            "file": os.path.basename(log_file),
-                            "line": clean_line,
-                            "timestamp": os.path.getmtime(log_file)
-                        })
-                        
+                for line in error_lines(f):
+                    recent_errors_count += 1
+                    name = error_class(line, encoding)
+                    classes[name] = classes.get(name, 0) + 1
+                    errors_found.append({
+                        "file": os.path.basename(log_file),
+                        "line": line.strip(),
+                        "encoding": encoding,
+                        "timestamp": timestamp
+                    })
+
         except Exception as e:
             continue  # Пропускаем файлы, которые не удается прочитать
 
     # Возвращаем структурированную информацию об ошибках
     result = {
         "count": recent_errors_count,
-        "errors_last_2_hours": recent_errors_count
+        "errors_last_2_hours": recent_errors_count,
+        "classes": classes
     }
     
     if errors_found:
@@ -77,12 +161,29 @@ def get_metric(config):
         last_error = errors_found[0]
         result["last_error"] = {
             "file": last_error["file"],
-            "message": last_error["line"]
+            "message": _decode(last_error)
         }
         # Возвращаем также последние 5 ошибок для детального анализа
         result["recent_errors"] = [
-            {"file": err["file"], "message": err["line"]} 
+            {"file": err["file"], "message": _decode(err)} 
             for err in errors_found[:5]
         ]
     
     return result
+
+
+def get_metric(config, fmt="json"):
+    """
+    Ошибки в логах за последние 2 часа: количество, последние сообщения и количество
+    по классам ошибок (classes). Формат lld - обнаружение классов ошибок ({#ERROR_CLASS}).
+    """
+    if fmt == "lld":
+        return discover(config, "error_classes", lambda: _error_classes(config))
+    return _collect_errors(config)
+
+
+def _error_classes(config):
+    result = _collect_errors(config)
+    if "error" in result:
+        return None
+    return [{"{#ERROR_CLASS}": name} for name in result.get("classes", {})]
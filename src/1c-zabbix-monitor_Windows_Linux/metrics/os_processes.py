@@ -0,0 +1,210 @@
+"""
+Ресурсы процессов сервера 1С (rphost, rmngr, ragent) по данным ОС через psutil.
+
+Таблица процессов обходится один раз и только с именем процесса; остальные
+атрибуты (RSS, время CPU, потоки, дескрипторы) читаются в oneshot() лишь для
+процессов 1С, поэтому сотни посторонних процессов почти ничего не стоят.
+Загрузка CPU считается по приросту времени CPU с прошлого запуска (хранится в
+каталоге состояния). Процессы соединяются с rac process list по pid: к ним
+добавляются идентификатор процесса кластера, порт, соединения и память по данным RAS.
+Pid уникален только в пределах сервера, поэтому из rac process list берутся процессы
+с host этого сервера (имя, полное имя или адрес).
+"""
+
+import json
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+try:
+    import psutil
+
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+from .discovery import discover
+from .journal import get_state_dir
+from .rac_client import snapshot
+from .settings import ConfigLike, as_settings
+
+PROCESS_NAMES = ("rphost", "rmngr", "ragent")
+# Поля rac process list, добавляемые к процессу ОС
+RAC_FIELDS = ("process", "host", "port", "connections", "memory-size", "available-perfomance")
+
+
+def _process_name(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    name = name.lower()
+    if name.endswith(".exe"):
+        name = name[:-4]
+    return name if name in PROCESS_NAMES else None
+
+
+def scan_processes() -> List[Dict[str, Any]]:
+    """Процессы 1С: имя, pid, RSS, время CPU, потоки и открытые дескрипторы."""
+    result = []
+    for proc in psutil.process_iter(["name"]):
+        name = _process_name(proc.info["name"])
+        if name is None:
+            continue
+        try:
+            with proc.oneshot():
+                cpu = proc.cpu_times()
+                memory = proc.memory_info()
+                try:
+                    handles = proc.num_handles() if os.name == "nt" else proc.num_fds()
+                except psutil.AccessDenied:
+                    # Дескрипторы процессов другого пользователя (usr1cv8) видны только root
+                    handles = None
+                result.append(
+                    {
+                        "name": name,
+                        "pid": proc.pid,
+                        "started": proc.create_time(),
+                        "rss": memory.rss,
+                        "vms": memory.vms,
+                        "cpu_time": cpu.user + cpu.system,
+                        "threads": proc.num_threads(),
+                        "handles": handles,
+                    }
+                )
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+    return result
+
+
+def _cpu_percent(processes: List[Dict[str, Any]], state_path: Path) -> None:
+    """Добавляет cpu_percent по приросту времени CPU с прошлого запуска."""
+    try:
+        previous = json.loads(state_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        previous = {}
+    now = time.time()
+    current = {}
+    for proc in processes:
+        # create_time отличает новый процесс с тем же pid
+        key = f"{proc['pid']}:{proc.pop('started'):.2f}"
+        current[key] = [now, proc["cpu_time"]]
+        sample = previous.get(key)
+        elapsed = now - sample[0] if sample else 0
+        proc["cpu_percent"] = (
+            round(max(proc["cpu_time"] - sample[1], 0) * 100.0 / elapsed, 1)
+            if elapsed > 0
+            else None
+        )
+    try:
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", delete=False, dir=state_path.parent, encoding="utf-8"
+        ) as tf:
+            json.dump(current, tf)
+            temp_name = tf.name
+        Path(temp_name).replace(state_path)
+    except OSError:
+        pass
+
+
+def local_hosts() -> Set[str]:
+    """Имена и адреса этого сервера в нижнем регистре: так их может указать rac (host)."""
+    names = {"localhost", "127.0.0.1", socket.gethostname(), socket.getfqdn()}
+    try:
+        host, aliases, addresses = socket.gethostbyname_ex(socket.gethostname())
+        names.update([host, *aliases, *addresses])
+    except OSError:
+        pass
+    names = {name.lower() for name in names if name}
+    # Короткое имя без домена
+    return names | {name.split(".")[0] for name in names if not name[0].isdigit()}
+
+
+def _is_local(host: Optional[str], hosts: Set[str]) -> bool:
+    if not host:
+        # Сервер не указан: сопоставление только по pid
+        return True
+    host = host.lower()
+    return host in hosts or host.split(".")[0] in hosts
+
+
+def join_rac(
+    processes: List[Dict[str, Any]],
+    rac_processes: List[Dict[str, str]],
+    hosts: Optional[Iterable[str]] = None,
+) -> int:
+    """
+    Добавляет к процессам поля rac process list по pid.
+
+    Args:
+        hosts: имена этого сервера (по умолчанию local_hosts()); процессы кластера
+            на других серверах не сопоставляются, даже если pid совпал.
+
+    Returns:
+        Число процессов кластера этого сервера без процесса ОС.
+    """
+    local = {host.lower() for host in hosts} if hosts is not None else local_hosts()
+    by_pid = {
+        block.get("pid"): block
+        for block in rac_processes
+        if block.get("pid") and _is_local(block.get("host"), local)
+    }
+    for proc in processes:
+        block = by_pid.pop(str(proc["pid"]), None)
+        proc["rac"] = {field: block.get(field, "") for field in RAC_FIELDS} if block else None
+    return len(by_pid)
+
+
+def collect(config: ConfigLike) -> Optional[Dict[str, Any]]:
+    """Процессы 1С с ресурсами ОС и данными RAS, итоги по именам процессов."""
+    if not HAS_PSUTIL:
+        return None
+    processes = scan_processes()
+    _cpu_percent(processes, get_state_dir(config) / "os_processes.json")
+
+    unmatched = None
+    if as_settings(config).os_processes.join_rac:
+        rac_processes = snapshot(config, ["process", "list"])
+        if rac_processes is not None:
+            unmatched = join_rac(processes, rac_processes)
+
+    totals: Dict[str, Dict[str, Any]] = {}
+    for proc in processes:
+        total = totals.setdefault(
+            proc["name"], {"count": 0, "rss": 0, "cpu_percent": 0.0, "threads": 0, "handles": 0}
+        )
+        total["count"] += 1
+        total["rss"] += proc["rss"]
+        total["cpu_percent"] = round(total["cpu_percent"] + (proc["cpu_percent"] or 0), 1)
+        total["threads"] += proc["threads"]
+        total["handles"] += proc["handles"] or 0
+    processes.sort(key=lambda proc: (proc["name"], proc["pid"]))
+    # Процесс кластера этого сервера без процесса ОС: завершился между опросами
+    return {"processes": processes, "totals": totals, "rac_unmatched": unmatched}
+
+
+def _discovery_items() -> Optional[List[Dict[str, str]]]:
+    if not HAS_PSUTIL:
+        return None
+    return [{"{#PROC_NAME}": p["name"], "{#PID}": str(p["pid"])} for p in scan_processes()]
+
+
+def get_metric(config: ConfigLike, fmt: str = "json") -> Union[int, Dict[str, Any]]:
+    """
+    Ресурсы процессов rphost, rmngr и ragent.
+
+    Формат json - collect() (мастер-элемент для зависимых элементов),
+    lld - обнаружение процессов ({#PROC_NAME}, {#PID}), plain - суммарный RSS rphost, байт.
+    """
+    if fmt == "lld":
+        return discover(config, "os_processes", _discovery_items)
+
+    try:
+        report = collect(config)
+    except Exception:
+        report = None
+    if report is None:
+        return {} if fmt == "json" else 0
+    return report if fmt == "json" else report["totals"].get("rphost", {}).get("rss", 0)
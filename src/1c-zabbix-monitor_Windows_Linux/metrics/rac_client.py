@@ -0,0 +1,373 @@
+"""
+Общий клиент утилиты rac для метрик кластера 1С.
+
+Собирает в одном месте то, что модули метрик делали каждый по-своему: поиск rac,
+адрес RAS, перебор вариантов аутентификации и разбор вывода "ключ : значение"
+в список словарей.
+
+Вызовы rac проходят через CircuitBreaker, состояние которого хранится в каталоге
+состояния и общее для всех запусков (параметры - только из секции rac). После rac.failure_threshold неудач подряд
+(тайм-аут, ошибка запуска, ни один вариант аутентификации не принят) rac не вызывается:
+run_rac сразу возвращает None, а RAS проверяется одной пробой через интервал,
+растущий вдвое после каждой неудачной пробы (rac.backoff ... rac.max_backoff).
+Там же хранится сглаженная задержка опроса каждой метрики: по ней main.py
+увеличивает время жизни кэша, если RAS отвечает медленно (adaptive_ttl).
+
+snapshot() кэширует разобранный вывод команды (например, session list) на
+rac.snapshot_ttl секунд: метрики одного цикла опроса (sessions, background_jobs ...)
+разбирают одни и те же данные, не обращаясь к кластерам повторно.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .journal import file_lock, get_state_dir
+from .settings import ConfigLike, RacSettings, as_settings
+from .utils_1c import get_rac_path
+
+RAC_TIMEOUT = 10
+
+# Вес нового замера в сглаженной задержке
+LATENCY_ALPHA = 0.3
+
+
+def rac_settings(config: ConfigLike) -> RacSettings:
+    """Параметры подключения (секция rac; устаревшая секция ras сведена к ней схемой)."""
+    return as_settings(config).rac
+
+
+def find_rac_executable(config: ConfigLike) -> str:
+    """Путь к rac: rac.path из конфигурации или автопоиск utils_1c (один раз на процесс)."""
+    settings = rac_settings(config)
+    if settings.path and os.path.exists(settings.path):
+        return settings.path
+    return _search_rac(settings.path, settings.preferred_version)
+
+
+@lru_cache(maxsize=None)
+def _search_rac(path: Optional[str], preferred_version: Optional[str]) -> str:
+    # Автопоиск обходит каталоги установки 1С - результат не меняется за время запуска
+    return get_rac_path({"rac": {"path": path, "preferred_version": preferred_version}})
+
+
+def ras_address(config: ConfigLike) -> str:
+    settings = rac_settings(config)
+    return f"{settings.host}:{settings.port}"
+
+
+def _auth_options(config: ConfigLike) -> List[List[str]]:
+    """Варианты аутентификации в порядке перебора; последний - без учетных данных."""
+    settings = rac_settings(config)
+    user, password = settings.user, settings.password
+    options: List[List[str]] = []
+    if user and password:
+        options.append(["--cluster-user", user, "--cluster-pwd", password])
+        options.append(["--user", user, "--password", password])
+    options.append([])
+    return options
+
+
+class CircuitBreaker:
+    """Доступность RAS и задержки опроса метрик, общие для всех запусков."""
+
+    def __init__(self, path: Path, settings: RacSettings):
+        """
+        Args:
+            settings: секция rac - порог неудач, интервалы проб и порог медленного опроса.
+        """
+        self.path = path
+        self.threshold = settings.failure_threshold
+        self.backoff = settings.backoff
+        self.max_backoff = settings.max_backoff
+        self.slow_latency = settings.slow_latency
+        # Один экземпляр используют потоки list_in_clusters
+        self._lock = threading.RLock()
+        self._deferred = 0
+        self._dirty = False
+        try:
+            self.state: Dict[str, Any] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.state = {}
+        self.state.setdefault("failures", 0)
+        self.state.setdefault("open_until", 0)
+        self.state.setdefault("latency", {})
+
+    @contextmanager
+    def batch(self) -> Iterator["CircuitBreaker"]:
+        """Изменения состояния внутри блока сохраняются один раз, по его завершении."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred and self._dirty:
+                    self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            if self._deferred:
+                self._dirty = True
+                return
+            self._write()
+
+    def _write(self) -> None:
+        with self._lock:
+            self._dirty = False
+            # Одновременные запуски могут перезаписать состояние друг друга - это допустимо:
+            # счетчик неудач лишь откладывает или ускоряет следующую пробу
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with file_lock(self.path.with_name(self.path.name + ".lock")):
+                    with tempfile.NamedTemporaryFile(
+                        "w", delete=False, dir=self.path.parent, encoding="utf-8"
+                    ) as tf:
+                        json.dump(self.state, tf)
+                        temp_name = tf.name
+                    Path(temp_name).replace(self.path)
+            except OSError:
+                pass
+
+    def is_open(self, now: Optional[float] = None) -> bool:
+        """RAS считается недоступным и время следующей пробы еще не наступило."""
+        now = time.time() if now is None else now
+        return self.state["failures"] >= self.threshold and now < self.state["open_until"]
+
+    def allow(self, timeout: float, now: Optional[float] = None) -> bool:
+        """Можно ли вызвать rac; в полуоткрытом состоянии пробу получает один запуск."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.state["failures"] < self.threshold:
+                return True
+            if now < self.state["open_until"]:
+                return False
+            # Остальные запуски не вызывают rac, пока проба не завершится или не выйдет ее время:
+            # отметка пробы сохраняется сразу, даже внутри batch()
+            self.state["open_until"] = now + timeout
+            self._write()
+        return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state["failures"] or self.state["open_until"]:
+                self.state["failures"] = 0
+                self.state["open_until"] = 0
+                self.save()
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self.state["failures"] += 1
+            excess = self.state["failures"] - self.threshold
+            if excess >= 0:
+                delay = min(self.backoff * 2 ** min(excess, 32), self.max_backoff)
+                self.state["open_until"] = now + delay
+            self.save()
+
+    def observe(self, metric: str, seconds: float) -> None:
+        """Учитывает длительность опроса метрики в сглаженной задержке."""
+        previous = self.state["latency"].get(metric)
+        self.state["latency"][metric] = (
+            seconds
+            if previous is None
+            else LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * previous
+        )
+        self.save()
+
+    def adaptive_ttl(
+        self,
+        metric: str,
+        ttl: float,
+        slow_latency: Optional[float] = None,
+        max_ttl: float = 0,
+    ) -> float:
+        """
+        Время жизни кэша метрики: ttl, увеличенное во столько раз, во сколько
+        сглаженная задержка опроса превышает slow_latency (по умолчанию rac.slow_latency;
+        не больше max_ttl, если задан).
+        """
+        if slow_latency is None:
+            slow_latency = self.slow_latency
+        latency = self.state["latency"].get(metric)
+        if not latency or not slow_latency or latency <= slow_latency:
+            return ttl
+        adapted = ttl * latency / slow_latency
+        return max(ttl, min(adapted, max_ttl)) if max_ttl else adapted
+
+
+def get_breaker(config: ConfigLike) -> CircuitBreaker:
+    return CircuitBreaker(get_state_dir(config) / "rac_breaker.json", rac_settings(config))
+
+
+def run_rac(
+    config: ConfigLike,
+    args: List[str],
+    timeout: float = RAC_TIMEOUT,
+    breaker: Optional[CircuitBreaker] = None,
+) -> Optional[str]:
+    """
+    Выполняет rac <команда и параметры> [аутентификация] <адрес RAS>.
+
+    Args:
+        breaker: общий экземпляр для параллельных вызовов (list_in_clusters);
+            по умолчанию состояние читается из каталога состояния.
+
+    Returns:
+        Стандартный вывод первого успешного варианта аутентификации или None
+        (в том числе сразу, без вызова rac, пока RAS считается недоступным).
+    """
+    if breaker is None:
+        breaker = get_breaker(config)
+    if not breaker.allow(timeout):
+        return None
+    rac_path = find_rac_executable(config)
+    address = ras_address(config)
+    for auth in _auth_options(config):
+        try:
+            result = subprocess.run(
+                [rac_path, *args, *auth, address],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                check=False,
+            )
+        except (subprocess.TimeoutExpired, OSError):
+            # RAS завис или rac не запускается: остальные варианты аутентификации не помогут
+            breaker.record_failure()
+            return None
+        if result.returncode == 0:
+            breaker.record_success()
+            return result.stdout
+    breaker.record_failure()
+    return None
+
+
+def parse_blocks(output: str) -> List[Dict[str, str]]:
+    """Разбирает вывод rac: блоки "ключ : значение", разделенные пустой строкой."""
+    blocks: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition(":")
+        if not sep:
+            if not line.strip() and current:
+                blocks.append(current)
+                current = {}
+            continue
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1].replace('""', '"')
+        current[key.strip()] = value
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def get_clusters(config: ConfigLike, timeout: float = RAC_TIMEOUT) -> Optional[List[str]]:
+    """Идентификаторы кластеров или None, если RAS не ответил."""
+    output = run_rac(config, ["cluster", "list"], timeout)
+    if output is None:
+        return None
+    return [block["cluster"] for block in parse_blocks(output) if "cluster" in block]
+
+
+def list_in_clusters(
+    config: ConfigLike,
+    command: List[str],
+    clusters: Optional[List[str]] = None,
+    timeout: float = RAC_TIMEOUT,
+) -> Optional[List[Dict[str, str]]]:
+    """
+    Выполняет команду rac (например, ["infobase", "summary", "list"]) в каждом кластере.
+    Кластеры опрашиваются параллельно, не более rac.max_parallel вызовов rac одновременно.
+
+    Returns:
+        Блоки всех кластеров с добавленным ключом cluster или None при ошибке RAS.
+    """
+    if clusters is None:
+        clusters = get_clusters(config, timeout)
+        if clusters is None:
+            return None
+
+    # Потоки делят один CircuitBreaker: неудачи складываются, состояние сохраняется один раз
+    breaker = get_breaker(config)
+
+    def run(cluster_id: str) -> Optional[str]:
+        return run_rac(config, [*command, f"--cluster={cluster_id}"], timeout, breaker)
+
+    workers = min(len(clusters), rac_settings(config).max_parallel)
+    with breaker.batch():
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outputs = list(pool.map(run, clusters))
+        else:
+            outputs = [run(cluster_id) for cluster_id in clusters]
+
+    blocks: List[Dict[str, str]] = []
+    for cluster_id, output in zip(clusters, outputs):
+        if output is None:
+            return None
+        for block in parse_blocks(output):
+            block["cluster"] = cluster_id
+            blocks.append(block)
+    return blocks
+
+
+def _cached(
+    config: ConfigLike, name: str, ttl: Optional[float], load: Callable[[], Optional[Any]]
+) -> Optional[Any]:
+    """Результат load(), сохраненный в каталоге состояния на ttl секунд (rac.snapshot_ttl)."""
+    if ttl is None:
+        ttl = rac_settings(config).snapshot_ttl
+    path = get_state_dir(config) / "rac" / f"{name}.json"
+    try:
+        cached = json.loads(path.read_text(encoding="utf-8"))
+        if time.time() - cached["at"] < ttl:
+            return cached["value"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    value = load()
+    if value is None:
+        return None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", delete=False, dir=path.parent, encoding="utf-8"
+        ) as tf:
+            json.dump({"at": time.time(), "value": value}, tf, ensure_ascii=False)
+            temp_name = tf.name
+        Path(temp_name).replace(path)
+    except OSError:
+        pass
+    return value
+
+
+def snapshot(
+    config: ConfigLike,
+    command: List[str],
+    ttl: Optional[float] = None,
+    timeout: float = RAC_TIMEOUT,
+) -> Optional[List[Dict[str, str]]]:
+    """
+    list_in_clusters(command), сохраненный в каталоге состояния на ttl секунд
+    (по умолчанию rac.snapshot_ttl). Список кластеров кэшируется так же, поэтому
+    повторные вызовы в пределах ttl не запускают rac вовсе.
+    """
+
+    def load() -> Optional[List[Dict[str, str]]]:
+        clusters = _cached(config, "cluster_list", ttl, lambda: get_clusters(config, timeout))
+        if clusters is None:
+            return None
+        return list_in_clusters(config, command, clusters, timeout)
+
+    return _cached(config, "_".join(arg.lstrip("-") for arg in command), ttl, load)
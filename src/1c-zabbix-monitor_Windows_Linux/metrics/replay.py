@@ -0,0 +1,292 @@
+"""
+Воспроизведение сохраненного дерева ТЖ через конвейер метрик с модельными часами.
+
+Живые метрики считают события относительно текущего времени (time.time()), поэтому
+архив журналов за прошлую неделю для них пуст. replay() читает файлы YYMMDDHH.log
+целиком, сливает записи всех журналов и процессов rphost по времени события
+и передает их тем же потребителям, что и journal.ingest (поминутные счетчики,
+LockAnalyzer, CallProfiler, пользовательские счетчики). Часы модели - время
+последней записи: на каждой границе интервала снимаются значения метрик так,
+как их увидел бы Zabbix, опрашивая сервер в этот момент.
+
+Состояние живых метрик (каталог state.path) не затрагивается: все агрегаты
+хранятся в памяти. Кроме ряда значений возвращается пропускная способность разбора,
+поэтому прогон по реальному архиву служит и нагрузочным тестом.
+"""
+
+import heapq
+import os
+import time
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .call_profile import CallProfiler
+from .calls import CALL_EVENTS
+from .custom_counters import CounterConsumer, matchers
+from .journal import (
+    DETECT_SIZE,
+    MB,
+    JournalRecord,
+    RecordHeader,
+    ScanRange,
+    detect_encoding,
+    file_hour,
+    list_journal_files,
+    parse_header,
+    read_range,
+)
+from .lock_contention import LockAnalyzer
+from .locks import LOCK_EVENTS
+from .log_errors import error_class, error_lines, list_error_files, select_recent_files
+from .rolling import RollingCounters
+from .settings import ConfigLike, Settings, as_settings
+from .slow_sql import SQL_EVENTS
+
+# Метрика -> (журнал, подкаталог в дереве ТЖ, секция logs, шаблоны файлов).
+# Файлы журнала ошибок ищутся как в log_errors - на любой глубине (шаблоны не нужны)
+SOURCES = {
+    "locks": ("locks", "locks", "locks", ("rphost_*/*.log",)),
+    "calls": ("calls", "calls", "calls", ("rphost_*/*.log",)),
+    "slow_sql": ("sql", "Query1c", "sql", ("*.log", "rphost_*/*.log")),
+    "log_errors": ("excps", "excps", "errors", ()),
+}
+
+
+class ErrorCounter:
+    """
+    Потребитель записей журнала ошибок, который считает так же, как log_errors.
+
+    Живая метрика берет строки с маркерами ошибок (log_errors.error_lines) из не более
+    чем 10 файлов, измененных за 2 часа (log_errors.select_recent_files). Здесь время
+    изменения файла - время его последней прочитанной записи по модельным часам.
+    """
+
+    def __init__(self) -> None:
+        # Файл -> модельное время изменения, строки с ошибками, количество по классам
+        self.mtimes: Dict[str, float] = {}
+        self.lines: Dict[str, int] = {}
+        self.file_classes: Dict[str, Dict[str, int]] = {}
+
+    def feed(self, record: JournalRecord, header: RecordHeader) -> None:
+        path = record.path
+        self.mtimes[path] = max(self.mtimes.get(path, 0.0), header.timestamp)
+        for line in error_lines(record.data.splitlines(keepends=True)):
+            self.lines[path] = self.lines.get(path, 0) + 1
+            classes = self.file_classes.setdefault(path, {})
+            name = error_class(line, record.encoding)
+            classes[name] = classes.get(name, 0) + 1
+
+    def count(self, now: float) -> int:
+        """Значение log_errors (count) в момент now."""
+        return sum(self.lines.get(path, 0) for path in select_recent_files(self.mtimes, now))
+
+    def classes(self, now: float) -> Dict[str, int]:
+        """Количество ошибок по классам (classes log_errors) в момент now."""
+        result: Dict[str, int] = {}
+        for path in select_recent_files(self.mtimes, now):
+            for name, count in self.file_classes.get(path, {}).items():
+                result[name] = result.get(name, 0) + count
+        return result
+
+
+def journal_dirs(
+    config: ConfigLike, metrics: List[str], root: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Каталоги журналов метрик: подкаталоги root (locks, calls, Query1c, excps)
+    или пути секции logs конфигурации. Метрики без каталога пропускаются.
+    """
+    logs = as_settings(config).logs
+    dirs = {}
+    for metric in metrics:
+        _, subdir, section, _ = SOURCES[metric]
+        if root:
+            path = os.path.join(root, subdir)
+        else:
+            path = getattr(logs, section).path
+        if path and os.path.isdir(path):
+            dirs[metric] = path
+    return dirs
+
+
+def _window(settings: Settings, metric: str) -> int:
+    return getattr(settings.logs, SOURCES[metric][2]).window
+
+
+def _file_records(path: str, hour: float) -> Iterator[Tuple[float, JournalRecord, RecordHeader]]:
+    try:
+        with open(path, "rb") as f:
+            bom_size, encoding = detect_encoding(f.read(DETECT_SIZE))
+            size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return
+    for record in read_range(ScanRange(path, bom_size, size, hour, encoding)):
+        header = parse_header(record)
+        if header is not None:
+            yield header.timestamp, record, header
+
+
+def _tagged(
+    metric: str, path: str, hour: float
+) -> Iterator[Tuple[float, str, JournalRecord, RecordHeader]]:
+    for timestamp, record, header in _file_records(path, hour):
+        yield timestamp, metric, record, header
+
+
+class Replay:
+    """Потребители всех воспроизводимых метрик и снимки их значений по модельным часам."""
+
+    def __init__(self, config: ConfigLike, metrics: List[str]):
+        settings = as_settings(config)
+        self.metrics = metrics
+        self.windows = {
+            metric: _window(settings, metric) for metric in metrics if metric != "log_errors"
+        }
+        self.consumers: Dict[str, List[Any]] = {}
+        self.counters: Dict[str, RollingCounters] = {}
+        logs = settings.logs
+        custom = matchers(settings)
+        for metric in metrics:
+            journal = SOURCES[metric][0]
+            if metric == "log_errors":
+                self.errors = ErrorCounter()
+                self.consumers[metric] = [self.errors]
+                continue
+            events = {"locks": LOCK_EVENTS, "calls": CALL_EVENTS, "slow_sql": SQL_EVENTS}[metric]
+            self.counters[metric] = RollingCounters(events)
+            consumers: List[Any] = [self.counters[metric]]
+            if metric == "locks":
+                analysis = logs.locks.analysis
+                self.analyzer = LockAnalyzer(analysis.interval, analysis.top)
+                consumers.append(self.analyzer)
+            elif metric == "calls":
+                profile = logs.calls.profile
+                self.profiler = CallProfiler(profile.interval, profile.top)
+                self.profiler.group_by = profile.group_by
+                consumers.append(self.profiler)
+            matcher = custom.get(journal)
+            if matcher is not None:
+                consumers.append(CounterConsumer(matcher, RollingCounters(matcher.names)))
+            self.consumers[metric] = consumers
+
+    def feed(self, metric: str, record: JournalRecord, header: RecordHeader) -> None:
+        for consumer in self.consumers[metric]:
+            consumer.feed(record, header)
+
+    def sample(self, now: float) -> Dict[str, Any]:
+        """Значения метрик в момент now: события за окно метрики до now."""
+        # Окно заканчивается последней завершенной минутой перед now
+        at = now - 0.001
+        row: Dict[str, Any] = {"time": int(now)}
+        for metric in self.metrics:
+            if metric == "log_errors":
+                row[metric] = self.errors.count(now)
+                continue
+            row[metric] = self.counters[metric].count(minutes=self.windows[metric], now=at)
+            if metric == "locks":
+                row["lock_waits"] = self.analyzer.report(now)["waits"]
+            for consumer in self.consumers[metric]:
+                if isinstance(consumer, CounterConsumer):
+                    for name in consumer.matcher.names:
+                        row[name] = consumer.store.count([name], 5, at)
+        return row
+
+    def reports(self, now: float) -> Dict[str, Any]:
+        """Отчеты анализаторов по последнему завершенному интервалу модели."""
+        result: Dict[str, Any] = {}
+        if "locks" in self.metrics:
+            result["locks"] = self.analyzer.report(now)
+        if "calls" in self.metrics:
+            result["calls"] = self.profiler.report(now)
+        if "log_errors" in self.metrics:
+            result["log_errors"] = {"classes": self.errors.classes(now)}
+        return result
+
+
+def replay(
+    config: ConfigLike,
+    metrics: Optional[List[str]] = None,
+    root: Optional[str] = None,
+    interval: int = 60,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Прогоняет архив ТЖ через метрики с модельными часами.
+
+    Args:
+        metrics: воспроизводимые метрики (locks, calls, slow_sql, log_errors), по умолчанию все.
+        root: корень дерева ТЖ с подкаталогами журналов; по умолчанию пути секции logs.
+        interval: шаг модельных часов, секунд - период опроса Zabbix.
+        start, end: границы воспроизведения (Unix time), по умолчанию весь архив.
+
+    Returns:
+        Ряд значений series (снимок на каждой границе интервала), отчеты анализаторов
+        на конец воспроизведения и пропускная способность разбора throughput
+        (bytes - объем прочитанных записей, а не размер файлов).
+    """
+    settings = as_settings(config)
+    dirs = journal_dirs(settings, metrics or list(SOURCES), root)
+    state = Replay(settings, list(dirs))
+
+    # Файлы по часам: записи разных журналов и процессов одного часа сливаются по времени
+    files: List[Tuple[float, str, str]] = []
+    for metric, path in dirs.items():
+        if metric == "log_errors":
+            names = list_error_files(path)
+        else:
+            names = list_journal_files(path, SOURCES[metric][3])
+        for name in names:
+            hour = file_hour(name)
+            if not hour:
+                continue
+            if start is not None and hour + 3600 <= start:
+                continue
+            if end is not None and hour >= end:
+                continue
+            files.append((hour, metric, name))
+    files.sort()
+
+    series: List[Dict[str, Any]] = []
+    processed = size = 0
+    clock: Optional[float] = None
+    tick: Optional[float] = None
+    started = time.perf_counter()
+    for hour, group in groupby(files, key=lambda item: item[0]):
+        streams = [_tagged(metric, name, hour) for _, metric, name in group]
+        for timestamp, metric, record, header in heapq.merge(*streams, key=lambda r: r[0]):
+            # Учитываются только прочитанные записи: после end файлы не дочитываются
+            size += len(record.data)
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp >= end:
+                break
+            if tick is None:
+                tick = (timestamp // interval + 1) * interval
+            while timestamp >= tick:
+                series.append(state.sample(tick))
+                tick += interval
+            clock = timestamp
+            state.feed(metric, record, header)
+            processed += 1
+    if tick is not None:
+        # Последний неполный интервал закрывается снимком на его границе
+        series.append(state.sample(tick))
+    elapsed = time.perf_counter() - started
+
+    span = clock - series[0]["time"] + interval if series and clock is not None else 0
+    return {
+        "journals": dirs,
+        "interval": interval,
+        "series": series,
+        "reports": state.reports(tick) if tick is not None else {},
+        "throughput": {
+            "records": processed,
+            "bytes": size,
+            "seconds": round(elapsed, 3),
+            "records_per_sec": round(processed / elapsed) if elapsed else 0,
+            "mb_per_sec": round(size / MB / elapsed, 2) if elapsed else 0,
+            # Во сколько раз воспроизведение быстрее реального времени
+            "speedup": round(span / elapsed, 1) if elapsed else 0,
+        },
+    }
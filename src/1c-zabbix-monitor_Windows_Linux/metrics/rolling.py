@@ -0,0 +1,218 @@
+"""
+Поминутные скользящие агрегаты событий ТЖ с хранением на диске.
+
+Для каждого типа события хранится кольцевой буфер из N поминутных корзин
+(количество, сумма и максимум длительности). Буферы - массивы array('q'),
+которые сохраняются в один двоичный файл между вызовами. Запросы
+"событий за последние 1/5/15 минут", скорость и максимум не требуют повторного
+чтения журнала и выполняются за фиксированное число операций (не больше N корзин).
+"""
+
+import json
+import struct
+import tempfile
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .journal import JournalRecord, RecordHeader
+
+_MAGIC = b"1CRC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+
+DEFAULT_SLOTS = 60
+WINDOWS = (1, 5, 15)
+
+
+class RollingCounters:
+    """Кольцевой буфер поминутных счетчиков для набора серий (типов событий)."""
+
+    def __init__(
+        self, series: Iterable[str], slots: int = DEFAULT_SLOTS, path: Optional[Path] = None
+    ):
+        self.series: List[str] = list(series)
+        self.slots = slots
+        self.path = path
+        self._index = {name: i for i, name in enumerate(self.series)}
+        size = len(self.series) * slots
+        # Абсолютная минута (Unix time // 60), которую сейчас хранит корзина
+        self._minutes = array("q", [-1]) * slots
+        self._counts = array("q", [0]) * size
+        self._dur_sum = array("q", [0]) * size
+        self._dur_max = array("q", [0]) * size
+
+    # ------------------------------------------------------------------
+    # Накопление
+    # ------------------------------------------------------------------
+
+    def _slot(self, minute: int) -> Optional[int]:
+        """Корзина для минуты; устаревшая корзина очищается, слишком старая минута отбрасывается."""
+        slot = minute % self.slots
+        held = self._minutes[slot]
+        if held == minute:
+            return slot
+        if held > minute:
+            return None
+        self._minutes[slot] = minute
+        for i in range(len(self.series)):
+            pos = i * self.slots + slot
+            self._counts[pos] = 0
+            self._dur_sum[pos] = 0
+            self._dur_max[pos] = 0
+        return slot
+
+    def add(self, name: str, timestamp: float, duration: int = 0, count: int = 1) -> None:
+        index = self._index.get(name)
+        if index is None:
+            return
+        slot = self._slot(int(timestamp // 60))
+        if slot is None:
+            return
+        pos = index * self.slots + slot
+        self._counts[pos] += count
+        self._dur_sum[pos] += duration
+        if duration > self._dur_max[pos]:
+            self._dur_max[pos] = duration
+
+    def feed(self, record: JournalRecord, header: RecordHeader) -> None:
+        """Потребитель journal.ingest: учитывает запись по имени события."""
+        self.add(header.event.upper(), header.timestamp, header.duration)
+
+    def spawn(self) -> "RollingCounters":
+        """Пустые буферы с теми же сериями - для рабочего процесса journal.ingest."""
+        return RollingCounters(self.series, self.slots)
+
+    def merge(self, other: "RollingCounters") -> None:
+        """Добавляет корзины other (те же серии и число корзин) к своим."""
+        for slot, minute in enumerate(other._minutes):
+            if minute < 0 or self._slot(minute) is None:
+                continue
+            for i in range(len(self.series)):
+                pos = i * self.slots + slot
+                self._counts[pos] += other._counts[pos]
+                self._dur_sum[pos] += other._dur_sum[pos]
+                if other._dur_max[pos] > self._dur_max[pos]:
+                    self._dur_max[pos] = other._dur_max[pos]
+
+    # ------------------------------------------------------------------
+    # Запросы
+    # ------------------------------------------------------------------
+
+    def _positions(self, names: Optional[Iterable[str]], minutes: int, now: float):
+        indexes = [self._index[n] for n in (names or self.series) if n in self._index]
+        last = int(now // 60)
+        for minute in range(last - min(minutes, self.slots) + 1, last + 1):
+            slot = minute % self.slots
+            if self._minutes[slot] != minute:
+                continue
+            yield [i * self.slots + slot for i in indexes]
+
+    def count(
+        self, names: Optional[Iterable[str]] = None, minutes: int = 5, now: Optional[float] = None
+    ) -> int:
+        """Количество событий за последние minutes минут (включая текущую)."""
+        now = time.time() if now is None else now
+        return sum(self._counts[p] for ps in self._positions(names, minutes, now) for p in ps)
+
+    def rate(
+        self, names: Optional[Iterable[str]] = None, minutes: int = 5, now: Optional[float] = None
+    ) -> float:
+        """Средняя скорость, событий в секунду, за последние minutes минут."""
+        return self.count(names, minutes, now) / (minutes * 60)
+
+    def max_per_minute(
+        self, names: Optional[Iterable[str]] = None, minutes: int = 15, now: Optional[float] = None
+    ) -> int:
+        """Максимальное количество событий за одну минуту в окне."""
+        now = time.time() if now is None else now
+        return max(
+            (sum(self._counts[p] for p in ps) for ps in self._positions(names, minutes, now)),
+            default=0,
+        )
+
+    def duration_stats(
+        self, names: Optional[Iterable[str]] = None, minutes: int = 5, now: Optional[float] = None
+    ) -> Dict[str, float]:
+        """Средняя и максимальная длительность событий в окне (в единицах ТЖ)."""
+        now = time.time() if now is None else now
+        count = total = peak = 0
+        for ps in self._positions(names, minutes, now):
+            for p in ps:
+                count += self._counts[p]
+                total += self._dur_sum[p]
+                peak = max(peak, self._dur_max[p])
+        return {"avg": total / count if count else 0.0, "max": peak}
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Сводка для вывода в формате json."""
+        now = time.time() if now is None else now
+        result: Dict[str, Any] = {f"last_{m}m": self.count(None, m, now) for m in WINDOWS}
+        result["rate_per_sec_5m"] = round(self.rate(None, 5, now), 3)
+        result["max_per_min_15m"] = self.max_per_minute(None, 15, now)
+        result["events"] = {
+            name: {f"last_{m}m": self.count([name], m, now) for m in WINDOWS}
+            for name in self.series
+        }
+        return result
+
+    # ------------------------------------------------------------------
+    # Хранение
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def load(
+        cls, path: Path, series: Iterable[str], slots: int = DEFAULT_SLOTS
+    ) -> "RollingCounters":
+        """Загружает буферы из файла; при несовпадении формата начинает с пустых."""
+        store = cls(series, slots, path)
+        try:
+            data = Path(path).read_bytes()
+            magic, version, file_slots, names_len = _HEADER.unpack_from(data)
+            if magic != _MAGIC or version != _VERSION or file_slots != slots:
+                return store
+            offset = _HEADER.size
+            names = json.loads(data[offset : offset + names_len].decode("utf-8"))
+            offset += names_len
+            minutes = array("q")
+            minutes.frombytes(data[offset : offset + slots * 8])
+            offset += slots * 8
+            size = len(names) * slots * 8
+            columns = []
+            for _ in range(3):
+                column = array("q")
+                column.frombytes(data[offset : offset + size])
+                columns.append(column)
+                offset += size
+        except (OSError, ValueError, struct.error):
+            return store
+
+        store._minutes = minutes
+        # Серии сопоставляются по имени: состав событий мог измениться
+        for old_index, name in enumerate(names):
+            new_index = store._index.get(name)
+            if new_index is None:
+                continue
+            src = slice(old_index * slots, (old_index + 1) * slots)
+            dst = slice(new_index * slots, (new_index + 1) * slots)
+            store._counts[dst] = columns[0][src]
+            store._dur_sum[dst] = columns[1][src]
+            store._dur_max[dst] = columns[2][src]
+        return store
+
+    def save(self, path: Optional[Path] = None) -> None:
+        """Атомарно сохраняет буферы в двоичный файл."""
+        path = Path(path or self.path)
+        names = json.dumps(self.series).encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("wb", delete=False, dir=path.parent) as tf:
+                tf.write(_HEADER.pack(_MAGIC, _VERSION, self.slots, len(names)))
+                tf.write(names)
+                for column in (self._minutes, self._counts, self._dur_sum, self._dur_max):
+                    tf.write(column.tobytes())
+                temp_name = tf.name
+            Path(temp_name).replace(path)
+        except OSError:
+            pass
@@ -0,0 +1,325 @@
+"""
+Типизированная схема конфигурации (pydantic).
+
+main.py подставляет переменные окружения в config.yaml и один раз проверяет результат
+моделью Settings: приводит типы (порт - число, archive.enabled - bool), подставляет
+значения по умолчанию и сводит расходящиеся ключи (ras -> rac, rac_path -> rac.path,
+logs.zabbix_excps -> logs.errors). Итог сохраняется снимком JSON, поэтому при следующих
+вызовах yaml не импортируется и переменные окружения не подставляются заново;
+снимок действителен, пока не изменилась схема (SCHEMA_VERSION) и загружается
+construct_settings() без повторной проверки.
+
+Метрики получают Settings и читают параметры атрибутами; as_settings() приводит к Settings
+словарь конфигурации (так конфигурацию передают тесты и бенчмарки).
+"""
+
+import hashlib
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, Optional, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+# Устаревший ключ -> ключ, который используется в схеме
+_SECTION_ALIASES = {"ras": "rac"}
+_LOG_ALIASES = {"zabbix_excps": "errors"}
+
+# Свойства событий, которые архив хранит колонками, если archive.properties не задан
+DEFAULT_ARCHIVE_PROPERTIES = ["p:processName", "Usr", "SessionID", "t:connectID", "Context"]
+
+
+def _split_list(value: Any) -> Any:
+    """Список из строки через запятую (значение переменной окружения)."""
+    if isinstance(value, str):
+        return [p.strip() for p in value.split(",") if p.strip()]
+    return value
+
+
+class _Section(BaseModel):
+    # Неизвестные ключи сохраняются: модули метрик могут читать собственные параметры
+    model_config = ConfigDict(extra="allow")
+
+
+class RacSettings(_Section):
+    path: Optional[str] = None
+    host: str = "localhost"
+    port: int = 1545
+    user: Optional[str] = "admin"
+    password: Optional[str] = None
+    preferred_version: Optional[str] = None
+    failure_threshold: int = Field(3, ge=1)
+    backoff: float = Field(30, gt=0)
+    max_backoff: float = Field(600, gt=0)
+    slow_latency: float = Field(2.0, ge=0)
+    snapshot_ttl: float = Field(30, ge=0)
+    max_parallel: int = Field(4, ge=1)
+
+
+class LogSettings(_Section):
+    path: Optional[str] = None
+    window: int = Field(5, ge=1)
+
+
+class AnalysisSettings(_Section):
+    interval: int = Field(300, ge=1)
+    top: int = Field(10, ge=1)
+
+
+class ProfileSettings(AnalysisSettings):
+    group_by: Literal["context", "module"] = "context"
+
+
+class LocksLogSettings(LogSettings):
+    analysis: AnalysisSettings = Field(default_factory=AnalysisSettings)
+
+
+class CallsLogSettings(LogSettings):
+    profile: ProfileSettings = Field(default_factory=ProfileSettings)
+
+
+class LogsSettings(_Section):
+    sql: LogSettings = Field(default_factory=LogSettings)
+    locks: LocksLogSettings = Field(default_factory=LocksLogSettings)
+    calls: CallsLogSettings = Field(default_factory=CallsLogSettings)
+    errors: LogSettings = Field(default_factory=LogSettings)
+
+
+class CacheSettings(_Section):
+    ttl: int = Field(60, ge=0)
+    max_ttl: int = Field(600, ge=0)
+    retention: int = Field(86400, ge=0)
+    max_entries: int = Field(1000, ge=1)
+
+
+class StateSettings(_Section):
+    path: Optional[str] = None
+
+
+class JournalSettings(_Section):
+    start_position: Literal["end", "begin"] = "end"
+    workers: int = Field(0, ge=0)
+    parallel_min_mb: float = Field(64, ge=0)
+    split_mb: float = Field(32, gt=0)
+
+
+class ArchiveSettings(_Section):
+    enabled: bool = False
+    path: Optional[str] = None
+    properties: List[str] = Field(default_factory=lambda: list(DEFAULT_ARCHIVE_PROPERTIES))
+    retention_days: int = Field(30, ge=0)
+
+    @field_validator("properties", mode="before")
+    @classmethod
+    def _split(cls, value: Any) -> Any:
+        return _split_list(value)
+
+
+class DiscoverySettings(_Section):
+    refresh: float = Field(600, ge=0)
+
+
+class SessionSettings(_Section):
+    threshold: int = 50
+
+
+class BackgroundJobsSettings(_Section):
+    long_running: int = Field(600, ge=0)
+    top: int = Field(10, ge=0)
+
+
+class LicensesSettings(_Section):
+    limit: int = Field(0, ge=0)
+    connections_per_process: int = Field(0, ge=0)
+
+
+class OsProcessesSettings(_Section):
+    join_rac: bool = True
+
+
+class BatchSettings(_Section):
+    # Пустой список - набор метрик по умолчанию (main.BATCH_METRICS)
+    metrics: List[str] = Field(default_factory=list)
+
+    @field_validator("metrics", mode="before")
+    @classmethod
+    def _split(cls, value: Any) -> Any:
+        return _split_list(value)
+
+
+class WatchSettings(_Section):
+    # Пустой список - все журналы (metrics.watcher.INGESTERS)
+    journals: List[str] = Field(default_factory=list)
+    backend: Literal["auto", "inotify", "poll"] = "auto"
+    debounce: float = Field(0.2, ge=0)
+    max_delay: float = Field(1.0, ge=0)
+    poll_interval: float = Field(0.5, gt=0)
+
+    @field_validator("journals", mode="before")
+    @classmethod
+    def _split(cls, value: Any) -> Any:
+        return _split_list(value)
+
+
+class CounterSettings(_Section):
+    name: str
+    journal: Literal["locks", "calls", "sql", "excps"] = "calls"
+    # Пустой список - любое событие журнала
+    events: List[str] = Field(default_factory=list)
+    min_duration: int = Field(0, ge=0)
+    max_duration: Optional[int] = Field(None, ge=0)
+    # Свойство записи -> регулярное выражение
+    where: Dict[str, str] = Field(default_factory=dict)
+
+    @field_validator("events", mode="before")
+    @classmethod
+    def _split(cls, value: Any) -> Any:
+        return _split_list(value)
+
+    @field_validator("events")
+    @classmethod
+    def _upper(cls, value: List[str]) -> List[str]:
+        return [event.upper() for event in value]
+
+    @field_validator("where")
+    @classmethod
+    def _check_patterns(cls, value: Dict[str, str]) -> Dict[str, str]:
+        for pattern in value.values():
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"неверное регулярное выражение {pattern!r}: {e}") from e
+        return value
+
+
+class CorrelationSettings(_Section):
+    enabled: bool = False
+    window: float = Field(60, gt=0)
+    interval: int = Field(300, ge=1)
+    top: int = Field(10, ge=1)
+    max_connections: int = Field(1000, ge=1)
+    max_pending: int = Field(5000, ge=1)
+
+
+class HistorySettings(_Section):
+    enabled: bool = True
+    slots: int = Field(288, ge=2)
+    max_series: int = Field(256, ge=1)
+    min_interval: float = Field(30, ge=0)
+    memory_limit_mb: float = Field(0, ge=0)
+
+
+class ZabbixSettings(_Section):
+    server: str = "localhost"
+    port: int = 10051
+
+
+class Settings(_Section):
+    rac: RacSettings = Field(default_factory=RacSettings)
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    logs: LogsSettings = Field(default_factory=LogsSettings)
+    state: StateSettings = Field(default_factory=StateSettings)
+    journal: JournalSettings = Field(default_factory=JournalSettings)
+    archive: ArchiveSettings = Field(default_factory=ArchiveSettings)
+    discovery: DiscoverySettings = Field(default_factory=DiscoverySettings)
+    session: SessionSettings = Field(default_factory=SessionSettings)
+    background_jobs: BackgroundJobsSettings = Field(default_factory=BackgroundJobsSettings)
+    licenses: LicensesSettings = Field(default_factory=LicensesSettings)
+    os_processes: OsProcessesSettings = Field(default_factory=OsProcessesSettings)
+    batch: BatchSettings = Field(default_factory=BatchSettings)
+    watch: WatchSettings = Field(default_factory=WatchSettings)
+    counters: List[CounterSettings] = Field(default_factory=list)
+    correlation: CorrelationSettings = Field(default_factory=CorrelationSettings)
+    history: HistorySettings = Field(default_factory=HistorySettings)
+    zabbix: ZabbixSettings = Field(default_factory=ZabbixSettings)
+    platform: str = "auto"
+
+    @field_validator("counters")
+    @classmethod
+    def _unique_counters(cls, value: List[CounterSettings]) -> List[CounterSettings]:
+        # Имя счетчика - ключ корзин и элемента Zabbix, повтор смешал бы значения
+        seen = set()
+        for counter in value:
+            if counter.name in seen:
+                raise ValueError(f"имя счетчика {counter.name!r} повторяется")
+            seen.add(counter.name)
+        return value
+
+    @model_validator(mode="before")
+    @classmethod
+    def _reconcile(cls, data: Any) -> Any:
+        """Убирает пустые значения (незаданные переменные) и сводит устаревшие ключи."""
+        if not isinstance(data, dict):
+            return data
+        data = _drop_empty(data)
+        for old, new in _SECTION_ALIASES.items():
+            if isinstance(data.get(old), dict):
+                data[new] = {**data.get(new, {}), **data.pop(old)}
+        rac_path = data.pop("rac_path", None)
+        if rac_path and not data.get("rac", {}).get("path"):
+            data.setdefault("rac", {})["path"] = rac_path
+        logs = data.get("logs")
+        if isinstance(logs, dict):
+            for old, new in _LOG_ALIASES.items():
+                if isinstance(logs.get(old), dict):
+                    logs[new] = {**logs.get(new, {}), **logs.pop(old)}
+        return data
+
+
+def _drop_empty(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _drop_empty(v) for k, v in value.items() if v != "" and v is not None}
+    return value
+
+
+# Версия схемы - ключ снимков конфигурации. Хеш JSON-схемы (schema_hash()) не считается
+# при каждом запуске: тест сверяет его с этой константой, при изменении схемы ее обновляют
+SCHEMA_VERSION = "82343ac7a5115d70"
+
+
+def schema_hash() -> str:
+    """Хеш JSON-схемы Settings (для проверки SCHEMA_VERSION в тестах)."""
+    schema = json.dumps(Settings.model_json_schema(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(schema.encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def _nested_fields(model: Type[BaseModel]) -> Dict[str, Tuple[Type[BaseModel], bool]]:
+    """Поля модели со вложенными секциями: имя -> (модель секции, список ли это)."""
+    result = {}
+    for name, field in model.model_fields.items():
+        annotation, many = field.annotation, False
+        if get_origin(annotation) in (list, List):
+            annotation, many = (get_args(annotation) or (Any,))[0], True
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            result[name] = (annotation, many)
+    return result
+
+
+def _construct(model: Type[BaseModel], data: Dict[str, Any]) -> Any:
+    values = dict(data)
+    for name, (section, many) in _nested_fields(model).items():
+        value = values.get(name)
+        if many and isinstance(value, list):
+            values[name] = [_construct(section, v) if isinstance(v, dict) else v for v in value]
+        elif isinstance(value, dict):
+            values[name] = _construct(section, value)
+    return model.model_construct(**values)
+
+
+def construct_settings(data: Dict[str, Any]) -> "Settings":
+    """
+    Settings из уже проверенного снимка (model_dump той же SCHEMA_VERSION) без проверки
+    схемой: вложенные секции собираются model_construct.
+    """
+    return _construct(Settings, data)
+
+
+ConfigLike = Union[Settings, Dict[str, Any]]
+
+
+def as_settings(config: ConfigLike) -> Settings:
+    """Settings как есть; словарь конфигурации проверяется схемой (значения по умолчанию)."""
+    if isinstance(config, Settings):
+        return config
+    return Settings.model_validate(config or {})
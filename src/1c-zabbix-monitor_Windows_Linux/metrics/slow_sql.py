@@ -1,9 +1,16 @@
 import os
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, Any, Optional
-import glob
-import time
+from typing import Dict, Any, List, Optional, Union
+
+from .consumers import journal_consumers
+from .discovery import discover_journal_processes
+from .journal import get_state_dir, ingest, journal_lock, list_journal_files
+from .rolling import RollingCounters
+from .settings import ConfigLike, as_settings
+
+# События, которые вы фильтруете в logcfg.xml
+SQL_EVENTS = ["SDBL", "DBMSSQL"]
 
 
 def _get_log_location_from_cfg(target_keyword: str = "Query1c") -> Optional[str]:
@@ -36,63 +43,64 @@ def _get_log_location_from_cfg(target_keyword: str = "Query1c") -> Optional[str]
     return None
 
 
-def get_metric(config: Dict[str, Any]) -> int:
+def ingest_sql(
+    config: ConfigLike, log_files: Optional[List[str]] = None, wait: bool = False
+) -> Optional[RollingCounters]:
     """
-    Подсчитывает количество медленных SQL-запросов (SDBL/DBMSSQL).
+    Один проход по новым записям журнала запросов.
+
+    Args:
+        log_files: файлы журнала, если их список уже известен (watcher);
+            по умолчанию каталог журнала обходится заново.
+        wait: ждать, пока журнал разбирает другой процесс. По умолчанию разбор
+            пропускается и возвращается состояние, сохраненное этим процессом (watch).
+
+    Returns:
+        Поминутные счетчики или None, если журнал не найден.
     """
-    # 1. Автоматический поиск пути (G:\1c_log\Query1c из вашего XML)
-    auto_path = _get_log_location_from_cfg("Query1c")
+    settings = as_settings(config)
+    if log_files is None:
+        # 1. Автоматический поиск пути (G:\1c_log\Query1c из вашего XML)
+        auto_path = _get_log_location_from_cfg("Query1c")
 
-    # 2. Резервный путь из конфига
-    sql_path = auto_path or config.get("logs", {}).get("sql", {}).get("path")
+        # 2. Резервный путь из конфига
+        sql_path = auto_path or settings.logs.sql.path
 
-    if not sql_path or not os.path.exists(sql_path):
-        return 0
+        if not sql_path or not os.path.exists(sql_path):
+            return None
 
-    total_slow_queries = 0
-    try:
         # 1С пишет логи запросов в корень указанной папки или подпапки rphost_*
         # Проверяем оба варианта
-        search_patterns = [
-            os.path.join(sql_path, "*.log"),
-            os.path.join(sql_path, "rphost_*", "*.log"),
-        ]
+        log_files = list_journal_files(sql_path, ["*.log", "rphost_*/*.log"])
 
-        log_files = []
-        for pattern in search_patterns:
-            log_files.extend(glob.glob(pattern))
+    with journal_lock(settings, "sql", wait) as locked:
+        counters = RollingCounters.load(get_state_dir(settings) / "rolling_sql.bin", SQL_EVENTS)
+        if locked:
+            ingest(settings, "sql", log_files, [counters, *journal_consumers(settings, "sql")])
+    return counters
 
-        # Берем только свежие файлы (за последние 5 минут)
-        now = time.time()
-        recent_files = [f for f in log_files if now - os.path.getmtime(f) < 300]
-
-        for file_path in recent_files:
-            total_slow_queries += _count_events_in_file(Path(file_path))
-
-        return total_slow_queries
-    except Exception:
-        return 0
 
+def get_metric(config: ConfigLike, fmt: str = "plain") -> Union[int, Dict[str, Any]]:
+    """
+    Подсчитывает количество медленных SQL-запросов (SDBL/DBMSSQL).
 
-def _count_events_in_file(log_file: Path) -> int:
-    """Считает количество событий SDBL и DBMSSQL в последних строках."""
-    count = 0
-    # События, которые вы фильтруете в logcfg.xml
-    target_events = {"SDBL", "DBMSSQL"}
+    Метрика - количество запросов за последние logs.sql.window минут (по умолчанию 5)
+    по поминутным агрегатам; в формате json - сводка за 1/5/15 минут и длительности,
+    lld - обнаружение подкаталогов rphost_<pid> журнала.
+    """
+    if fmt == "lld":
+        return discover_journal_processes(config, "sql")
 
+    settings = as_settings(config)
     try:
-        with log_file.open("r", encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-            # Нас интересуют последние записи
-            for line in lines[-200:]:
-                parts = line.split(",")
-                if len(parts) > 1:
-                    # Извлекаем имя события из второй части строки (время-длительность,Событие)
-                    event_info = parts[1].split("-")
-                    event_name = event_info[-1].upper() if event_info else ""
-
-                    if event_name in target_events:
-                        count += 1
-        return count
+        counters = ingest_sql(settings)
+        if counters is None:
+            return 0
+
+        if fmt == "json":
+            summary = counters.summary()
+            summary["duration_5m"] = counters.duration_stats(minutes=5)
+            return summary
+        return counters.count(minutes=settings.logs.sql.window)
     except Exception:
         return 0
@@ -3,16 +3,30 @@ import platform
 import shutil
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import List, Optional
 from loguru import logger
 
+# main.py загружает этот файл отдельно от пакета, поэтому импорт не относительный
+from metrics.settings import ConfigLike, as_settings
 
-def get_rac_path(config: Dict[str, Any]) -> str:
+
+def _pick_rac(config: ConfigLike, rac_files: List[Path]) -> str:
+    """Версия из rac.preferred_version, иначе самая свежая."""
+    preferred_version = as_settings(config).rac.preferred_version
+    if preferred_version:
+        for rac_file in rac_files:
+            if preferred_version in str(rac_file):
+                return str(rac_file)
+    latest_rac = max(rac_files, key=lambda p: p.stat().st_mtime)
+    return str(latest_rac)
+
+
+def get_rac_path(config: ConfigLike) -> str:
     """
     Кроссплатформенный поиск пути к RAC.
     """
     # 1. Проверяем путь из конфига (подтянутый из .env)
-    cfg_path = config.get("ras", {}).get("path")
+    cfg_path = as_settings(config).rac.path
     if cfg_path and Path(cfg_path).exists():
         return str(cfg_path)
 
@@ -28,8 +42,7 @@ def get_rac_path(config: Dict[str, Any]) -> str:
             # Находим все rac.exe и выбираем версию по самой свежей дате изменения
             rac_files = list(base_path.glob("**/bin/rac.exe"))
             if rac_files:
-                latest_rac = max(rac_files, key=lambda p: p.stat().st_mtime)
-                return str(latest_rac)
+                return _pick_rac(config, rac_files)
 
     # 4. Автопоиск в Linux
     else:
@@ -37,8 +50,7 @@ def get_rac_path(config: Dict[str, Any]) -> str:
         if opt_path.exists():
             rac_files = list(opt_path.glob("**/rac"))
             if rac_files:
-                latest_rac = max(rac_files, key=lambda p: p.stat().st_mtime)
-                return str(latest_rac)
+                return _pick_rac(config, rac_files)
 
     return "rac"
 
@@ -0,0 +1,343 @@
+"""
+Слежение за каталогами технологического журнала для долгоживущего сборщика (main.py watch).
+
+Метрики журналов при каждом вызове заново обходят каталог журнала. Сборщик строит
+список файлов один раз, а дальше получает изменения от inotify (Linux): новые каталоги
+rphost_<pid>, новые часовые файлы и дозапись в них. Журнал с новыми данными передается
+своему инкрементальному разборщику (ingest_locks, ingest_calls, ingest_sql,
+ingest_errors - для пользовательских счетчиков журнала ошибок) через
+watch.debounce секунд после последнего события, но не позже watch.max_delay после
+первого. Пока журнал не пишется, процесс спит в select() и ничего не читает.
+После разбора locks, calls или sql журналы сопоставляются ingest_correlation()
+(при correlation.enabled).
+
+Где inotify недоступен (Windows, macOS, исчерпан лимит fs.inotify.max_user_watches),
+каталоги опрашиваются через os.scandir раз в watch.poll_interval секунд:
+сравниваются inode и размеры файлов.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .calls import ingest_calls
+from .discovery import journal_path
+from .lock_correlation import JOURNALS as CORRELATION_JOURNALS, ingest_correlation
+from .locks import ingest_locks
+from .log_errors import ingest_errors
+from .settings import ConfigLike, as_settings
+from .slow_sql import ingest_sql
+
+# Журнал -> разборщик новых записей (config, файлы журнала, wait)
+INGESTERS: Dict[str, Callable[..., Any]] = {
+    "locks": ingest_locks,
+    "calls": ingest_calls,
+    "sql": ingest_sql,
+    "excps": ingest_errors,
+}
+# Журналы, которые 1С пишет и в корень каталога, а не только в rphost_<pid>
+ROOT_FILES = {"sql", "excps"}
+
+# Флаги inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+# Как часто цикл без событий проверяет признак остановки, секунд
+IDLE_TIMEOUT = 1.0
+
+Signature = Optional[Tuple[int, int]]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class Inotify:
+    """Минимальная обертка над inotify через ctypes (без внешних зависимостей)."""
+
+    def __init__(self):
+        self._libc = _load_libc()
+        if self._libc is None:
+            raise OSError("inotify недоступен на этой платформе")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read(self, timeout: Optional[float]) -> List[Tuple[int, int, str]]:
+        """События (wd, mask, имя) или пустой список, если за timeout их не было."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(data[pos : pos + length].rstrip(b"\0"))
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _scan_logs(directory: str) -> Dict[str, Signature]:
+    """Файлы .log каталога с (inode, размер)."""
+    files: Dict[str, Signature] = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".log") and entry.is_file():
+                    st = entry.stat()
+                    files[entry.path] = (st.st_ino, st.st_size)
+    except OSError:
+        pass
+    return files
+
+
+class JournalFiles:
+    """Известные файлы одного журнала и признак новых данных для разборщика."""
+
+    def __init__(self, name: str, base: str):
+        self.name = name
+        self.base = base
+        self.root_files = name in ROOT_FILES
+        # Путь -> (inode, размер); при работе от inotify размер не отслеживается (None)
+        self.files: Dict[str, Signature] = {}
+        self.first_change: Optional[float] = None
+        self.last_change = 0.0
+
+    def scan(self) -> List[str]:
+        """Полный обход каталога журнала; возвращает каталоги rphost_<pid>."""
+        files: Dict[str, Signature] = {}
+        directories = []
+        try:
+            with os.scandir(self.base) as entries:
+                for entry in entries:
+                    if entry.name.startswith("rphost_") and entry.is_dir():
+                        directories.append(entry.path)
+        except OSError:
+            pass
+        if self.root_files:
+            files.update(_scan_logs(self.base))
+        for directory in directories:
+            files.update(_scan_logs(directory))
+        if files != self.files:
+            self.files = files
+            self.mark()
+        return directories
+
+    def mark(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        if self.first_change is None:
+            self.first_change = now
+        self.last_change = now
+
+    def due(self, debounce: float, max_delay: float) -> Optional[float]:
+        """Момент передачи новых данных разборщику или None, если их нет."""
+        if self.first_change is None:
+            return None
+        return min(self.last_change + debounce, self.first_change + max_delay)
+
+    def paths(self) -> List[str]:
+        return sorted(self.files)
+
+
+class JournalWatcher:
+    """Следит за каталогами журналов и передает новые данные разборщикам."""
+
+    def __init__(
+        self,
+        config: ConfigLike,
+        journals: Optional[List[str]] = None,
+        backend: Optional[str] = None,
+    ):
+        self.config = as_settings(config)
+        watch_cfg = self.config.watch
+        self.debounce = watch_cfg.debounce
+        self.max_delay = watch_cfg.max_delay
+        self.poll_interval = watch_cfg.poll_interval
+        self.journals: Dict[str, JournalFiles] = {}
+        for name in journals or watch_cfg.journals or list(INGESTERS):
+            base = journal_path(self.config, name)
+            if base is None:
+                logger.warning(f"Каталог журнала {name} не найден, журнал пропущен")
+                continue
+            self.journals[name] = JournalFiles(name, base)
+
+        backend = backend or watch_cfg.backend
+        self.inotify: Optional[Inotify] = None
+        if backend != "poll":
+            try:
+                self.inotify = Inotify()
+            except OSError as e:
+                if backend == "inotify":
+                    raise
+                logger.info(f"inotify недоступен ({e}), каталоги будут опрашиваться")
+        # wd -> (журнал, каталог)
+        self._watches: Dict[int, Tuple[JournalFiles, str]] = {}
+        self.runs: Dict[str, int] = {name: 0 for name in self.journals}
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self.inotify is not None else "poll"
+
+    def _watch(self, journal: JournalFiles, directory: str) -> None:
+        try:
+            self._watches[self.inotify.add(directory)] = (journal, directory)
+        except OSError as e:
+            # Например, исчерпан fs.inotify.max_user_watches: дальше только опрос
+            logger.warning(f"Не удалось следить за {directory}: {e}, переход на опрос")
+            self.close()
+
+    def rescan(self, journal: JournalFiles) -> None:
+        """Полный обход журнала (при запуске и после переполнения очереди inotify)."""
+        directories = journal.scan()
+        if self.inotify is not None:
+            for directory in [journal.base, *directories]:
+                self._watch(journal, directory)
+                if self.inotify is None:
+                    break
+        # Новые записи могли появиться до начала слежения
+        journal.mark()
+
+    def _handle(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            for journal in self.journals.values():
+                self.rescan(journal)
+            return
+        entry = self._watches.get(wd)
+        if entry is None:
+            return
+        journal, directory = entry
+        if mask & IN_IGNORED:
+            # Каталог удален (платформа чистит rphost_<pid> завершенных процессов)
+            del self._watches[wd]
+            return
+        path = os.path.join(directory, name)
+        at_base = directory == journal.base
+        if mask & IN_ISDIR:
+            if not at_base or not name.startswith("rphost_"):
+                return
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch(journal, path)
+                # Файлы, созданные до установки слежения, находятся обходом
+                journal.files.update(_scan_logs(path))
+            else:
+                prefix = path + os.sep
+                journal.files = {p: s for p, s in journal.files.items() if not p.startswith(prefix)}
+            journal.mark()
+            return
+        if not name.endswith(".log") or (at_base and not journal.root_files):
+            return
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            journal.files.pop(path, None)
+        else:
+            journal.files.setdefault(path, None)
+        journal.mark()
+
+    def poll(self) -> None:
+        """Один опрос каталогов через scandir (режим без inotify)."""
+        for journal in self.journals.values():
+            journal.scan()
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> None:
+        """Передает новые данные разборщикам журналов, для которых подошел срок."""
+        now = time.monotonic() if now is None else now
+        correlate = False
+        for name, journal in self.journals.items():
+            due = journal.due(self.debounce, self.max_delay)
+            if due is None or (due > now and not force):
+                continue
+            journal.first_change = None
+            correlate = correlate or name in CORRELATION_JOURNALS
+            try:
+                # watch ждет разбор, начатый вызовом метрики: новые изменения тот мог не застать
+                INGESTERS[name](self.config, journal.paths(), wait=True)
+                self.runs[name] += 1
+            except Exception as e:
+                logger.exception(f"Ошибка разбора журнала {name}: {e}")
+        if correlate:
+            try:
+                ingest_correlation(self.config, wait=True)
+            except Exception as e:
+                logger.exception(f"Ошибка сопоставления журналов: {e}")
+
+    def _timeout(self, now: float, next_poll: float) -> float:
+        deadlines = [
+            due
+            for due in (j.due(self.debounce, self.max_delay) for j in self.journals.values())
+            if due is not None
+        ]
+        deadlines.append(now + IDLE_TIMEOUT if self.inotify is not None else next_poll)
+        return max(0.0, min(deadlines) - now)
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """Цикл слежения до установки stop."""
+        stop = stop or threading.Event()
+        for journal in self.journals.values():
+            self.rescan(journal)
+        logger.info(f"Слежение за журналами {sorted(self.journals)} ({self.backend})")
+        next_poll = time.monotonic() + self.poll_interval
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                timeout = self._timeout(now, next_poll)
+                if self.inotify is not None:
+                    for event in self.inotify.read(timeout):
+                        self._handle(*event)
+                else:
+                    stop.wait(timeout)
+                    if time.monotonic() >= next_poll:
+                        self.poll()
+                        next_poll = time.monotonic() + self.poll_interval
+                self.flush()
+            self.flush(force=True)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+            self._watches.clear()
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Каталог пакета содержит дефисы, поэтому модули metrics импортируются напрямую из него
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PACKAGE_DIR = PROJECT_ROOT / "src" / "1c-zabbix-monitor_Windows_Linux"
+
+for path in (PACKAGE_DIR, PROJECT_ROOT):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def rac_config(tmp_path, monkeypatch):
+    """Конфигурация, направленная на имитацию rac из benchmarks/fake_rac.py."""
+    from benchmarks.run_benchmarks import make_fake_rac
+
+    monkeypatch.setenv("FAKE_RAC_CLUSTERS", "2")
+    monkeypatch.setenv("FAKE_RAC_SESSIONS", "20")
+    monkeypatch.setenv("FAKE_RAC_PROCESSES", "3")
+    monkeypatch.setenv("FAKE_RAC_INFOBASES", "2")
+    return {
+        "rac": {"path": make_fake_rac(tmp_path), "host": "localhost", "port": 1545},
+        "state": {"path": str(tmp_path / "state")},
+    }
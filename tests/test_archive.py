@@ -0,0 +1,129 @@
+import pytest
+
+from metrics.archive import EventArchive, query, read_blocks
+from metrics.consumers import journal_consumers
+from metrics.journal import BOM, ingest, list_journal_files
+
+
+def _write_journal(root):
+    log = root / "rphost_42" / "24011012.log"
+    log.parent.mkdir(parents=True)
+    log.write_bytes(
+        BOM
+        + b"00:01.000001-100,TLOCK,5,Usr=Ivanov,Regions=A\n"
+        + b"00:02.000001-300,TLOCK,5,Usr=Petrov,Regions=B\n"
+        + b"10:03.000001-50,TTIMEOUT,5,Usr=Ivanov,Context='Form : 1 :\nline'\n"
+    )
+    # Закрывает файл предыдущего часа
+    (log.parent / "24011013.log").write_bytes(b"")
+    return log
+
+
+def test_archive_stage_and_query(tmp_path):
+    log = _write_journal(tmp_path / "locks")
+    config = {
+        "state": {"path": str(tmp_path / "state")},
+        "journal": {"start_position": "begin"},
+        "archive": {"enabled": "true", "properties": "Usr,Context", "retention_days": 0},
+    }
+    files = list_journal_files(str(log.parent.parent))
+    assert ingest(config, "locks", files, journal_consumers(config, "locks")) == 3
+
+    segments = list((tmp_path / "state" / "archive" / "locks").glob("*.seg"))
+    assert [s.name for s in segments] == ["2024011012.seg"]
+    rows, data, dicts = next(read_blocks(segments[0], ["Context"]))
+    assert rows == 3 and set(data) == {"Context"}
+    assert dicts["Context"][data["Context"][2]] == "Form : 1 :\nline"
+
+    by_user = query(config, "locks", 0, 2e9, group_by="Usr")
+    assert by_user[0] == {
+        "Usr": "Petrov",
+        "count": 1,
+        "duration": 300,
+        "avg_duration": 300.0,
+        "max_duration": 300,
+    }
+    assert query(config, "locks", 0, 2e9, events=["tlock"], where={"Usr": "Ivanov"}) == [
+        {"event": "TLOCK", "count": 1, "duration": 100, "avg_duration": 100.0, "max_duration": 100}
+    ]
+    assert query(config, "locks", 0, 2e9, group_by="process")[0]["process"] == "rphost_42"
+    # Regions есть в ТЖ, но не архивируется: ошибка вместо одной пустой группы
+    with pytest.raises(ValueError, match="Regions"):
+        query(config, "locks", 0, 2e9, group_by="Regions")
+
+
+def test_merged_buffers_remap_dictionaries(tmp_path):
+    from metrics.journal import JournalRecord, RecordHeader
+
+    main, worker = (
+        EventArchive(tmp_path, ["Usr"], retention_days=0),
+        EventArchive(None, ["Usr"]).spawn(),
+    )
+    main.feed(JournalRecord("p/rphost_1/x.log", 3600, b",Usr=A,"), RecordHeader(3601, 1, "CALL"))
+    worker.feed(JournalRecord("p/rphost_2/x.log", 3600, b",Usr=B,"), RecordHeader(3602, 2, "CALL"))
+    worker.feed(JournalRecord("p/rphost_1/x.log", 3600, b",Usr=A,"), RecordHeader(3603, 3, "TLOCK"))
+    main.merge(worker)
+    main.save()
+
+    rows, data, dicts = next(read_blocks(next(tmp_path.glob("*.seg"))))
+    assert rows == 3
+    assert [dicts["Usr"][c] for c in data["Usr"]] == ["A", "B", "A"]
+    assert [dicts["event"][c] for c in data["event"]] == ["CALL", "CALL", "TLOCK"]
+
+
+def test_pending_blocks_follow_journal_commit(tmp_path, monkeypatch):
+    import metrics.journal as journal
+
+    log = _write_journal(tmp_path / "locks")
+    config = {
+        "state": {"path": str(tmp_path / "state")},
+        "journal": {"start_position": "begin"},
+        "archive": {"enabled": "true", "retention_days": 0},
+    }
+    files = list_journal_files(str(log.parent.parent))
+    archive_dir = tmp_path / "state" / "archive" / "locks"
+
+    # Сбой до фиксации позиций: блоки остаются в pending.blk, сегментов нет
+    def crash(self):
+        raise RuntimeError("crash")
+
+    monkeypatch.setattr(journal.JournalReader, "commit", crash)
+    try:
+        ingest(config, "locks", files, journal_consumers(config, "locks"))
+    except RuntimeError:
+        pass
+    monkeypatch.undo()
+    assert (archive_dir / "pending.blk").exists()
+    assert not list(archive_dir.glob("*.seg"))
+
+    # Повторное чтение отбрасывает незафиксированный пакет: строки не задваиваются
+    assert ingest(config, "locks", files, journal_consumers(config, "locks")) == 3
+    assert not (archive_dir / "pending.blk").exists()
+    assert query(config, "locks", 0, 2e9, group_by="hour") == [
+        {
+            "hour": "2024-01-10 12:00",
+            "count": 3,
+            "duration": 450,
+            "avg_duration": 150.0,
+            "max_duration": 300,
+        }
+    ]
+
+    # Сбой после фиксации, но до переноса: перенос при следующем прогоне, без повторов
+    with log.open("ab") as f:
+        f.write(b"20:00.000001-7,TLOCK,5,Usr=Ivanov\n")
+    monkeypatch.setattr(EventArchive, "committed", lambda self: None)
+    assert ingest(config, "locks", files, journal_consumers(config, "locks")) == 1
+    monkeypatch.undo()
+
+    # ... и сбой во время переноса: блок уже в сегменте, pending.blk не удален
+    def keep(self, missing_ok=False):
+        raise OSError("busy")
+
+    monkeypatch.setattr(type(archive_dir), "unlink", keep)
+    journal_consumers(config, "locks")[0].committed()
+    monkeypatch.undo()
+    assert (archive_dir / "pending.blk").exists()
+    assert ingest(config, "locks", files, journal_consumers(config, "locks")) == 0
+    assert query(config, "locks", 0, 2e9)[0]["count"] == 3
+    assert sum(row["count"] for row in query(config, "locks", 0, 2e9)) == 4
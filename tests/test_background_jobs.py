@@ -0,0 +1,44 @@
+import subprocess
+from datetime import datetime
+
+from metrics import background_jobs, sessions
+from metrics.background_jobs import summarize_jobs
+
+
+def test_summarize_jobs_separates_jobs_from_user_sessions():
+    now = datetime(2024, 1, 10, 10, 0).timestamp()
+    blocks = [
+        {"app-id": "1CV8C", "infobase": "a", "started-at": "2024-01-10T08:00:00"},
+        {
+            "app-id": "BackgroundJob",
+            "infobase": "a",
+            "session-id": "5",
+            "started-at": "2024-01-10T08:00:00",
+            "cpu-time-current": "1500",
+            "memory-current": "2048",
+        },
+        {"app-id": "JobScheduler", "infobase": "b", "started-at": "2024-01-10T09:59:00"},
+    ]
+    summary = summarize_jobs(blocks, {"a": "ib_a"}, long_running=600, now=now)
+
+    assert summary["total"] == 2
+    assert summary["by_type"] == {"BackgroundJob": 1, "SystemBackgroundJob": 0, "JobScheduler": 1}
+    assert summary["long_running"] == 1
+    assert summary["longest"][0]["session_id"] == "5"
+    assert summary["longest"][0]["age"] == 7200
+    assert summary["longest"][0]["cpu_time"] == 1500
+    assert [ib["name"] for ib in summary["infobases"]] == ["b", "ib_a"]
+    assert summary["memory"] == 2048
+
+
+def test_background_jobs_reuse_session_snapshot(rac_config, monkeypatch):
+    total = sessions.get_metric(rac_config)
+    assert total == 2 * 20
+
+    def fail(*args, **kwargs):
+        raise AssertionError("снимок session list должен использоваться повторно")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    summary = background_jobs.get_metric(rac_config, "json")
+    assert 0 < summary["total"] < total
+    assert background_jobs.get_metric(rac_config) == summary["total"]
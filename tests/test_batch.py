@@ -0,0 +1,85 @@
+import subprocess
+from datetime import datetime
+
+import main
+from metrics.rac_client import get_breaker
+
+
+def test_batch_issues_each_rac_command_once_per_cluster(rac_config, monkeypatch):
+    calls = []
+    run = subprocess.run
+
+    def counting_run(cmd, *args, **kwargs):
+        calls.append(" ".join(cmd[1:3]))
+        return run(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(subprocess, "run", counting_run)
+    metrics = ["ras_health", "sessions", "rphost", "background_jobs", "licenses", "infobase_perf"]
+    result = main.collect_batch(rac_config, metrics)
+
+    assert list(result) == metrics
+    assert result["ras_health"] == 1 and result["sessions"] == 2 * 20
+    assert result["licenses"]["licenses"]["used"] == 2 * 20
+    assert calls.count("session list") == 2 * 2  # session list и session list --licenses
+    assert calls.count("process list") == 2
+    assert calls.count("connection list") == 2
+
+
+def test_batch_ingests_each_journal_once(tmp_path, monkeypatch):
+    import metrics.calls
+    import metrics.locks
+
+    now = datetime.now()
+    stamp = f"{now.minute:02d}:{now.second:02d}.000001"
+    for journal, event in (("locks", "TLOCK"), ("calls", "CALL")):
+        log = tmp_path / journal / "rphost_1" / now.strftime("%y%m%d%H.log")
+        log.parent.mkdir(parents=True)
+        log.write_bytes(f"{stamp}-10,{event},3,Context=A\n".encode())
+    config = main.Settings.model_validate(
+        {
+            "state": {"path": str(tmp_path / "state")},
+            "journal": {"start_position": "begin"},
+            "logs": {
+                "locks": {"path": str(tmp_path / "locks")},
+                "calls": {"path": str(tmp_path / "calls")},
+            },
+        }
+    )
+
+    passes = []
+    for module in (metrics.locks, metrics.calls):
+        ingest = module.ingest
+
+        def counting_ingest(config, name, *args, ingest=ingest):
+            passes.append(name)
+            return ingest(config, name, *args)
+
+        monkeypatch.setattr(module, "ingest", counting_ingest)
+
+    result = main.collect_batch(config, ["locks", "lock_contention", "calls", "call_profile"])
+    assert sorted(passes) == ["calls", "locks"]
+    assert result["locks"]["last_5m"] == 1
+    assert result["calls"]["last_5m"] == 1
+    # Вне пакета метрика снова дочитывает журнал сама
+    main.safe_import_metric("locks")(config)
+    assert sorted(passes) == ["calls", "locks", "locks"]
+
+
+def test_batch_falls_back_to_stale_values_per_metric(rac_config, tmp_path):
+    config = main.Settings.model_validate(rac_config)
+    cache = main.SQLiteTTLCache(path=tmp_path / "cache.sqlite")
+    metrics = ["ras_health", "sessions", "licenses"]
+
+    fresh = main.collect_batch(config, metrics, cache)
+    assert fresh["sessions"] == 2 * 20
+    assert cache.get("sessions_json", max_age=float("inf")) == "40"
+
+    # RAS недоступен: sessions и licenses отдают последние значения, ras_health - 0
+    breaker = get_breaker(config)
+    breaker.state.update(failures=breaker.threshold, open_until=2e9)
+    breaker.save()
+    cache.set("sessions_json", "41")
+    stale = main.collect_batch(config, metrics, cache)
+    assert stale["ras_health"] == 0
+    assert stale["sessions"] == 41
+    assert stale["licenses"] == fresh["licenses"]
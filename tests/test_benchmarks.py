@@ -0,0 +1,48 @@
+import re
+from datetime import datetime
+
+from benchmarks import fake_rac
+from benchmarks.journal_generator import BOM, generate
+
+
+def test_fake_rac_emits_requested_volume(monkeypatch):
+    monkeypatch.setenv("FAKE_RAC_CLUSTERS", "3")
+    monkeypatch.setenv("FAKE_RAC_SESSIONS", "25")
+    monkeypatch.setenv("FAKE_RAC_PROCESSES", "2")
+
+    clusters = re.findall(
+        r"cluster\s+:\s+([a-f0-9-]+)", fake_rac.render(["cluster", "list", "host:1545"])
+    )
+    assert len(clusters) == 3
+
+    sessions = fake_rac.render(["session", "list", f"--cluster={clusters[0]}", "host:1545"])
+    processes = fake_rac.render(["process", "list", f"--cluster={clusters[0]}", "host:1545"])
+    assert len(re.findall(r"^session\s+:", sessions, re.M)) == 25
+    process_ids = set(re.findall(r"^process\s+:\s+(\S+)", processes, re.M))
+    assert len(process_ids) == 2
+    # Сессии ссылаются на процессы из process list того же кластера
+    assert set(re.findall(r"^process\s+:\s+(\S+)", sessions, re.M)) <= process_ids
+
+
+def test_journal_generator_layout(tmp_path):
+    end = datetime(2024, 1, 10, 12, 30)
+    counts = generate(
+        tmp_path, size_mb=0.2, rphosts=2, hours=2, journals=["locks", "calls"], end=end
+    )
+
+    files = sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*.log"))
+    assert files == [
+        "calls/rphost_10000/24011011.log",
+        "calls/rphost_10000/24011012.log",
+        "calls/rphost_10001/24011011.log",
+        "calls/rphost_10001/24011012.log",
+        "locks/rphost_10000/24011011.log",
+        "locks/rphost_10000/24011012.log",
+        "locks/rphost_10001/24011011.log",
+        "locks/rphost_10001/24011012.log",
+    ]
+    data = (tmp_path / "locks/rphost_10000/24011011.log").read_bytes()
+    assert data.startswith(BOM)
+    events = re.findall(rb"^\d\d:\d\d\.\d{6}-\d+,(\w+),", data, re.M)
+    assert events and set(events) <= {b"TLOCK", b"TTIMEOUT", b"TDEADLOCK"}
+    assert counts["locks"] > 0 and counts["calls"] > 0
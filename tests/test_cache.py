@@ -0,0 +1,51 @@
+import time
+
+import main
+
+
+def test_sqlite_cache_expiry_and_stale_fallback(tmp_path):
+    cache = main.SQLiteTTLCache(ttl=60, path=tmp_path / "cache.sqlite")
+    assert cache.get("sessions_plain") is None
+    cache.set("sessions_plain", "40")
+    assert cache.get("sessions_plain") == "40"
+
+    # Срок годности фиксируется при записи: смена ttl не продлевает и не сокращает его
+    cache.ttl = 0
+    assert cache.get("sessions_plain") == "40"
+    cache.set("sessions_plain", "41")
+    cache.set("rphost_plain", "6", ttl=600)
+    time.sleep(0.01)
+    assert cache.get("sessions_plain") is None
+    assert cache.get("rphost_plain") == "6"
+    # Устаревший ответ отдается, пока RAS недоступен
+    assert cache.get("sessions_plain", max_age=float("inf")) == "41"
+
+
+def test_sqlite_cache_recreates_table_without_expiry(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "cache.sqlite"
+    with sqlite3.connect(str(path)) as db:
+        db.execute(
+            "CREATE TABLE cache (key TEXT PRIMARY KEY, output TEXT NOT NULL, stored_at REAL)"
+        )
+        db.execute("INSERT INTO cache VALUES ('sessions_plain', '40', ?)", (time.time(),))
+    cache = main.SQLiteTTLCache(path=path)
+    assert cache.get("sessions_plain") is None
+    cache.set("sessions_plain", "42")
+    assert cache.get("sessions_plain") == "42"
+
+
+def test_sqlite_cache_evicts_old_and_excess_entries(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = main.SQLiteTTLCache(ttl=60, path=path, retention=3600, max_entries=3)
+    for i in range(5):
+        cache.set(f"key_{i}", str(i))
+    other = main.SQLiteTTLCache(ttl=60, path=path)
+    assert [other.get(f"key_{i}") for i in range(5)] == [None, None, "2", "3", "4"]
+
+    cache.retention = 0
+    time.sleep(0.01)
+    cache.set("key_5", "5")
+    assert other.get("key_4", max_age=float("inf")) is None
+    assert other.get("key_5") == "5"
@@ -0,0 +1,52 @@
+from metrics.call_profile import CallProfiler, normalize_context
+from metrics.journal import JournalRecord, parse_header
+
+HOUR = 1_700_002_800.0
+
+
+def _feed(profiler, line):
+    record = JournalRecord("x.log", HOUR, line.encode("utf-8"))
+    profiler.feed(record, parse_header(record))
+
+
+def test_normalize_context():
+    context = (
+        "Документ.Реализация.МодульОбъекта : 120 : ОбработкаПроведения()\nОбщийМодуль.X : 5 : Y()"
+    )
+    assert normalize_context(context) == "Документ.Реализация.МодульОбъекта : ОбработкаПроведения()"
+    assert normalize_context(context, "module") == "Документ.Реализация.МодульОбъекта"
+    assert normalize_context("  ") == "<без контекста>"
+
+
+def test_call_profiler_totals_per_context(tmp_path):
+    profiler = CallProfiler(interval=300, top=5, path=tmp_path / "calls.json")
+    _feed(
+        profiler,
+        "00:01.000001-1000,CALL,1,Context='М.Модуль : 10 : А()',Memory=100,MemoryPeak=500,"
+        "InBytes=10,OutBytes=20,CpuTime=700\n",
+    )
+    _feed(
+        profiler,
+        "00:02.000001-3000,CALL,1,Context='М.Модуль : 42 : А()',Memory=-50,MemoryPeak=300,"
+        "InBytes=1,OutBytes=2,CpuTime=300\n",
+    )
+    _feed(profiler, "00:03.000001-5,CALL,1,IName=IVResourceRemoteConnection,MName=call\n")
+    _feed(profiler, "00:04.000001-5,TLOCK,1,Context=X\n")
+    profiler.save()
+
+    loaded = CallProfiler.load(tmp_path / "calls.json", interval=300, top=5)
+    report = loaded.report(now=HOUR + 301)
+    assert report["calls"] == 3 and report["duration"] == 4005
+    assert report["contexts"][0] == {
+        "context": "М.Модуль : А()",
+        "count": 2,
+        "duration": 4000,
+        "cpu_time": 1000,
+        "memory": 50,
+        "memory_peak": 500,
+        "in_bytes": 11,
+        "out_bytes": 22,
+    }
+    assert loaded.discovery(now=HOUR + 301)["data"][1] == {
+        "{#CALL_CONTEXT}": "IVResourceRemoteConnection.call"
+    }
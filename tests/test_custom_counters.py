@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+
+from metrics import custom_counters
+from metrics.custom_counters import compile_counters
+from metrics.journal import JournalRecord, parse_header
+from metrics.settings import CounterSettings, Settings
+
+DEFINITIONS = [
+    {"name": "slow_sql", "journal": "sql", "events": ["DBMSSQL"], "min_duration": 1000},
+    {"name": "any_insert", "journal": "sql", "where": {"Sql": "(?i)insert into"}},
+    {
+        "name": "deadlock",
+        "journal": "calls",
+        "events": "EXCP",
+        "where": {"Descr": "(?i)взаимоблок"},
+    },
+]
+
+
+def _match(matchers, journal, data):
+    record = JournalRecord("x/rphost_1/24011012.log", 0, data)
+    return matchers[journal].match(record, parse_header(record))
+
+
+def test_matcher_checks_event_duration_and_properties():
+    matchers = compile_counters(CounterSettings.model_validate(d) for d in DEFINITIONS)
+    assert set(matchers) == {"sql", "calls"}
+
+    assert _match(matchers, "sql", b"00:01.000001-5000,DBMSSQL,3,Sql='SELECT 1'\n") == ["slow_sql"]
+    assert _match(matchers, "sql", b"00:01.000001-10,DBMSSQL,3,Sql='INSERT INTO t'\n") == [
+        "any_insert"
+    ]
+    # Счетчик без событий проверяется и для событий, которых нет в таблице
+    assert _match(matchers, "sql", b"00:01.000001-10,SDBL,3,Sql='insert into t'\n") == [
+        "any_insert"
+    ]
+    assert _match(matchers, "sql", b"00:01.000001-10,SDBL,3\n") == []
+
+    excp = "00:01.000001-0,EXCP,1,Descr='Конфликт блокировок: Взаимоблокировка'\n"
+    assert _match(matchers, "calls", excp.encode("utf-8")) == ["deadlock"]
+    assert _match(matchers, "calls", b"00:01.000001-0,EXCP,1,Descr=other\n") == []
+
+
+def test_counters_are_fed_by_journal_ingest(tmp_path):
+    now = datetime.now()
+    base = tmp_path / "sql"
+    log = base / "rphost_1" / now.strftime("%y%m%d%H.log")
+    log.parent.mkdir(parents=True)
+    head = f"{now.minute:02d}:{now.second:02d}.000001"
+    log.write_bytes(
+        f"{head}-5000,DBMSSQL,3,Sql='insert into t'\n"
+        f"{head}-10,DBMSSQL,3,Sql='select 1'\n"
+        f"{head}-2000,SDBL,3,Sql='select 1'\n".encode("utf-8")
+    )
+    config = {
+        "logs": {"sql": {"path": str(base)}},
+        "state": {"path": str(tmp_path / "state")},
+        "journal": {"start_position": "begin"},
+        "counters": DEFINITIONS,
+    }
+
+    result = custom_counters.get_metric(config, "json")
+    assert result["slow_sql"]["last_5m"] == 1
+    assert result["slow_sql"]["duration_5m"]["max"] == 5000
+    assert result["any_insert"]["last_5m"] == 1
+    assert result["deadlock"]["last_5m"] == 0
+    assert custom_counters.get_metric(config, "plain") == 2
+    lld = custom_counters.get_metric(config, "lld")["data"]
+    assert {"{#COUNTER}": "deadlock", "{#JOURNAL}": "calls"} in lld
+
+
+def test_counter_names_are_unique():
+    with pytest.raises(ValueError, match="slow_sql"):
+        Settings.model_validate(
+            {"counters": [*DEFINITIONS, {"name": "slow_sql", "journal": "calls"}]}
+        )
+    with pytest.raises(ValueError):
+        Settings.model_validate({"counters": [{"name": "errors", "journal": "errors"}]})
+
+
+def test_counters_read_errors_journal(tmp_path):
+    now = datetime.now()
+    base = tmp_path / "excps"
+    log = base / "rphost_1" / now.strftime("%y%m%d%H.log")
+    log.parent.mkdir(parents=True)
+    head = f"{now.minute:02d}:{now.second:02d}.000001"
+    log.write_bytes(
+        f"{head}-0,EXCP,1,Descr='Конфликт блокировок: Взаимоблокировка'\n"
+        f"{head}-0,EXCP,1,Descr='Деление на 0'\n".encode("utf-8")
+    )
+    config = {
+        "logs": {"errors": {"path": str(base)}},
+        "state": {"path": str(tmp_path / "state")},
+        "journal": {"start_position": "begin"},
+        "counters": [
+            {
+                "name": "deadlock",
+                "journal": "excps",
+                "events": "EXCP",
+                "where": DEFINITIONS[2]["where"],
+            }
+        ],
+    }
+
+    assert custom_counters.get_metric(config, "json")["deadlock"]["last_5m"] == 1
+    # Позиции чтения сохранены: повторный вызов не учитывает записи дважды
+    with log.open("ab") as f:
+        f.write(f"{head}-0,EXCP,1,Descr='взаимоблокировка'\n".encode("utf-8"))
+    assert custom_counters.get_metric(config, "plain") == 2
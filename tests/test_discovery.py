@@ -0,0 +1,61 @@
+import json
+
+from metrics import discovery
+from metrics.discovery import discover, journal_processes
+from metrics.rac_client import parse_blocks
+
+
+def test_parse_blocks_unquotes_values():
+    output = 'infobase : 1\nname     : ib\ndescr    : "База ""1"""\n\ninfobase : 2\nname : x\n\n'
+    assert parse_blocks(output) == [
+        {"infobase": "1", "name": "ib", "descr": 'База "1"'},
+        {"infobase": "2", "name": "x"},
+    ]
+
+
+def test_discover_is_stable_and_keeps_last_known_set(tmp_path):
+    config = {"state": {"path": str(tmp_path)}, "discovery": {"refresh": 0}}
+    calls = []
+
+    def collect(items):
+        def run():
+            calls.append(1)
+            return items
+
+        return run
+
+    first = discover(config, "x", collect([{"{#A}": "2"}, {"{#A}": "1"}, {"{#A}": "2"}]))
+    assert first == {"data": [{"{#A}": "1"}, {"{#A}": "2"}]}
+    state = json.loads((tmp_path / "discovery" / "x.json").read_text(encoding="utf-8"))
+
+    # Тот же состав в другом порядке - тот же вывод, время изменения не сдвигается
+    assert discover(config, "x", collect([{"{#A}": "2"}, {"{#A}": "1"}])) == first
+    again = json.loads((tmp_path / "discovery" / "x.json").read_text(encoding="utf-8"))
+    assert again["changed_at"] == state["changed_at"]
+
+    # Источник недоступен - последний известный состав
+    assert discover(config, "x", collect(None)) == first
+
+    # В пределах discovery.refresh сбор не выполняется
+    config["discovery"]["refresh"] = 3600
+    calls.clear()
+    assert discover(config, "x", collect([{"{#A}": "3"}])) == first
+    assert calls == []
+
+
+def test_journal_processes_and_infobases(tmp_path, rac_config, monkeypatch):
+    monkeypatch.setattr(discovery, "get_log_location_from_cfg", lambda keyword: None)
+    (tmp_path / "locks" / "rphost_100").mkdir(parents=True)
+    (tmp_path / "locks" / "rphost_100" / "24011012.log").write_bytes(b"")
+    (tmp_path / "locks" / "rphost_200").mkdir()
+    rac_config["logs"] = {"locks": {"path": str(tmp_path / "locks")}}
+
+    assert journal_processes(rac_config, "locks") == [
+        {"{#JOURNAL}": "locks", "{#RPHOST_DIR}": "rphost_100", "{#RPHOST_PID}": "100"}
+    ]
+    assert journal_processes(rac_config, "calls") is None
+
+    data = discovery.discover_infobases(rac_config)["data"]
+    assert len(data) == 4
+    assert {item["{#INFOBASE}"] for item in data} == {"ib_1", "ib_2"}
+    assert len({item["{#CLUSTER_ID}"] for item in data}) == 2
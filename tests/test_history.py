@@ -0,0 +1,87 @@
+from metrics import history, rphost, sessions
+from metrics.history import History
+
+
+def test_ring_buffer_rate_and_eviction(tmp_path):
+    path = tmp_path / "history.bin"
+    with History(path, slots=4, max_series=2) as store:
+        for i in range(6):
+            store.record({"a": i * 10.0, "b": 1.0}, now=1000 + i * 60)
+        store.record({"a": 100.0}, now=1000 + 5 * 60 + 10)
+        # Предпоследняя точка моложе min_interval: новая заменяет последнюю
+        store.record({"a": 110.0}, now=1000 + 5 * 60 + 20)
+        assert [v for _, v in store.points("a")] == [30.0, 40.0, 50.0, 110.0]
+        assert store.rate("a") == (110.0 - 30.0) * 3600 / (1320 - 1180)
+
+    # Файл переживает процесс; новая серия вытесняет дольше всех не обновлявшуюся
+    with History(path, slots=4, max_series=2) as store:
+        assert store.last("a") == 110.0
+        store.record({"c": 5.0}, now=2000)
+        assert store.series() == ["a", "c"]
+
+    # Другой размер буферов - история начинается заново
+    with History(path, slots=8, max_series=2) as store:
+        assert store.series() == []
+
+
+def test_frequent_records_are_thinned_not_collapsed(tmp_path):
+    with History(tmp_path / "history.bin", slots=32, max_series=2) as store:
+        # Опрос чаще min_interval, но реже его половины: каждая точка остается
+        for i in range(20):
+            store.record({"a": float(i)}, now=1000 + i * 20, min_interval=30)
+        assert store.count("a") == 20
+        # Очень частые точки прореживаются, последняя всегда свежая
+        for i in range(10):
+            store.record({"b": float(i)}, now=1000 + i * 5, min_interval=30)
+        assert [t for t, _ in store.points("b")] == [1000, 1025, 1045]
+        assert store.last("b") == 9.0
+
+
+def test_concurrent_writers_share_series_directory(tmp_path):
+    path = tmp_path / "history.bin"
+    # Оба процесса открыли файл до того, как кто-то из них занял место серии
+    first, second = History(path, slots=4, max_series=4), History(path, slots=4, max_series=4)
+    with first, second:
+        first.record({"a": 1.0}, now=1000)
+        second.record({"b": 2.0}, now=1000)
+        second.record({"a": 3.0}, now=1100)
+    # Без перечитывания каталога второй занял бы под "b" место серии "a"
+    with History(path, slots=4, max_series=4) as store:
+        assert store.series() == ["a", "b"]
+        assert [v for _, v in store.points("a")] == [1.0, 3.0]
+
+
+def test_open_checks_and_resets_file_under_lock(tmp_path):
+    import threading
+
+    from metrics.journal import file_lock
+
+    path = tmp_path / "history.bin"
+    with History(path, slots=4, max_series=2) as store:
+        store.record({"a": 1.0}, now=1000)
+
+    # Пока другой процесс держит блокировку, файл не проверяется и не обнуляется
+    opened = []
+    with file_lock(path.with_name("history.bin.lock")):
+        thread = threading.Thread(target=lambda: opened.append(History(path, slots=4)))
+        thread.start()
+        thread.join(0.3)
+        assert not opened
+    thread.join()
+    with opened[0] as store:
+        assert store.series() == []
+
+
+def test_rphost_and_sessions_feed_trends(rac_config):
+    rac_config["history"] = {"min_interval": 0, "memory_limit_mb": 1_000_000}
+    assert rphost.get_metric(rac_config) == 2 * 3
+    assert sessions.get_metric(rac_config) == 2 * 20
+
+    report = history.get_metric(rac_config, "json")
+    series = report["series"]
+    assert series["sessions"]["last"] == 2 * 20
+    assert sum(1 for name in series if name.endswith(".call_time")) == 2 * 3
+    # Одна точка: скорость еще не известна
+    assert series["rphost.memory"]["rate_per_hour"] is None
+    assert history.get_metric(rac_config, "plain") == -1
+    assert len(history.get_metric(rac_config, "lld")["data"]) == 2 * 3
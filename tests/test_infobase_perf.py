@@ -0,0 +1,36 @@
+from metrics import infobase_perf
+from metrics.infobase_perf import rollup
+
+
+def test_rollup_per_infobase():
+    sessions = [
+        {
+            "infobase": "a",
+            "calls-last-5min": "300",
+            "duration-last-5min": "1000",
+            "duration-last-5min-dbms": "250",
+            "blocked-by-dbms": "17",
+            "blocked-by-ls": "17",
+        },
+        {"infobase": "a", "duration-last-5min": "1000", "duration-last-5min-dbms": "750"},
+        {"infobase": "b", "duration-last-5min": "10", "blocked-by-ls": "3"},
+    ]
+    report = rollup(sessions, {"a": "ib_a"})
+
+    a, b = report["infobases"]
+    assert (a["name"], a["sessions"], b["name"]) == ("ib_a", 2, "b")
+    assert a["dbms_share"] == 50.0
+    assert a["call_rate"] == 1.0
+    # Номер блокирующего сеанса не суммируется: считаются ожидающие сеансы
+    assert (a["lock_wait_dbms"], a["lock_wait_ls"], a["lock_wait_sessions"]) == (1, 1, 1)
+    assert report["total"]["lock_wait_sessions"] == 2
+    assert report["total"]["lock_wait_share"] == round(2 * 100 / 3, 1)
+
+
+def test_infobase_perf_totals_match_infobases(rac_config):
+    report = infobase_perf.get_metric(rac_config, "json")
+    assert report["total"]["sessions"] == 2 * 20
+    assert len(report["infobases"]) <= 2 * 2
+    for column in ("duration_last_5min", "db_proc_took", "lock_wait_sessions"):
+        assert report["total"][column] == sum(ib[column] for ib in report["infobases"])
+    assert infobase_perf.get_metric(rac_config, "plain") == report["total"]["dbms_share"]
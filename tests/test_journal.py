@@ -0,0 +1,161 @@
+from metrics.journal import BOM, JournalReader, list_journal_files, parse_header, read_range
+
+
+def _events(reader, files):
+    records = list(reader.read(files))
+    reader.commit()
+    return [parse_header(r).event for r in records]
+
+
+def test_reader_holds_incomplete_trailing_record(tmp_path):
+    log = tmp_path / "rphost_1" / "24011012.log"
+    log.parent.mkdir()
+    log.write_bytes(BOM + b"00:01.000001-5,TLOCK,5,Regions=A\n00:02.000001-7,CALL,5,Cont")
+    reader = JournalReader(tmp_path / "state.json", start_at_end=False)
+    files = [str(log)]
+
+    assert _events(reader, files) == ["TLOCK"]
+
+    with log.open("ab") as f:
+        f.write(b"ext='line1\n")
+    # Перевод строки внутри кавычек - запись еще не завершена
+    assert _events(JournalReader(tmp_path / "state.json"), files) == []
+
+    with log.open("ab") as f:
+        f.write(b"line2'\n")
+    assert _events(JournalReader(tmp_path / "state.json"), files) == ["CALL"]
+    assert _events(JournalReader(tmp_path / "state.json"), files) == []
+
+
+def test_reader_follows_hourly_rotation(tmp_path):
+    proc = tmp_path / "rphost_1"
+    proc.mkdir()
+    old = proc / "24011012.log"
+    old.write_bytes(BOM + b"59:59.000001-5,TLOCK,5,p=1\n59:59.900000-5,TTIMEOUT,5,p=1")
+    state = tmp_path / "state.json"
+
+    assert _events(JournalReader(state, start_at_end=False), list_journal_files(str(tmp_path))) == [
+        "TLOCK"
+    ]
+
+    (proc / "24011013.log").write_bytes(BOM + b"00:00.100000-5,TDEADLOCK,5,p=1\n")
+    events = _events(JournalReader(state), list_journal_files(str(tmp_path)))
+    # Файл прошлого часа закрыт: последняя запись отдается без ожидания продолжения
+    assert events == ["TTIMEOUT", "TDEADLOCK"]
+
+
+def test_reader_first_run_skips_history_and_handles_truncation(tmp_path):
+    log = tmp_path / "rphost_1" / "24011012.log"
+    log.parent.mkdir()
+    log.write_bytes(BOM + b"00:01.000001-5,TLOCK,5,p=1\n")
+    state = tmp_path / "state.json"
+
+    assert _events(JournalReader(state), [str(log)]) == []
+    with log.open("ab") as f:
+        f.write(b"00:02.000001-5,TLOCK,5,p=1\n")
+    assert _events(JournalReader(state), [str(log)]) == ["TLOCK"]
+
+    log.write_bytes(BOM + b"00:03.000001-5,CALL,5,p=1\n")
+    assert _events(JournalReader(state), [str(log)]) == ["CALL"]
+
+
+def test_split_ranges_cover_file_on_record_boundaries(tmp_path):
+    log = tmp_path / "rphost_1" / "24011012.log"
+    log.parent.mkdir()
+    lines = [f"00:{i % 60:02d}.000001-{i},CALL,5,Context='a\n{i}'\n" for i in range(500)]
+    log.write_bytes(BOM + "".join(lines).encode("utf-8"))
+    # Следующий час делает файл закрытым: последняя запись отдается сразу
+    (log.parent / "24011013.log").write_bytes(b"")
+    reader = JournalReader(tmp_path / "state.json", start_at_end=False)
+
+    ranges = reader.plan([str(log), str(log.parent / "24011013.log")], split_size=1000)
+    assert len(ranges) > 5
+    assert ranges[0].start == len(BOM) and ranges[-1].end == log.stat().st_size
+    assert all(a.end == b.start for a, b in zip(ranges, ranges[1:]))
+    durations = [parse_header(r).duration for scan in ranges for r in read_range(scan)]
+    assert durations == list(range(500))
+
+
+def test_parallel_ingest_matches_sequential(tmp_path):
+    from benchmarks.journal_generator import generate
+
+    from metrics.journal import ingest
+    from metrics.lock_contention import LockAnalyzer
+    from metrics.rolling import RollingCounters
+
+    root = tmp_path / "journal"
+    generate(root, 2, rphosts=3, hours=3, journals=["locks"], seed=7)
+    files = list_journal_files(str(root / "locks"))
+
+    results = []
+    for name, journal in (
+        ("sequential", {"start_position": "begin", "parallel_min_mb": 1024}),
+        (
+            "parallel",
+            {"start_position": "begin", "parallel_min_mb": 0, "split_mb": 0.1, "workers": 2},
+        ),
+    ):
+        config = {"state": {"path": str(tmp_path / name)}, "journal": journal}
+        counters = RollingCounters(["TLOCK", "TTIMEOUT", "TDEADLOCK"], slots=1440)
+        analyzer = LockAnalyzer(top=1000, path=tmp_path / name / "a.json")
+        counters.path = tmp_path / name / "c.bin"
+        processed = ingest(config, "locks", files, [counters, analyzer])
+        results.append((processed, list(counters._counts), analyzer.previous, analyzer.current))
+
+    assert results[0][0] > 0
+    # Интервал анализатора по умолчанию: оба последних интервала заполнены записями всех rphost
+    previous = results[0][2]
+    assert previous is not None and results[0][3] is not None
+    assert results[0] == results[1]
+    # Ни одна запись интервала не потеряна при переходе между каталогами процессов
+    expected = 0
+    for path in files:
+        for record in JournalReader(tmp_path / "check.json", start_at_end=False).read([path]):
+            start = parse_header(record).timestamp // analyzer.interval * analyzer.interval
+            expected += start == previous["start"]
+    assert sum(previous["events"].values()) == expected
+
+
+def test_encoding_detected_once_and_only_values_decoded(tmp_path):
+    from metrics.journal import detect_encoding, get_property
+
+    assert detect_encoding(BOM + b"00:01") == (3, "utf-8")
+    assert detect_encoding("Ошибка".encode("utf-8")[:-1]) == (0, "utf-8")
+    assert detect_encoding("Ошибка".encode("cp1251")) == (0, "cp1251")
+
+    log = tmp_path / "rphost_1" / "24011012.log"
+    log.parent.mkdir()
+    log.write_bytes("00:01.000001-5,EXCP,5,Usr=Иванов,Descr='a,\nb'\n".encode("cp1251"))
+    reader = JournalReader(tmp_path / "state.json", start_at_end=False)
+    (record,) = list(reader.read([str(log)]))
+    assert isinstance(record.data, bytes) and record.encoding == "cp1251"
+    assert record.get("Usr") == "Иванов" and record.get("Descr") == "a,\nb"
+    assert get_property(record.data, "Descr") == b"a,\nb"
+    assert parse_header(record).event == "EXCP"
+
+
+def test_metric_skips_ingest_while_journal_is_locked(tmp_path):
+    from datetime import datetime
+
+    from metrics.journal import journal_lock
+    from metrics.slow_sql import ingest_sql
+
+    now = datetime.now()
+    log = tmp_path / "sql" / "rphost_1" / now.strftime("%y%m%d%H.log")
+    log.parent.mkdir(parents=True)
+    log.write_bytes(f"{now.minute:02d}:{now.second:02d}.000001-10,DBMSSQL,3\n".encode())
+    config = {
+        "state": {"path": str(tmp_path / "state")},
+        "journal": {"start_position": "begin"},
+    }
+
+    # Журнал разбирает другой процесс (watch): вызов метрики не ждет и не читает журнал
+    with journal_lock(config, "sql", wait=True) as locked:
+        assert locked
+        with journal_lock(config, "sql") as other:
+            assert not other
+        assert ingest_sql(config, [str(log)]).count(None, 5) == 0
+        assert not (tmp_path / "state" / "journal_sql.json").exists()
+
+    assert ingest_sql(config, [str(log)]).count(None, 5) == 1
+    assert ingest_sql(config, [str(log)], wait=True).count(None, 5) == 1
@@ -0,0 +1,36 @@
+import subprocess
+
+from metrics import licenses, rphost
+from metrics.licenses import summarize_licenses
+
+
+def test_summarize_licenses_uses_series_limit_when_not_configured():
+    blocks = [
+        {"license-type": "soft", "series": "A", "max-users-all": "10"},
+        {"license-type": "soft", "series": "A", "max-users-all": "10"},
+        {"license-type": "HASP", "series": "B", "max-users-all": "5"},
+    ]
+    summary = summarize_licenses(blocks)
+    assert summary["by_type"] == {"HASP": 1, "soft": 2}
+    assert (summary["limit"], summary["headroom"], summary["utilization"]) == (15, 12, 20.0)
+    assert summarize_licenses(blocks, limit=4)["headroom"] == 1
+
+
+def test_licenses_and_connections_share_rac_snapshots(rac_config, monkeypatch):
+    rac_config["licenses"] = {"connections_per_process": 100}
+    assert rphost.get_metric(rac_config) == 2 * 3
+
+    report = licenses.get_metric(rac_config, "json")
+    assert report["licenses"]["used"] == 2 * 20
+    assert sum(report["licenses"]["by_type"].values()) == 2 * 20
+    connections = report["connections"]
+    assert connections["total"] == 2 * 20
+    assert len(connections["by_process"]) == 2 * 3
+    assert all(p["pid"] and p["limit"] == 100 for p in connections["by_process"])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("в пределах rac.snapshot_ttl rac не вызывается повторно")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    assert licenses.get_metric(rac_config) == 2 * 20
+    assert licenses.get_metric(rac_config, "json") == report
@@ -0,0 +1,62 @@
+from metrics.journal import JournalRecord, get_property, parse_header
+from metrics.lock_contention import LockAnalyzer
+
+HOUR = 1_700_002_800.0  # начало часа, кратно интервалу 300 с
+
+
+def _feed(analyzer, line):
+    record = JournalRecord("x.log", HOUR, line.encode("utf-8"))
+    analyzer.feed(record, parse_header(record))
+
+
+def test_get_property_handles_quotes():
+    text = "00:01.000001-5,EXCP,5,t:connectID=7,Descr='a, b ''c''\nd',Usr=x\n"
+    assert get_property(text, "t:connectID") == "7"
+    assert get_property(text, "Descr") == "a, b 'c'\nd"
+    assert get_property(text, "Usr") == "x"
+    assert get_property(text, "Missing") is None
+
+
+def test_lock_analyzer_regions_and_wait_graph(tmp_path):
+    analyzer = LockAnalyzer(interval=300, top=2, path=tmp_path / "locks.json")
+    _feed(
+        analyzer, "00:01.000001-100,TLOCK,5,t:connectID=1,Regions=AccumRg1.DIMS,WaitConnections=2\n"
+    )
+    _feed(
+        analyzer,
+        "00:02.000001-300,TLOCK,5,t:connectID=3,Regions=AccumRg1.DIMS,WaitConnections='2,4'\n",
+    )
+    _feed(analyzer, "00:03.000001-10,TLOCK,5,t:connectID=5,Regions=InfoRg7.DIMS,WaitConnections=\n")
+    _feed(
+        analyzer, "00:04.000001-20000,TTIMEOUT,5,t:connectID=6,Regions=Const1,WaitConnections=1\n"
+    )
+    _feed(
+        analyzer,
+        "00:05.000001-1,TDEADLOCK,5,t:connectID=8,"
+        "DeadlockConnectionIntersections='8 9 AccumRg1.DIMS Exclusive Fld1=1,9 8 AccumRg1.DIMS Shared'\n",
+    )
+    # Событие следующего интервала закрывает текущий
+    _feed(analyzer, "05:00.000001-1,TLOCK,5,t:connectID=1,Regions=Const1\n")
+    analyzer.save()
+
+    report = LockAnalyzer.load(tmp_path / "locks.json", interval=300, top=2).report(now=HOUR + 310)
+    assert report["interval_start"] == HOUR
+    assert report["events"] == {"TLOCK": 3, "TTIMEOUT": 1, "TDEADLOCK": 1}
+    assert report["waits"] == 3 and report["wait_time"] == 20400
+    assert report["regions"] == [
+        {"region": "Const1", "count": 1, "waits": 1, "wait_time": 20000},
+        {"region": "AccumRg1.DIMS", "count": 2, "waits": 2, "wait_time": 400},
+    ]
+    edges = {(e["waiter"], e["blocker"], e["kind"]): e["count"] for e in report["edges"]}
+    assert len(edges) == 2
+    assert set(edges) <= {
+        ("1", "2", "wait"),
+        ("3", "2", "wait"),
+        ("3", "4", "wait"),
+        ("6", "1", "timeout"),
+        ("8", "9", "deadlock"),
+        ("9", "8", "deadlock"),
+    }
+    assert LockAnalyzer.load(tmp_path / "locks.json", interval=300, top=2).discovery(
+        now=HOUR + 310
+    ) == {"data": [{"{#LOCK_REGION}": "Const1"}, {"{#LOCK_REGION}": "AccumRg1.DIMS"}]}
@@ -0,0 +1,122 @@
+from metrics.journal import JournalRecord, RecordHeader
+from metrics.lock_correlation import UNKNOWN, LockCorrelator, normalize_query
+
+T0 = 1_700_000_010.0
+
+
+def _feed(correlator, at, duration, event, data):
+    correlator.feed(JournalRecord("p/rphost_1/x.log", 0, data), RecordHeader(at, duration, event))
+
+
+def test_wait_is_attributed_to_blocker_activity_arriving_later(tmp_path):
+    path = tmp_path / "correlation.json"
+    correlator = LockCorrelator(interval=60, top=5, path=path, window=30)
+    # Ожидание из журнала locks приходит раньше вызовов блокирующего соединения
+    wait = ",t:connectID=9,WaitConnections=7,Context='Обработка.Загрузка : 3 : Выполнить'\n"
+    _feed(correlator, T0, 2_000_000, "TLOCK", wait.encode("utf-8"))
+    _feed(correlator, T0 + 1, 0, "TLOCK", b",t:connectID=9,Regions=A\n")
+    correlator.save()
+
+    correlator = LockCorrelator.load(path, 60, 5, window=30)
+    assert len(correlator.pending) == 1
+    sql = b",t:connectID=7,Sql='UPDATE T SET F = 5 WHERE K = ''x'''\n"
+    _feed(correlator, T0 - 1, 500_000, "DBMSSQL", sql)
+    # Вызов другого соединения и вызов до окна не подходят
+    _feed(correlator, T0 - 100, 1_000, "CALL", b",t:connectID=7,Context=old\n")
+    _feed(correlator, T0 + 5, 1_000, "CALL", b",t:connectID=8,Context=other\n")
+    call = ",t:connectID=7,Context='Документ.Заказ.МодульОбъекта : 12 : ПриЗаписи'\n"
+    _feed(correlator, T0 + 5, 10_000_000, "CALL", call.encode("utf-8"))
+    correlator.close_window(T0 + 100)
+    assert not correlator.pending
+
+    report = correlator.report(now=T0 // 60 * 60 + 61)
+    assert (report["waits"], report["attributed"], report["attributed_share"]) == (1, 1, 100.0)
+    assert report["blocking_contexts"] == [
+        {"context": "Документ.Заказ.МодульОбъекта : ПриЗаписи", "waits": 1, "wait_time": 2_000_000}
+    ]
+    assert report["blocking_queries"][0]["query"] == "UPDATE T SET F = ? WHERE K = ?"
+    assert report["waiting_contexts"][0]["context"] == "Обработка.Загрузка : Выполнить"
+
+
+def test_memory_is_bounded(tmp_path):
+    correlator = LockCorrelator(interval=60, top=5, window=30, max_connections=3, max_pending=2)
+    for i in range(10):
+        _feed(correlator, T0, 1_000, "CALL", f",t:connectID={i},Context=c{i}\n".encode())
+        _feed(correlator, T0, 1_000, "TTIMEOUT", f",WaitConnections={i}\n".encode())
+    assert list(correlator.activity) == ["7", "8", "9"]
+    assert len(correlator.pending) == 2
+    # Вытесненные из очереди ожидания уже учтены в интервале
+    assert correlator.current["waits"] == 8
+    assert normalize_query("  ") == UNKNOWN
+
+
+def _journal(root, journal, process, lines):
+    directory = root / journal / process
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "24011012.log").write_bytes("".join(lines).encode("utf-8"))
+    # Файл следующего часа закрывает предыдущий
+    (directory / "24011013.log").write_bytes(b"")
+
+
+def test_ingest_merges_journals_by_event_time(tmp_path):
+    from datetime import datetime
+
+    from metrics.lock_correlation import ingest_correlation
+
+    root = tmp_path / "tj"
+    # Процесс, чьи записи позже, читается первым: время журналов не должно перескакивать
+    _journal(root, "locks", "rphost_1", ["40:00.000001-1000,TLOCK,3,Regions=A\n"])
+    _journal(
+        root,
+        "locks",
+        "rphost_2",
+        [
+            "01:10.000001-2000000,TLOCK,3,t:connectID=9,WaitConnections=7\n",
+            "02:12.000001-1000000,TTIMEOUT,3,WaitConnections=8\n",
+        ],
+    )
+    _journal(
+        root,
+        "sql",
+        "rphost_1",
+        [
+            f"01:{s:02d}.000001-1000,DBMSSQL,4,t:connectID=7,Sql='UPDATE T SET F = 1'\n"
+            for s in range(60)
+        ],
+    )
+    # Запрос без t:connectID находится по SessionID
+    _journal(
+        root, "sql", "rphost_2", ["02:10.000001-1000,DBMSSQL,4,SessionID=5,Sql='DELETE FROM T'\n"]
+    )
+    _journal(
+        root,
+        "calls",
+        "rphost_3",
+        [
+            "01:05.000001-10000000,CALL,1,t:connectID=7,Context=Документ.Заказ.Записать\n",
+            "02:00.000001-1000,CALL,1,t:connectID=8,SessionID=5,Context=Обработка.Очистка\n",
+        ],
+    )
+    config = {
+        "logs": {j: {"path": str(root / j)} for j in ("locks", "calls", "sql")},
+        "state": {"path": str(tmp_path / "state")},
+        "journal": {"start_position": "begin"},
+        "correlation": {"enabled": True, "interval": 3600, "window": 30},
+    }
+
+    # Метрика блокировок дочитывает свой журнал раньше: на сопоставление это не влияет
+    from metrics.locks import ingest_locks
+
+    ingest_locks(config)
+    now = datetime(2024, 1, 10, 13).timestamp() + 1
+    for _ in range(2):
+        report = ingest_correlation(config).report(now)
+        assert (report["waits"], report["attributed"]) == (2, 2)
+        assert {row["context"] for row in report["blocking_contexts"]} == {
+            "Документ.Заказ.Записать",
+            "Обработка.Очистка",
+        }
+        assert {row["query"] for row in report["blocking_queries"]} == {
+            "UPDATE T SET F = ?",
+            "DELETE FROM T",
+        }
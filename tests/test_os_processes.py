@@ -0,0 +1,66 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from metrics import os_processes
+from metrics.os_processes import join_rac
+
+
+@pytest.fixture
+def rphost_process(tmp_path):
+    """Процесс с именем rphost (ссылка на sleep)."""
+    sleep = shutil.which("sleep")
+    if sys.platform != "linux" or sleep is None:
+        pytest.skip("нужен Linux и sleep")
+    link = tmp_path / "rphost"
+    os.symlink(sleep, link)
+    proc = subprocess.Popen([str(link), "30"])
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def test_collect_finds_rphost_and_joins_rac_by_pid(rphost_process, tmp_path, monkeypatch):
+    config = {"state": {"path": str(tmp_path / "state")}}
+    rac = [
+        {"process": "p-1", "pid": str(rphost_process.pid), "port": "1560", "connections": "7"},
+        {"process": "p-2", "pid": "999999", "port": "1561"},
+    ]
+    monkeypatch.setattr(os_processes, "snapshot", lambda config, command: rac)
+
+    first = os_processes.collect(config)
+    proc = next(p for p in first["processes"] if p["pid"] == rphost_process.pid)
+    assert proc["name"] == "rphost" and proc["rss"] > 0 and proc["threads"] >= 1
+    assert proc["cpu_percent"] is None
+    assert proc["rac"]["process"] == "p-1" and proc["rac"]["connections"] == "7"
+    assert first["rac_unmatched"] == 1
+    assert first["totals"]["rphost"]["count"] >= 1
+
+    # Второй запуск считает загрузку CPU по приросту с первого
+    second = os_processes.collect(config)
+    proc = next(p for p in second["processes"] if p["pid"] == rphost_process.pid)
+    assert proc["cpu_percent"] is not None
+    assert os_processes.get_metric(config, "plain") >= proc["rss"]
+
+
+def test_join_rac_leaves_foreign_processes_unmatched():
+    processes = [{"pid": 10}, {"pid": 11}]
+    assert join_rac(processes, [{"pid": "11", "process": "x"}]) == 0
+    assert processes[0]["rac"] is None
+    assert processes[1]["rac"]["process"] == "x"
+
+
+def test_join_rac_skips_processes_of_other_servers():
+    processes = [{"pid": 10}, {"pid": 11}]
+    rac = [
+        # Тот же pid на другом сервере кластера
+        {"pid": "10", "process": "remote", "host": "srv2"},
+        {"pid": "11", "process": "local", "host": "SRV1.corp.local"},
+        {"pid": "12", "process": "gone", "host": "srv1"},
+    ]
+    assert join_rac(processes, rac, hosts=["srv1"]) == 1
+    assert processes[0]["rac"] is None
+    assert processes[1]["rac"]["process"] == "local"
@@ -0,0 +1,72 @@
+import subprocess
+
+from metrics import rphost, ras_health, sessions
+from metrics.rac_client import get_breaker, run_rac
+
+
+def test_rac_metrics_use_shared_client(rac_config):
+    assert ras_health.get_metric(rac_config) == 1
+    assert sessions.get_metric(rac_config) == 2 * 20
+    assert rphost.get_metric(rac_config) == 2 * 3
+
+
+def test_breaker_opens_after_failures_and_probes_later(rac_config, monkeypatch):
+    monkeypatch.setenv("FAKE_RAC_EXIT_CODE", "1")
+    for _ in range(3):
+        assert run_rac(rac_config, ["cluster", "list"]) is None
+    breaker = get_breaker(rac_config)
+    assert breaker.is_open()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rac не должен вызываться, пока RAS недоступен")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    assert run_rac(rac_config, ["cluster", "list"]) is None
+    assert ras_health.get_metric(rac_config) == 0
+    monkeypatch.undo()
+
+    # Время пробы наступило: RAS снова отвечает, счетчик неудач сбрасывается
+    breaker.state["open_until"] = 0
+    breaker.save()
+    assert run_rac(rac_config, ["cluster", "list"]) is not None
+    assert get_breaker(rac_config).state["failures"] == 0
+
+
+def test_adaptive_ttl_grows_with_latency(rac_config):
+    breaker = get_breaker(rac_config)
+    assert breaker.adaptive_ttl("sessions_plain", 60) == 60
+    breaker.observe("sessions_plain", 1.0)
+    assert breaker.adaptive_ttl("sessions_plain", 60, slow_latency=2.0) == 60
+    breaker.observe("sessions_plain", 11.0)
+    # 0.3 * 11 + 0.7 * 1 = 4 с, вдвое больше порога
+    assert get_breaker(rac_config).adaptive_ttl("sessions_plain", 60, 2.0) == 120
+    assert breaker.adaptive_ttl("sessions_plain", 60, 2.0, max_ttl=90) == 90
+
+
+def test_parallel_cluster_failures_share_one_breaker(rac_config, monkeypatch):
+    from metrics import rac_client
+
+    writes = []
+    write = rac_client.CircuitBreaker._write
+    monkeypatch.setattr(
+        rac_client.CircuitBreaker, "_write", lambda self: writes.append(1) or write(self)
+    )
+    monkeypatch.setenv("FAKE_RAC_EXIT_CODE", "1")
+    config = {**rac_config, "rac": {**rac_config["rac"], "failure_threshold": 10}}
+    assert rac_client.list_in_clusters(config, ["session", "list"], ["a", "b", "c", "d"]) is None
+    # Неудачи всех потоков учтены, состояние записано один раз
+    assert get_breaker(config).state["failures"] == 4
+    assert writes == [1]
+
+
+def test_rac_path_is_searched_once_per_process(rac_config, monkeypatch):
+    from metrics import rac_client
+
+    searches = []
+    monkeypatch.setattr(rac_client, "get_rac_path", lambda config: searches.append(1) or "rac")
+    rac_client._search_rac.cache_clear()
+    config = {**rac_config, "rac": {**rac_config["rac"], "path": "rac"}}
+    assert rac_client.find_rac_executable(config) == "rac"
+    assert rac_client.find_rac_executable(config) == "rac"
+    assert searches == [1]
+    rac_client._search_rac.cache_clear()
@@ -0,0 +1,101 @@
+import json
+from datetime import datetime
+
+import main
+from metrics.replay import replay
+
+HOUR = datetime(2024, 1, 10, 12).timestamp()
+
+
+def _write(path, lines):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes("".join(lines).encode("utf-8"))
+
+
+def _tree(root):
+    # Два процесса rphost пишут вперемешку по времени, журналы старше текущего времени
+    _write(
+        root / "locks" / "rphost_1" / "24011012.log",
+        ["00:10.000001-100,TLOCK,3,WaitConnections=7\n", "02:30.000001-5,TLOCK,3\n"],
+    )
+    _write(root / "locks" / "rphost_2" / "24011012.log", ["01:20.000001-7,TTIMEOUT,3\n"])
+    _write(
+        root / "calls" / "rphost_1" / "24011012.log",
+        ["00:05.000001-1000,CALL,1,Context=A\n", "01:05.000001-1000,CALL,1,Context=B\n"],
+    )
+    _write(
+        root / "excps" / "rphost_1" / "24011012.log",
+        ["01:00.000001-0,EXCP,1,Exception=DataBaseException\n", "01:01.000001-0,CONN,1\n"],
+    )
+
+
+def test_replay_samples_metrics_on_simulated_clock(tmp_path):
+    _tree(tmp_path / "tj")
+    config = {"state": {"path": str(tmp_path / "state")}}
+
+    result = replay(config, root=str(tmp_path / "tj"), interval=60)
+    assert set(result["journals"]) == {"locks", "calls", "log_errors"}
+    series = result["series"]
+    assert [row["time"] - HOUR for row in series] == [60, 120, 180]
+    assert [row["locks"] for row in series] == [1, 2, 3]
+    assert [row["calls"] for row in series] == [1, 2, 2]
+    assert [row["log_errors"] for row in series] == [0, 1, 1]
+    assert result["reports"]["log_errors"]["classes"] == {"DataBaseException": 1}
+    assert result["reports"]["locks"]["interval"] == 300
+    assert result["throughput"]["records"] == 7
+    files = (tmp_path / "tj").rglob("*.log")
+    assert result["throughput"]["bytes"] == sum(path.stat().st_size for path in files)
+    # Состояние живых метрик не создается
+    assert not (tmp_path / "state").exists()
+
+    # Границы воспроизведения по времени события
+    part = replay(config, ["locks"], str(tmp_path / "tj"), 60, start=HOUR + 60, end=HOUR + 120)
+    assert part["throughput"]["records"] == 1
+    assert [row["locks"] for row in part["series"]] == [1]
+    # Прочитаны записи до первой записи после end, а не файлы целиком
+    head = replay(config, ["locks"], str(tmp_path / "tj"), 60, end=HOUR + 60)
+    assert head["throughput"]["records"] == 1
+    assert head["throughput"]["bytes"] == len(
+        "00:10.000001-100,TLOCK,3,WaitConnections=7\n01:20.000001-7,TTIMEOUT,3\n"
+    )
+
+
+def test_replay_command(tmp_path, capsys):
+    _tree(tmp_path / "tj")
+    argv = ["--path", str(tmp_path / "tj"), "--metric", "calls", "--interval", "120"]
+    assert main.run_replay(argv) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert [row["calls"] for row in result["series"]] == [2]
+
+    assert main.run_replay([*argv, "--format", "plain"]) == 0
+    out, err = capsys.readouterr()
+    assert out.splitlines() == ["time\tcalls", f"{int(HOUR) + 120}\t2"]
+    assert "records_per_sec=" in err
+    assert main.run_replay(["--path", str(tmp_path / "missing")]) == 1
+
+
+def test_replayed_log_errors_match_live_metric(tmp_path):
+    from metrics import log_errors
+
+    # Файлы текущего часа на разной глубине; в записи может быть несколько строк с ошибками
+    name = datetime.now().strftime("%y%m%d%H.log")
+    _write(
+        tmp_path / "tj" / "excps" / "srv1" / "rphost_1" / name,
+        [
+            "00:00.000001-0,EXCP,1,Exception=DataBaseException,Descr='a\n",
+            "ERROR: повтор\n",
+            "FATAL'\n",
+            "00:01.000001-0,CONN,1\n",
+        ],
+    )
+    _write(tmp_path / "tj" / "excps" / "rphost_2" / name, ["00:02.000001-0,EXCP,1\n"])
+    config = {
+        "state": {"path": str(tmp_path / "state")},
+        "logs": {"errors": {"path": str(tmp_path / "tj" / "excps")}},
+    }
+
+    live = log_errors.get_metric(config)
+    result = replay(config, ["log_errors"], str(tmp_path / "tj"), 60)
+    assert live["count"] == 4
+    assert result["series"][-1]["log_errors"] == live["count"]
+    assert result["reports"]["log_errors"]["classes"] == live["classes"]
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from metrics import locks
+from metrics.journal import BOM
+from metrics.rolling import RollingCounters
+
+T0 = 1_700_000_040.0  # начало минуты
+
+
+def test_rolling_windows_rates_and_maxima():
+    store = RollingCounters(["TLOCK", "TTIMEOUT"], slots=60)
+    store.add("TLOCK", T0, duration=10)
+    store.add("TLOCK", T0 + 60, duration=30)
+    store.add("TLOCK", T0 + 61, duration=20)
+    store.add("TTIMEOUT", T0 + 125)
+    store.add("UNKNOWN", T0 + 125)
+
+    now = T0 + 130
+    assert store.count(minutes=1, now=now) == 1
+    assert store.count(["TLOCK"], minutes=5, now=now) == 3
+    assert store.count(minutes=15, now=now) == 4
+    assert store.max_per_minute(["TLOCK"], minutes=15, now=now) == 2
+    assert store.rate(minutes=5, now=now) == 4 / 300
+    assert store.duration_stats(["TLOCK"], minutes=5, now=now) == {"avg": 20.0, "max": 30}
+    # Корзина перезаписывается через slots минут
+    store.add("TLOCK", T0 + 3600)
+    assert store.count(minutes=60, now=T0 + 3600) == 4
+
+
+def test_rolling_persists_and_remaps_series(tmp_path):
+    path = tmp_path / "rolling.bin"
+    store = RollingCounters(["A", "B"], path=path)
+    store.add("B", T0)
+    store.save()
+
+    loaded = RollingCounters.load(path, ["B", "C"])
+    assert loaded.count(["B"], minutes=1, now=T0) == 1
+    assert loaded.count(["C"], minutes=1, now=T0) == 0
+
+
+def test_locks_metric_reports_window_count(tmp_path):
+    now = datetime.now()
+    journal = tmp_path / "locks"
+    log = journal / "rphost_1" / f"{now:%y%m%d%H}.log"
+    log.parent.mkdir(parents=True)
+    log.write_bytes(BOM)
+    config = {"logs": {"locks": {"path": str(journal)}}, "state": {"path": str(tmp_path / "st")}}
+    assert locks.get_metric(config) == 0
+
+    stamp = f"{now:%M:%S}.000001".encode()
+    with log.open("ab") as f:
+        f.write(stamp + b"-5,TLOCK,5,p=1\n" + stamp + b"-5,CALL,5,p=1\n")
+        f.write(stamp + b"-5,TTIMEOUT,5,p=1\n" + stamp + b"-5,TDEADLOCK,5,p=1\n")
+    assert locks.get_metric(config) == 3
+    # Повторный опрос не перечитывает журнал, но окно по-прежнему содержит события
+    assert locks.get_metric(config) == 3
+    summary = locks.get_metric(config, "json")
+    assert summary["last_5m"] == 3 and summary["events"]["TDEADLOCK"]["last_1m"] == 1
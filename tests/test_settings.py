@@ -0,0 +1,84 @@
+import pytest
+
+import main
+from metrics.settings import SCHEMA_VERSION, Settings, as_settings, schema_hash
+
+
+def test_settings_reconcile_legacy_keys():
+    settings = Settings.model_validate(
+        {
+            "rac_path": "/opt/rac",
+            "ras": {"host": "ras-host", "port": "1645", "password": ""},
+            "logs": {"zabbix_excps": {"path": "/logs/excp"}, "locks": {"analysis": {"top": 5}}},
+            "archive": {"enabled": "true", "properties": "Usr, Context"},
+        }
+    )
+    assert settings.rac.path == "/opt/rac"
+    assert settings.rac.host == "ras-host"
+    assert settings.rac.port == 1645
+    # Пустая строка (незаданная переменная) заменяется значением по умолчанию
+    assert settings.rac.password is None
+    assert settings.logs.errors.path == "/logs/excp"
+    assert settings.logs.locks.analysis.top == 5
+    assert settings.logs.locks.analysis.interval == 300
+    assert settings.archive.enabled is True
+    assert settings.archive.properties == ["Usr", "Context"]
+
+    # Устаревшие ключи в нормализованной конфигурации не дублируются
+    dumped = settings.model_dump(mode="json")
+    assert "ras" not in dumped and "rac_path" not in dumped
+    assert "zabbix_excps" not in dumped["logs"]
+    assert as_settings(settings) is settings
+    assert as_settings(dumped) == settings
+
+
+def test_settings_reject_invalid_values():
+    with pytest.raises(ValueError):
+        Settings.model_validate({"journal": {"start_position": "middle"}})
+
+
+def test_load_full_config_uses_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "get_cache_dir", lambda: tmp_path / "cache")
+    monkeypatch.setenv("TEST_CACHE_TTL", "30")
+    path = tmp_path / "config.yaml"
+    path.write_text("cache:\n  ttl: ${TEST_CACHE_TTL:60}\n", encoding="utf-8")
+
+    assert main.load_full_config(str(path)).cache.ttl == 30
+
+    compiled = []
+    compile_config = main._compile_config
+    monkeypatch.setattr(
+        main, "_compile_config", lambda raw: compiled.append(1) or compile_config(raw)
+    )
+    assert main.load_full_config(str(path)).cache.ttl == 30
+    assert compiled == []
+
+    # Изменение переменной окружения, на которую ссылается конфигурация, - повод перекомпилировать
+    monkeypatch.setenv("TEST_CACHE_TTL", "45")
+    assert main.load_full_config(str(path)).cache.ttl == 45
+    assert compiled == [1]
+
+    # Снимок загружается без проверки схемой, но с вложенными секциями
+    with monkeypatch.context() as m:
+        m.setattr(Settings, "model_validate", None)
+        config = main.load_full_config(str(path))
+    assert config.cache.ttl == 45 and config.rac.port == 1545
+    assert config == Settings.model_validate({"cache": {"ttl": 45}})
+
+    # Снимок другой схемы не используется
+    monkeypatch.setattr(main, "SCHEMA_VERSION", "other")
+    assert main.load_full_config(str(path)).cache.ttl == 45
+    assert compiled == [1, 1]
+
+
+def test_schema_version_matches_schema():
+    # Схема Settings изменилась - обновите SCHEMA_VERSION (старые снимки станут недействительны)
+    assert SCHEMA_VERSION == schema_hash()
+
+
+def test_load_full_config_rejects_invalid_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "get_cache_dir", lambda: tmp_path / "cache")
+    path = tmp_path / "config.yaml"
+    path.write_text("journal:\n  start_position: middle\n", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        main.load_full_config(str(path))
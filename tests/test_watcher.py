@@ -0,0 +1,62 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from metrics import watcher as watcher_module
+from metrics.watcher import JournalWatcher
+
+RECORD = b"00:01.000001-100,TLOCK,5,Usr=Ivanov,Regions=A\n"
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_watcher_ingests_new_rphost_dirs_and_appends(tmp_path, backend):
+    if backend == "inotify" and watcher_module._load_libc() is None:
+        pytest.skip("inotify недоступен")
+    base = tmp_path / "locks"
+    (base / "rphost_1").mkdir(parents=True)
+    config = {
+        "logs": {"locks": {"path": str(base)}},
+        "state": {"path": str(tmp_path / "state")},
+        "journal": {"start_position": "begin"},
+        "watch": {"debounce": 0.05, "max_delay": 0.2, "poll_interval": 0.1},
+    }
+    watcher = JournalWatcher(config, ["locks"], backend)
+    assert watcher.backend == backend
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    try:
+        assert _wait(lambda: watcher.runs["locks"] >= 1)
+        # Новый каталог процесса и часовой файл появляются после запуска
+        log = base / "rphost_2" / datetime.now().strftime("%y%m%d%H.log")
+        log.parent.mkdir()
+        log.write_bytes(RECORD)
+        state = tmp_path / "state" / "journal_locks.json"
+
+        def offset():
+            try:
+                files = json.loads(state.read_text(encoding="utf-8"))["files"]
+            except (OSError, ValueError):
+                return 0
+            return files.get(str(log), {}).get("offset", 0)
+
+        assert _wait(lambda: offset() == len(RECORD))
+        with open(log, "ab") as f:
+            f.write(RECORD)
+        assert _wait(lambda: offset() == 2 * len(RECORD))
+    finally:
+        stop.set()
+        thread.join(5)
+    assert not thread.is_alive()